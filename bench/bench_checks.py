@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+# Benchmark suite for both checks against the simulated agent.
+#
+# Builds synthetic BGP and sensor tables with snmp_sim, runs
+# every way the checks can fetch them and reports wall time,
+# PDUs and varbinds sent to the agent, and peak Python memory
+# (Python 3 only, via tracemalloc) per run. Cached and
+# incremental modes are run once to warm up and measured on
+# the second run, like a check that has been running a while.
+#
+#   ./bench/bench_checks.py -p 10,500,5000 -s 50,2000 -l 0.5
+#
+# Numbers are meant for comparing runs of this script before
+# and after a change, not for predicting what a router does.
+
+from __future__ import print_function
+
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import snmp_retry
+import snmp_session
+import snmp_sim
+import snmp_table
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+HOST      = '127.0.0.1'
+COMMUNITY = 'public'
+
+#
+# Variants, each returns a function running one check
+#
+def bgp_variants(options,state_dir):
+    import check_bgp_neighbors
+
+    def per_get():
+        check_bgp_neighbors.check_neighbor_status_v4(HOST,COMMUNITY)
+        check_bgp_neighbors.check_neighbor_status_v6(HOST,COMMUNITY)
+
+    def table():
+        check_bgp_neighbors.check_neighbor_status_table(HOST,COMMUNITY,options.maxrep)
+
+    def incremental():
+        check_bgp_neighbors.check_neighbor_status_incremental(HOST,COMMUNITY,options.maxrep,state_dir)
+
+    return ([('bgp per-get', per_get, False),
+             ('bgp -b',      table, False),
+             ('bgp -S',      incremental, True)])
+
+def env_variants(options,cache_dir):
+    import check_env
+    import sensor_filter
+
+    def per_get():
+        check_env.check_sensors(HOST,COMMUNITY)
+
+    def table():
+        check_env.check_sensors_table(HOST,COMMUNITY,options.maxrep)
+
+    def cached():
+        check_env.check_sensors_table(HOST,COMMUNITY,options.maxrep,cache_dir)
+
+    # Optics left out, against the same cache
+    selection = sensor_filter.SensorFilter.parse(exclude=['type:dBm'])
+
+    def filtered():
+        check_env.check_sensors_table(HOST,COMMUNITY,options.maxrep,cache_dir,selection=selection)
+
+    return ([('env per-get', per_get, False),
+             ('env -b',      table, False),
+             ('env -C',      cached, True),
+             ('env -C -E',   filtered, True)])
+
+#
+# Same check through the asyncio poller and the UDP responder
+#
+def poller_variant(options,agent,kind):
+    import poller
+
+    def poll():
+        udp = snmp_sim.UdpAgent(agent).start()
+        try:
+            poller.check_device(udp.address[0],COMMUNITY,[kind],options.maxrep,
+                                port=udp.address[1],policy=options.policy)
+        finally:
+            udp.stop()
+
+    return ([(kind + ' poller', poll, False)])
+
+#
+# Run one variant and measure it
+#
+def measure(agent,func):
+    snmp_session.close_all()
+    agent.reset_counters()
+    gc.collect()
+
+    stdout     = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    if tracemalloc is not None:
+        tracemalloc.start()
+
+    try:
+        start = time.time()
+        func()
+        wall  = time.time() - start
+    finally:
+        peak = None
+        if tracemalloc is not None:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    return (wall, agent.pdus, agent.varbinds, peak)
+
+def report(name,size,result):
+    wall,pdus,varbinds,peak = result
+    if peak is None:
+        peak = 'n/a'
+    else:
+        peak = '{0:.0f}'.format(peak / 1024.0)
+
+    print("{0:<12} {1:>6} {2:>10.1f} {3:>8} {4:>9} {5:>9}".format(
+        name, size, wall * 1000, pdus, varbinds, peak))
+    sys.stdout.flush()
+
+def main():
+    parser = OptionParser(usage="usage: %prog [-p peers] [-s sensors] [-O ports] [-l ms] [-L loss] [-V variants]")
+    parser.add_option("-p", type="string", dest="peers", default="10,500,5000",
+                      help="comma separated BGP table sizes (default %default)")
+    parser.add_option("-s", type="string", dest="sensors", default="50,500,2000",
+                      help="comma separated sensor table sizes (default %default)")
+    parser.add_option("-l", type="float", dest="latency", default=0.0,
+                      help="milliseconds of latency per PDU (default %default)")
+    parser.add_option("-L", type="float", dest="loss", default=0.0,
+                      help="share of PDUs lost, 0..1 (default %default)")
+    parser.add_option("-t", type="float", dest="timeout", default=0.05,
+                      help="seconds to wait for the first response (default %default)")
+    parser.add_option("-O", type="int", dest="optics", default=0,
+                      help="ports with Rx and Tx power sensors added to every sensor table (default %default)")
+    parser.add_option("-m", type="int", dest="maxrep", default=snmp_table.DEFAULT_MAX_REPETITIONS,
+                      help="GETBULK max-repetitions (default %default)")
+    parser.add_option("-V", type="string", dest="variants",
+                      help="comma separated variant names to run (default all)")
+    (options, args) = parser.parse_args()
+
+    # Checks and poller share one policy, backoff scaled to the timeout
+    options.policy = snmp_retry.Policy(options.timeout,backoff=options.timeout,seed=0)
+    snmp_retry.use(options.policy)
+
+    wanted  = options.variants and options.variants.split(',')
+    workdir = tempfile.mkdtemp(prefix='bench_checks.')
+
+    print("latency {0} ms/PDU, loss {1:.0%}, max-repetitions {2}".format(
+        options.latency, options.loss, options.maxrep))
+    print("{0:<12} {1:>6} {2:>10} {3:>8} {4:>9} {5:>9}".format(
+        'variant', 'rows', 'wall ms', 'PDUs', 'varbinds', 'peak KiB'))
+
+    try:
+        sizes = [('bgp', int(size)) for size in options.peers.split(',') if size]
+        sizes += [('env', int(size)) for size in options.sensors.split(',') if size]
+
+        for kind,size in sizes:
+            agent = snmp_sim.Agent(latency=options.latency / 1000.0, loss=options.loss, seed=size)
+            if kind == 'bgp':
+                snmp_sim.add_bgp_peers(agent,size)
+                variants = bgp_variants(options,tempfile.mkdtemp(dir=workdir))
+            else:
+                snmp_sim.add_sensors(agent,size)
+                if options.optics:
+                    snmp_sim.add_entity_tree(agent,size)
+                    snmp_sim.add_optics(agent,options.optics,(size + 19) // 20)
+                variants = env_variants(options,tempfile.mkdtemp(dir=workdir))
+            snmp_sim.install(agent)
+
+            if sys.version_info[0] >= 3:
+                variants += poller_variant(options,agent,kind)
+
+            for name,func,warm in variants:
+                if wanted and name not in wanted:
+                    continue
+                if warm:
+                    measure(agent,func)
+                report(name,size,measure(agent,func))
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
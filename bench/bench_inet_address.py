@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# Micro-benchmark of the cbgpPeer2Table IPv6 index decoding.
+#
+# Compares the per-octet hex() splicing check_bgp_neighbors.py
+# used to do with inet_address.decode, both uncached and
+# through the LRU the check uses, on a set of random peer
+# indexes. Also counts how many addresses the old code got
+# wrong.
+#
+#   ./bench/bench_inet_address.py [-n peers] [-r rounds]
+
+from __future__ import print_function
+
+import os
+import random
+import sys
+import timeit
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import inet_address
+
+#
+# The old code path, as it was in check_bgp_neighbors.py
+#
+def ipv6_converter(decimal):
+    if len(decimal) == 1:
+        decimal = decimal.zfill(2)
+    else:
+        decimal = hex(int(decimal))[2:]
+
+    return decimal
+
+def old_decode(index):
+    octets = index.split('.')[2:18]
+
+    groups = []
+    for n in range(0, 16, 2):
+        groups.append((ipv6_converter(octets[n]) + ipv6_converter(octets[n + 1])).lstrip("0"))
+
+    ipv6 = ':'.join(groups[:7])
+    ipv6 = ipv6.rstrip(":")
+    ipv6 = ipv6 + '::' + groups[7]
+
+    return ipv6
+
+#
+# Random peer indexes, mostly in a couple of /64s like real peerings
+#
+def make_indexes(count):
+    prefixes = [[0x20, 0x01, 0x07, 0xf8, 0x00, 0x0d, 0x00, 0xfc],
+                [0x2a, 0x00, 0x1f, 0x00, 0xde, 0xad, 0x00, 0x00]]
+    indexes  = []
+    for n in range(count):
+        octets = random.choice(prefixes) + [0] * 6 + [random.randint(0, 255), random.randint(0, 255)]
+        if n % 10 == 0:
+            octets = [random.randint(0, 255) for i in range(16)]
+        indexes.append('2.16.' + '.'.join(str(octet) for octet in octets))
+
+    return (indexes)
+
+def main():
+    parser = OptionParser(usage="usage: %prog [-n peers] [-r rounds]")
+    parser.add_option("-n", type="int", dest="peers", default=2000, help="peer indexes (default %default)")
+    parser.add_option("-r", type="int", dest="rounds", default=20, help="rounds per variant (default %default)")
+    (options, args) = parser.parse_args()
+
+    indexes = make_indexes(options.peers)
+    decoder = inet_address.Decoder()
+
+    variants = [
+        ("old hex() splicing",   lambda: [old_decode(index) for index in indexes]),
+        ("inet_address.decode",  lambda: [inet_address.decode(index)[1] for index in indexes]),
+        ("inet_address LRU",     lambda: [decoder.decode(index)[1] for index in indexes]),
+    ]
+
+    print("{0} peers, {1} rounds".format(options.peers, options.rounds))
+    for name, func in variants:
+        seconds = min(timeit.repeat(func, number=1, repeat=options.rounds))
+        print("{0:<22} {1:8.3f} ms/poll {2:8.2f} us/peer".format(
+            name, seconds * 1000, seconds * 1e6 / options.peers))
+
+    wrong = sum(1 for index in indexes if old_decode(index) != inet_address.decode(index)[1])
+    print("old code path wrong for {0} of {1} addresses".format(wrong, options.peers))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+# Startup benchmark for the single-router checks.
+#
+# Measures, per way of starting a check, the time from
+# spawning the process to the first PDU reaching the agent
+# and to the process exiting:
+#
+#   script   ./check_env.py ...
+#   entry    ./check_iosxr.py env ... without a check server
+#   server   ./check_iosxr.py env ... with check_iosxr.py -S running
+#   help     ./check_env.py --help, imports and option parsing only
+#
+#   ./bench/bench_startup.py -n 20 -C env,bgp
+#
+# netsnmp is replaced by snmp_sim in every process, so the
+# numbers include importing snmp_sim and building small
+# tables but not loading the real netsnmp. Compare runs of
+# this script before and after a change, and against the
+# budget given with -b.
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SCRIPTS = {'bgp':    'check_bgp_neighbors.py',
+           'env':    'check_env.py',
+           'device': 'check_device.py'}
+
+MODES = ['script', 'entry', 'server', 'help']
+
+#
+# Run in the check's own process: install the fake netsnmp,
+# note the time of the first PDU on the given descriptor and
+# run the script
+#
+def child(fd,script,args):
+    sys.path.insert(0, ROOT)
+    import runpy
+    import snmp_sim
+
+    agent = snmp_sim.Agent(seed=0)
+    snmp_sim.add_bgp_peers(agent,10)
+    snmp_sim.add_sensors(agent,10)
+
+    handle = agent.handle
+    first  = []
+
+    def timed(*args):
+        if not first:
+            first.append(time.time())
+            os.write(fd, "{0!r}\n".format(first[0]).encode())
+        return (handle(*args))
+
+    agent.handle = timed
+    snmp_sim.install(agent)
+
+    sys.argv = [script] + args
+    runpy.run_path(script, run_name='__main__')
+
+#
+# Start a check and wait for it, returns (first PDU, exit) in
+# seconds after the start, first PDU None if none was sent
+#
+def run(command,reader,writer,env):
+    start = time.time()
+    subprocess.call(command, stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT,
+                    env=env, pass_fds=[writer])
+    done  = time.time() - start
+
+    try:
+        stamps = os.read(reader, 4096).split()
+    except OSError:
+        stamps = []
+    if not stamps:
+        return (None, done)
+
+    return (float(stamps[0]) - start, done)
+
+def command(mode,check,fd):
+    python = [sys.executable, os.path.abspath(__file__), '--child', str(fd)]
+    args   = ['-H', '127.0.0.1', '-c', 'public']
+
+    if mode == 'script':
+        return (python + [os.path.join(ROOT, SCRIPTS[check])] + args + ['-b'] * (check != 'device'))
+    if mode == 'help':
+        return ([sys.executable, os.path.join(ROOT, SCRIPTS[check]), '--help'])
+    if mode == 'server':
+        python = [sys.executable]
+
+    return (python + [os.path.join(ROOT, 'check_iosxr.py'), check] + args + ['-b'] * (check != 'device'))
+
+#
+# Start check_iosxr.py -S with the fake netsnmp, its children
+# report their first PDU like the other modes
+#
+def start_server(path,writer):
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--child', str(writer),
+                               os.path.join(ROOT, 'check_iosxr.py'), '-S', path],
+                              pass_fds=[writer])
+
+    while not os.path.exists(path):
+        if server.poll() is not None:
+            sys.exit("check server exited with {0}".format(server.returncode))
+        time.sleep(0.01)
+
+    return (server)
+
+def median(values):
+    values = sorted(values)
+
+    return (values[len(values) // 2])
+
+def main():
+    if len(sys.argv) > 3 and sys.argv[1] == '--child':
+        child(int(sys.argv[2]),sys.argv[3],sys.argv[4:])
+        return
+
+    parser = OptionParser(usage="usage: %prog [-n runs] [-C checks] [-M modes] [-b ms]")
+    parser.add_option("-n", type="int", dest="runs", default=10,
+                      help="runs per check and mode (default %default)")
+    parser.add_option("-C", type="string", dest="checks", default="bgp,env,device",
+                      help="comma separated checks (default %default)")
+    parser.add_option("-M", type="string", dest="modes", default=",".join(MODES),
+                      help="comma separated modes (default %default)")
+    parser.add_option("-b", type="float", dest="budget",
+                      help="milliseconds allowed to the first PDU, exits 1 if a mode is over it")
+    (options, args) = parser.parse_args()
+
+    reader,writer = os.pipe()
+    os.set_blocking(reader, False)
+
+    workdir = tempfile.mkdtemp(prefix='bench_startup.')
+    env     = dict(os.environ, IOSXR_CHECK_SOCKET=os.path.join(workdir, 'check.sock'))
+
+    modes   = options.modes.split(',')
+    server  = None
+    if 'server' in modes:
+        server = start_server(env['IOSXR_CHECK_SOCKET'],writer)
+
+    print("{0:<8} {1:<8} {2:>14} {3:>10}".format('check', 'mode', 'first PDU ms', 'exit ms'))
+
+    over = False
+    try:
+        for check in options.checks.split(','):
+            for mode in modes:
+                # Without the server the entry point has to run the check itself
+                run_env = env
+                if mode == 'entry':
+                    run_env = dict(env, IOSXR_CHECK_SOCKET=os.path.join(workdir, 'none.sock'))
+
+                first = []
+                done  = []
+                for n in range(options.runs):
+                    pdu,exit = run(command(mode,check,writer),reader,writer,run_env)
+                    if pdu is not None:
+                        first.append(pdu)
+                    done.append(exit)
+
+                if first:
+                    pdu = "{0:.1f}".format(median(first) * 1000)
+                    if options.budget and median(first) * 1000 > options.budget:
+                        over = True
+                        pdu += ' !'
+                else:
+                    pdu = '-'
+
+                print("{0:<8} {1:<8} {2:>14} {3:>10.1f}".format(check, mode, pdu, median(done) * 1000))
+                sys.stdout.flush()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if os.path.exists(env['IOSXR_CHECK_SOCKET']):
+            os.unlink(env['IOSXR_CHECK_SOCKET'])
+        os.rmdir(workdir)
+
+    if over:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
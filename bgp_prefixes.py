@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+# Per-peer prefix counters between runs.
+#
+# An established session can still have lost all its routes.
+# cbgpPeer2AddrFamilyPrefixTable counts accepted, denied and
+# advertised prefixes per peer and address family, indexed by
+# the peer index followed by AFI and SAFI. Its columns are
+# walked in the same GETBULKs as cbgpPeer2Table and the rows
+# mapped back to the peers here.
+#
+# Counts of the last run are kept per device as
+#
+#   {peer index: {"afi.safi": [accepted, denied, advertised]}}
+#
+# and a peer that is established alarms when its accepted or
+# advertised prefixes in a family dropped by at least the
+# warning or critical share since then. A family that is gone
+# counts as dropped to zero. A count that alarmed is kept at
+# what it dropped from, so the alarm holds until the count is
+# back within the warning share instead of for one run.
+
+import os
+
+import snmp_table
+import state_file
+
+# CISCO-BGP4-MIB cbgpPeer2AddrFamilyPrefixTable columns
+PREFIX_ACCEPTED   = '.1.3.6.1.4.1.9.9.187.1.2.8.1.1'
+PREFIX_DENIED     = '.1.3.6.1.4.1.9.9.187.1.2.8.1.2'
+PREFIX_ADVERTISED = '.1.3.6.1.4.1.9.9.187.1.2.8.1.6'
+COLUMNS           = [PREFIX_ACCEPTED, PREFIX_DENIED, PREFIX_ADVERTISED]
+
+# Counters that alarm on drops, as positions in the row
+WATCHED   = ((0, 'accepted'), (2, 'advertised'))
+POSITIONS = dict((counter, position) for position,counter in WATCHED)
+
+# Warning and critical drop, percent of the last run's count
+DEFAULT_DROP = (50.0, 90.0)
+
+FAMILIES = {'1.1':    'IPv4 unicast',
+            '1.2':    'IPv4 multicast',
+            '1.128':  'VPNv4',
+            '2.1':    'IPv6 unicast',
+            '2.2':    'IPv6 multicast',
+            '2.128':  'VPNv6',
+            '25.70':  'L2VPN EVPN'}
+
+def state_path(state_dir,host):
+    return (os.path.join(state_dir, host + '.prefixes.json'))
+
+def load(state_dir,host):
+    prefixes = state_file.read(state_path(state_dir,host))
+    if prefixes is None:
+        return ({})
+
+    return (prefixes)
+
+def save(state_dir,host,prefixes):
+    state_file.write(state_path(state_dir,host),prefixes)
+
+def family_name(family):
+    return (FAMILIES.get(family, 'AFI/SAFI ' + family.replace('.', '/')))
+
+def count(value):
+    if value is None:
+        return (None)
+
+    return (int(value))
+
+#
+# Counters from a walked table, by peer index and family
+#
+def prefix_rows(table):
+    peers = {}
+    for index,row in snmp_table.join_rows(table,COLUMNS).items():
+        parts = index.rsplit('.', 2)
+        if len(parts) < 3:
+            continue
+        peers.setdefault(parts[0], {})[parts[1] + '.' + parts[2]] = [count(value) for value in row]
+
+    return (peers)
+
+#
+# Drop limits from the command line, "warning[,critical]" in percent
+#
+def parse_drop(spec):
+    if not spec:
+        return (DEFAULT_DROP)
+
+    limits = [float(value) for value in spec.split(',')]
+    if len(limits) == 1:
+        limits.append(max(limits[0], DEFAULT_DROP[1]))
+    if len(limits) != 2 or not 0 < limits[0] <= limits[1]:
+        raise ValueError(spec)
+
+    return (tuple(limits))
+
+#
+# Compare this run's counters of the established peers with the
+# last run's, returns alarms as
+#
+#   (exitcode, peer index, family, counter, before, after, drop)
+#
+# with the drop in percent, worst first.
+#
+def evaluate(previous,current,established,drop=DEFAULT_DROP):
+    warning,critical = drop
+    alarms = []
+
+    for index in established:
+        before = previous.get(index)
+        if not before:
+            continue
+        after  = current.get(index, {})
+
+        for family,counts in before.items():
+            now = after.get(family, [0, 0, 0])
+            for position,counter in WATCHED:
+                old,new = counts[position],now[position]
+                if not old or new is None:
+                    continue
+
+                loss = 100.0 * (old - new) / old
+                if loss >= critical:
+                    alarms.append((2, index, family, counter, old, new, loss))
+                elif loss >= warning:
+                    alarms.append((1, index, family, counter, old, new, loss))
+
+    alarms.sort(key=lambda alarm: (-alarm[0], -alarm[6]))
+
+    return (alarms)
+
+#
+# Counters to keep for the next run, this run's except for the
+# ones that alarmed, which keep the count they dropped from
+#
+def baseline(previous,current,alarms):
+    kept = dict((index, dict((family, list(counts)) for family,counts in families.items()))
+                for index,families in current.items())
+
+    for code,index,family,counter,before,after,loss in alarms:
+        counts = kept.setdefault(index, {}).setdefault(family, list(previous[index][family]))
+        counts[POSITIONS[counter]] = before
+
+    return (kept)
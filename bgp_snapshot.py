@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+# Per-device snapshot of the BGP peer table between runs.
+#
+# RemoteAs and lastErrorTxt only change or matter when a
+# session changes state, so they are remembered here and
+# only fetched again for peers that are new or whose state
+# or established-transitions counter moved since last run.
+#
+# Each peer index maps to
+#
+#   [state, transitions, remote as, last error, last change]
+#
+# where last change is the unix time we first saw the
+# current state.
+
+import os
+import time
+
+import state_file
+
+def snapshot_path(state_dir,host):
+    return (os.path.join(state_dir, host + '.bgp.json'))
+
+def load(state_dir,host):
+    snapshot = state_file.read(snapshot_path(state_dir,host))
+    if snapshot is None:
+        return ({})
+
+    return (snapshot)
+
+def save(state_dir,host,snapshot):
+    state_file.write(snapshot_path(state_dir,host),snapshot)
+
+#
+# Indexes of peers that need their details fetched again
+#
+def changed_peers(snapshot,live):
+    changed = []
+    for index,(state,transitions) in live.items():
+        peer = snapshot.get(index)
+        if peer is None or peer[0] != state or peer[1] != transitions:
+            changed.append(index)
+
+    return (changed)
+
+#
+# Build the next snapshot from the live walk, the old snapshot
+# and the details fetched for changed peers
+#
+# Peers that are gone from the live walk are dropped. failed
+# are the peers whose details could not be fetched: they keep
+# their old details, with the transitions unset so they are
+# fetched again next run, and new ones are left out until
+# their details come in.
+#
+def update(snapshot,live,details,failed=(),now=None):
+    if now is None:
+        now = time.time()
+
+    failed  = set(failed)
+    updated = {}
+    for index,(state,transitions) in live.items():
+        peer = snapshot.get(index)
+
+        if index in details:
+            asn,reason = details[index]
+        elif peer is None:
+            continue
+        else:
+            asn,reason = peer[2],peer[3]
+            if index in failed:
+                transitions = None
+
+        if peer is not None and peer[0] == state:
+            changed = peer[4]
+        else:
+            changed = now
+
+        updated[index] = [state, transitions, asn, reason, changed]
+
+    return (updated)
@@ -7,19 +7,56 @@
 # Use of the "-v" flag causes verbose output
 # which can be useful for troubleshooting.
 #
+# "-s" streams the peer table instead of collecting it first:
+# peers are decoded and counted, or printed with -v, as GETBULK
+# responses come in, so memory stays flat on route servers
+# with thousands of peers. "-J" also writes every peer to a
+# JSON file as it goes.
+#
+# "-p" also walks the accepted, denied and advertised prefix
+# counters of every peer and address family along with the
+# peer table, and alarms on established peers whose accepted
+# or advertised prefixes dropped since the last run by the
+# shares given with "-d".
+#
+# Runs on Python 2.7 and 3, and imports under both so the
+# poller and check_iosxr.py can reuse its functions.
+#
 # Marcus Eide, SVT 2015
 
 
+from __future__ import print_function
+
+import itertools
+import json
 import sys
-import netsnmp
-import time
 from optparse import OptionParser
 
+import bgp_prefixes
+import bgp_snapshot
+import inet_address
+import snmp_limit
+import snmp_replay
+import snmp_retry
+import snmp_session
+import snmp_stats
+import snmp_table
+import snmp_usm
+import state_file
+
+# CISCO-BGP4-MIB cbgpPeer2Table columns
+BGP_PEER_STATE     = '.1.3.6.1.4.1.9.9.187.1.2.5.1.3'
+BGP_PEER_REMOTE_AS = '.1.3.6.1.4.1.9.9.187.1.2.5.1.11'
+BGP_PEER_FSM_TRANS = '.1.3.6.1.4.1.9.9.187.1.2.5.1.18'
+BGP_PEER_LAST_ERR  = '.1.3.6.1.4.1.9.9.187.1.2.5.1.28'
+
+BGP_PEER_COLUMNS   = [BGP_PEER_STATE, BGP_PEER_REMOTE_AS, BGP_PEER_FSM_TRANS, BGP_PEER_LAST_ERR]
+
 #
 # Options
 #
 def options():
-    parser = OptionParser(usage="usage: %prog -H [host] -c [community] [-v]")
+    parser = OptionParser(usage="usage: %prog -H [host] (-c [community] | -u [user] -a [auth-pass] [-x priv-pass] [-e engine-dir]) [-v] [-b [-m max-repetitions]] [-S state-dir] [-s [-J json-file]] [-p prefix-dir [-d warn,crit]] [-t timeout] [-r retries] [-w backoff] [-l rate] [-n inflight] [-L dir] [-P]")
     
     parser.add_option("-H",
                       type="string",
@@ -39,40 +76,92 @@ def options():
                       help="use verbose output (no alarms raised)"
                       )
     
+    parser.add_option("-b",
+                      action="store_true",
+                      dest="bulk",
+                      help="fetch the whole peer table with GETBULK instead of one get per peer"
+                      )
+    
+    parser.add_option("-m",
+                      type="int",
+                      dest="maxrep",
+                      default=snmp_table.DEFAULT_MAX_REPETITIONS,
+                      help="GETBULK max-repetitions used with -b (default %default)"
+                      )
+    
+    parser.add_option("-S",
+                      type="string",
+                      dest="state_dir",
+                      help="keep a peer snapshot in this directory and only fetch details for changed peers, implies -b"
+                      )
+    
+    parser.add_option("-s",
+                      action="store_true",
+                      dest="stream",
+                      help="stream the peer table with GETBULK instead of holding it in memory"
+                      )
+    
+    parser.add_option("-J",
+                      type="string",
+                      dest="json_file",
+                      help="write every peer to this file as JSON, implies -s"
+                      )
+    
+    parser.add_option("-p",
+                      type="string",
+                      dest="prefix_dir",
+                      help="keep per-peer prefix counts in this directory and alarm on drops, implies -b"
+                      )
+    
+    parser.add_option("-d",
+                      type="string",
+                      dest="drop",
+                      help="accepted or advertised prefix drop in percent that warns and goes critical with -p (default {0:g},{1:g})".format(*bgp_prefixes.DEFAULT_DROP)
+                      )
+    
+    snmp_retry.add_options(parser)
+    snmp_limit.add_options(parser)
+    snmp_usm.add_options(parser)
+    snmp_replay.add_options(parser)
+    
+    parser.add_option("-P", "--profile",
+                      action="store_true",
+                      dest="profile",
+                      help="print a per-OID latency histogram on stderr"
+                      )
+    
     (options, args) = parser.parse_args()
     
-    if (not options.host or not options.community):
+    if (not options.host or not snmp_usm.has_auth(options) or
+        (options.record and options.replay) or
+        (options.prefix_dir and (options.stream or options.json_file))):
         parser.print_help()
         sys.exit(3) # Unknown
+    
+    try:
+        drop = bgp_prefixes.parse_drop(options.drop)
+    except ValueError:
+        print ("Bad prefix drop limits {0}".format(options.drop))
+        sys.exit(3) # Unknown
         
-    return(options.host, options.community, options.verbose)
-
-#
-# Convert decimal character to hexadecimal character
-#
-def ipv6_converter(decimal):
-    # .1.3.6.1.4.1.9.9.187.1.2.5.1.3.2.16.32.1.7.248.0.13.0.252.0.0.0.0.0.0.0.115
-    # base                          .1.3.6.1.4.1.9.9.187.1.2.5.1.3.2.16
-    # ip address in decimal form:   32.1.7.248.0.13.0.252.0.0.0.0.0.0.0.115
-    #
-    # 32 = 20
-    # 1 = 01
-    # 7 = 07
-    # 248 = f8
-    # 0 = 0
-    # 13 = d
-    # 0 = 0
-    # = 2001:07f8:0d0
-    # and so on...
-  
-    # Only convert double digit characters to hex
-    # Fill single characters with leading zero
-    if len(decimal) == 1:
-        decimal = decimal.zfill(2)
-    else:
-        decimal = hex(int(decimal))[2:]
-        
-    return decimal
+    try:
+        replay = snmp_replay.from_options(options)
+    except (snmp_replay.CaptureError, IOError, OSError, ValueError) as e:
+        print ("Bad capture file {0}: {1}".format(options.replay, e))
+        sys.exit(3) # Unknown
+    
+    try:
+        state_file.prepare(options.state_dir,options.prefix_dir,options.engine_dir)
+    except OSError as e:
+        print ("Bad state directory: {0}".format(e))
+        sys.exit(3) # Unknown
+    
+    return(options.host, snmp_usm.from_options(options) or options.community, options.verbose, options.bulk, options.maxrep,
+           options.state_dir, options.stream or bool(options.json_file), options.json_file,
+           options.prefix_dir, drop,
+           snmp_retry.from_options(options),
+           snmp_limit.from_options(options), options.profile,
+           replay)
 
 #
 # Maps SNMP Integer state to more readable format
@@ -102,30 +191,26 @@ def check_neighbor_status_v4(host,community):
     reasons_v4 = {}
   
     # Walk all peers from BGP-MIB
-    oids_v4 = netsnmp.VarList( netsnmp.Varbind('.1.3.6.1.4.1.9.9.187.1.2.5.1.3.1.4'))
-    res_v4  = netsnmp.snmpwalk( oids_v4, Version = 2, DestHost = host, Community = community)
-  
+    #
     # Due to SNMP deamon lagg in the router, when switching communities from one to the other,
     # sometimes we fail to get snmp.
-    # If we wait 5 sec and try again it should work just fine
-    if not res_v4:
-        time.sleep(5)
-        oids_v4 = netsnmp.VarList( netsnmp.Varbind('.1.3.6.1.4.1.9.9.187.1.2.5.1.3.1.4'))
-        res_v4  = netsnmp.snmpwalk( oids_v4, Version = 2, DestHost = host, Community = community)
+    # If we back off a little and try again it should work just fine
+    with snmp_stats.phase('walk'):
+        oids_v4 = snmp_retry.policy.retry(host,lambda: snmp_session.walk(host,community,BGP_PEER_STATE+'.1.4'),
+                                          len)
+        
+    with snmp_stats.phase('get'):
+        for oid_v4 in oids_v4:
+            ipv4           = snmp_table.varbind_oid(oid_v4).replace(BGP_PEER_STATE+'.1.4.', "")
+            peers_v4[ipv4] = get_state(oid_v4.val)
+        
+            # Get RemoteAs from BGP-MIB
+            asn           = snmp_session.get(host,community,BGP_PEER_REMOTE_AS+'.1.4.'+ipv4)
+            asns_v4[ipv4] = asn[0]
         
-    for oid_v4 in oids_v4:
-        ipv4           = oid_v4.tag.replace("enterprises.9.9.187.1.2.5.1.3.1.4.", "")
-        peers_v4[ipv4] = get_state(oid_v4.val)
-    
-        # Get RemoteAs from BGP-MIB
-        asoid         = netsnmp.Varbind('.1.3.6.1.4.1.9.9.187.1.2.5.1.11.1.4.'+ipv4)
-        asn           = netsnmp.snmpget( asoid, Version = 2, DestHost = host, Community = community )
-        asns_v4[ipv4] = asn[0]
-    
-        # Get lastErrorTxt from BGP-MIB
-        reasonoid        = netsnmp.Varbind('.1.3.6.1.4.1.9.9.187.1.2.5.1.28.1.4.'+ipv4)
-        reason           = netsnmp.snmpget( reasonoid, Version = 2, DestHost = host, Community = community )
-        reasons_v4[ipv4] = reason[0]
+            # Get lastErrorTxt from BGP-MIB
+            reason           = snmp_session.get(host,community,BGP_PEER_LAST_ERR+'.1.4.'+ipv4)
+            reasons_v4[ipv4] = reason[0]
         
     return (peers_v4,asns_v4,reasons_v4)
 
@@ -138,85 +223,292 @@ def check_neighbor_status_v6(host,community):
     reasons_v6= {}
   
     # Walk all peers from BGP-MIB
-    oids_v6 = netsnmp.VarList( netsnmp.Varbind('.1.3.6.1.4.1.9.9.187.1.2.5.1.3.2.16'))
-    res_v6  = netsnmp.snmpwalk( oids_v6, Version = 2, DestHost = host, Community = community )
+    with snmp_stats.phase('walk'):
+        oids_v6 = snmp_session.walk(host,community,BGP_PEER_STATE+'.2.16')
   
-    for oid_v6 in oids_v6:
-        ipv6 = oid_v6.tag.split('.')
-        oid  = oid_v6.tag
-    
-        # Convert into hexadecimal, each variable 16 bytes long
-        a = ipv6_converter(ipv6[11]) +ipv6_converter(ipv6[12])
-        b = ipv6_converter(ipv6[13]) +ipv6_converter(ipv6[14])
-        c = ipv6_converter(ipv6[15]) +ipv6_converter(ipv6[16])
-        d = ipv6_converter(ipv6[17]) +ipv6_converter(ipv6[18])
-        e = ipv6_converter(ipv6[19]) +ipv6_converter(ipv6[20])
-        f = ipv6_converter(ipv6[21]) +ipv6_converter(ipv6[22])
-        g = ipv6_converter(ipv6[23]) +ipv6_converter(ipv6[24])
-        h = ipv6_converter(ipv6[25]) +ipv6_converter(ipv6[26])
-    
-        # Remove leading zeroes
-        a = a.lstrip("0")
-        b = b.lstrip("0")
-        c = c.lstrip("0")
-        d = d.lstrip("0")
-        e = e.lstrip("0")
-        f = f.lstrip("0")
-        g = g.lstrip("0")
-        h = h.lstrip("0")
-    
-        # Contstruct properly formatted IPv6 address
-        ipv6 = a +':' +b +':' +c +':' +d +':' +e +':' +f +':' +g
-        ipv6 = ipv6.rstrip(":")
-        ipv6 = ipv6 +'::' +h
-    
-        peers_v6[ipv6] = get_state(oid_v6.val)
-    
-        # Get RemoteAs from BGP-MIB
-        oid           = oid.replace("enterprises.9.9.187.1.2.5.1.3.2.16.", "enterprises.9.9.187.1.2.5.1.11.2.16.")
-        asoid         = netsnmp.Varbind(oid)
-        asn           = netsnmp.snmpget( asoid, Version = 2, DestHost = host, Community = community )
-        asns_v6[ipv6] = asn[0]
-    
-        # Get lastErrorTxt from BGP-MIB
-        oid              = oid.replace("enterprises.9.9.187.1.2.5.1.11.2.16.", "enterprises.9.9.187.1.2.5.1.28.2.16.")
-        reasonoid        = netsnmp.Varbind(oid)
-        reason           = netsnmp.snmpget( reasonoid, Version = 2, DestHost = host, Community = community )
-        reasons_v6[ipv6] = reason[0]
+    with snmp_stats.phase('get'):
+        for oid_v6 in oids_v6:
+            index = snmp_table.varbind_oid(oid_v6).replace(BGP_PEER_STATE+'.', "")
+            ipv6  = inet_address.decode_cached(index)[1]
+        
+            peers_v6[ipv6] = get_state(oid_v6.val)
+        
+            # Get RemoteAs from BGP-MIB
+            asn           = snmp_session.get(host,community,BGP_PEER_REMOTE_AS+'.'+index)
+            asns_v6[ipv6] = asn[0]
+        
+            # Get lastErrorTxt from BGP-MIB
+            reason           = snmp_session.get(host,community,BGP_PEER_LAST_ERR+'.'+index)
+            reasons_v6[ipv6] = reason[0]
         
     return (peers_v6,asns_v6,reasons_v6)
 
 #
-# Main function
+# GETBULK state, RemoteAs and lastErrorTxt for both v4 and v6
+# peers in one go and join them by index locally
 #
-def main():
+# Given a dict for prefixes, the prefix counters are walked in
+# the same GETBULKs and put in it by peer index.
+#
+def check_neighbor_status_table(host,community,maxrep,prefixes=None):
+    columns = [BGP_PEER_STATE, BGP_PEER_REMOTE_AS, BGP_PEER_LAST_ERR]
+    session = snmp_session.session(host,community)
+    walked  = columns + (bgp_prefixes.COLUMNS if prefixes is not None else [])
+    
+    # Same snmpd lagg as in check_neighbor_status_v4, back off and try again
+    with snmp_stats.phase('walk'):
+        table = snmp_retry.policy.retry(host,lambda: snmp_table.bulk_walk(session,walked,maxrep),
+                                        lambda table: table[BGP_PEER_STATE])
+        
+    rows = snmp_table.join_rows(table,columns)
+    if prefixes is not None:
+        prefixes.update(bgp_prefixes.prefix_rows(table))
+    
+    return (split_peer_rows(rows))
+
+#
+# Walk only state and established transitions, and fetch RemoteAs and
+# lastErrorTxt just for peers that are new or changed since last run
+#
+# prefixes as for check_neighbor_status_table.
+#
+def check_neighbor_status_incremental(host,community,maxrep,state_dir,prefixes=None):
+    snapshot = bgp_snapshot.load(state_dir,host)
+    
+    # Nothing to compare with, fetch everything in one go
+    if not snapshot:
+        columns = [BGP_PEER_STATE, BGP_PEER_FSM_TRANS, BGP_PEER_REMOTE_AS, BGP_PEER_LAST_ERR]
+    else:
+        columns = [BGP_PEER_STATE, BGP_PEER_FSM_TRANS]
+        
+    session = snmp_session.session(host,community)
+    walked  = columns + (bgp_prefixes.COLUMNS if prefixes is not None else [])
+    
+    # Same snmpd lagg as in check_neighbor_status_v4, back off and try again
+    with snmp_stats.phase('walk'):
+        table = snmp_retry.policy.retry(host,lambda: snmp_table.bulk_walk(session,walked,maxrep),
+                                        lambda table: table[BGP_PEER_STATE])
+        
+    rows = snmp_table.join_rows(table,columns)
+    if prefixes is not None:
+        prefixes.update(bgp_prefixes.prefix_rows(table))
+    live = dict((index, row[:2]) for index,row in rows.items())
+    
+    if not snapshot:
+        changed = list(rows)
+        fetched = dict((index, row[2:]) for index,row in rows.items())
+    else:
+        changed = bgp_snapshot.changed_peers(snapshot,live)
+        oids    = []
+        for index in changed:
+            oids.append(BGP_PEER_REMOTE_AS+'.'+index)
+            oids.append(BGP_PEER_LAST_ERR+'.'+index)
+        with snmp_stats.phase('get'):
+            values = snmp_session.get_many(host,community,oids)
+        fetched = dict((index, (values[2*n], values[2*n+1])) for n,index in enumerate(changed))
+    
+    # Details that timed out are fetched again next run, not saved as None
+    details = dict((index, row) for index,row in fetched.items() if None not in row)
+    failed  = [index for index in changed if index not in details]
+    
+    # Don't throw away a good snapshot because of one failed walk
+    if live:
+        snapshot = bgp_snapshot.update(snapshot,live,details,failed)
+        bgp_snapshot.save(state_dir,host,snapshot)
+    
+    rows = {}
+    for index,(state,transitions) in live.items():
+        peer = snapshot.get(index)
+        if peer is not None:
+            rows[index] = (state, peer[2], peer[3])
+        else:
+            rows[index] = (state,) + fetched.get(index, (None, None))
+    
+    return (split_peer_rows(rows))
+
+#
+# Split joined cbgpPeer2Table rows into v4 and v6 peers
+#
+def split_peer_rows(rows):
+    peers_v4   = {}
+    asns_v4    = {}
+    reasons_v4 = {}
+    peers_v6   = {}
+    asns_v6    = {}
+    reasons_v6 = {}
+    
+    for index,(state,asn,reason) in rows.items():
+        # Index is cbgpPeer2Type.length.address
+        try:
+            type,address,rest = inet_address.decode_cached(index)
+        except inet_address.DecodeError:
+            continue
+        
+        if type in (inet_address.IPV4, inet_address.IPV4Z):
+            peers_v4[address]   = get_state(state)
+            asns_v4[address]    = asn
+            reasons_v4[address] = reason
+            
+        elif type in (inet_address.IPV6, inet_address.IPV6Z):
+            peers_v6[address]   = get_state(state)
+            asns_v6[address]    = asn
+            reasons_v6[address] = reason
+            
+    return ((peers_v4,asns_v4,reasons_v4),(peers_v6,asns_v6,reasons_v6))
+
+#
+# One peer in the streaming mode
+#
+class Peer(object):
+    __slots__ = ('type', 'address', 'state', 'asn', 'reason')
+    
+    def __init__(self,type,address,state,asn,reason):
+        self.type    = type
+        self.address = address
+        self.state   = state
+        self.asn     = asn
+        self.reason  = reason
+    
+    def is_v4(self):
+        return (self.type in (inet_address.IPV4, inet_address.IPV4Z))
+
+#
+# Joined cbgpPeer2Table rows as they are walked, the walk is
+# tried again if the table comes back empty
+#
+def stream_peer_rows(host,community,maxrep):
+    columns = [BGP_PEER_STATE, BGP_PEER_REMOTE_AS, BGP_PEER_LAST_ERR]
+    session = snmp_session.session(host,community)
+    
+    # Same snmpd lagg as in check_neighbor_status_v4, but only the
+    # first row can tell, the rest is still to come
+    def fetch():
+        rows = snmp_table.bulk_rows(session,columns,maxrep)
+        return (next(rows, None), rows)
+    
+    first,rows = snmp_retry.policy.retry(host,fetch,lambda result: result[0] is not None)
+    if first is None:
+        return (iter(()))
+    
+    return (itertools.chain([first], rows))
+
+#
+# Decode rows into peers, skipping indexes that aren't addresses
+#
+def decode_peers(rows):
+    for index,(state,asn,reason) in rows:
+        try:
+            type,address,rest = inet_address.decode_cached(index)
+        except inet_address.DecodeError:
+            continue
+        
+        if type in (inet_address.IPV4, inet_address.IPV4Z, inet_address.IPV6, inet_address.IPV6Z):
+            yield (Peer(type,address,get_state(state),asn,reason))
+
+#
+# Peers written to a JSON file one at a time
+#
+class JsonPeers(object):
+    
+    def __init__(self,path,host):
+        self.file  = open(path, 'w')
+        self.count = 0
+        self.file.write('{{"host": {0}, "peers": ['.format(json.dumps(host)))
+    
+    def add(self,peer):
+        if self.count:
+            self.file.write(',')
+        self.file.write('\n' + json.dumps({'address': peer.address,
+                                           'family':  'ipv4' if peer.is_v4() else 'ipv6',
+                                           'state':   peer.state,
+                                           'asn':     peer.asn,
+                                           'reason':  peer.reason}))
+        self.count += 1
+    
+    def close(self,exitcode):
+        self.file.write('\n], "exitcode": {0}}}\n'.format(exitcode))
+        self.file.close()
+
+#
+# check_result for a stream of peers
+#
+# Counts peers and only keeps the ones that are down, with -v
+# every peer is printed as it comes instead.
+#
+def check_stream(peers,verbose,out=None):
+    exitcode = 0
+    up_v4    = 0
+    up_v6    = 0
+    total    = 0
+    down     = []
+    
+    for peer in peers:
+        if out is not None:
+            out.add(peer)
+        
+        if verbose:
+            if not total:
+                print ("Neighbor\t\tAS\tState\tLast known reason")
+                print ("---------------------------------------------------------------")
+            if peer.is_v4():
+                print ("{0}\t\t{1}\t{2}\t{3}".format(peer.address, peer.asn, peer.state, peer.reason))
+            else:
+                print ("{0}\t{1}\t{2}\t{3}".format(peer.address, peer.asn, peer.state, peer.reason))
+        elif peer.state != "ESTAB":
+            down.append("Neighbor {0} (AS{1}) is DOWN ({2}) -".format(
+                peer.address,
+                peer.asn,
+                peer.state)
+                   )
+            exitcode = 2
+        elif peer.is_v4():
+            up_v4 += 1
+        else:
+            up_v6 += 1
+        total += 1
+    
+    # Exit if no neighbors at all, probably snmp failure
+    if not total:
+        return (3, "No SNMP data") # Unknown
+    
+    if verbose:
+        return (exitcode, "---------------------------------------------------------------\n"
+                          "Total number of peers: {0}".format(total))
+    
+    if down:
+        return (exitcode, " ".join(down))
+    
+    return (exitcode, "{0} IPv4 neighbors ESTAB, {1} IPv6 neighbors ESTAB".format(up_v4, up_v6))
+
+#
+# Build the Nagios exit code and output from the peer tables
+#
+def check_result(v4,v6,verbose):
     exitcode    = 0
     total_peers = 0
+    output      = []
+    down        = []
     
-    host,community,verbose = options()
+    peers_v4,asns_v4,reasons_v4 = v4
+    peers_v6,asns_v6,reasons_v6 = v6
     
     peers_up_v4   = []
     #peers_shut_v4 = []
     peers_up_v6   = []
     #peers_shut_v6 = []
     
-    # Run checks
-    peers_v4,asns_v4,reasons_v4 = check_neighbor_status_v4(host,community)
-    peers_v6,asns_v6,reasons_v6 = check_neighbor_status_v6(host,community)
-    
     # Exit if no neighbors at all, probably snmp failure
     if not peers_v4 and not peers_v6:
-        print "No SNMP data"
-        sys.exit(3) # Unknown
+        return (3, "No SNMP data") # Unknown
         
     if verbose:
-        print "Neighbor\t\tAS\tState\tLast known reason"
-        print "---------------------------------------------------------------"
+        output.append("Neighbor\t\tAS\tState\tLast known reason")
+        output.append("---------------------------------------------------------------")
   
     # Loop trough v4 peers
-    for peer,state in peers_v4.iteritems():
+    for peer,state in peers_v4.items():
         if verbose:
-            print ("{0}\t\t{1}\t{2}\t{3}".format(
+            output.append("{0}\t\t{1}\t{2}\t{3}".format(
                 peer,
                 asns_v4[peer],
                 state,
@@ -226,11 +518,11 @@ def main():
         else:
             #if state != "ESTAB" and reasons_v4[peer] != 'administrative shutdown':
             if state != "ESTAB":
-                print ("Neighbor {0} (AS{1}) is DOWN ({2}) -".format(
+                down.append("Neighbor {0} (AS{1}) is DOWN ({2}) -".format(
                     peer,
                     asns_v4[peer],
                     state)
-                       ),
+                       )
                 exitcode = 2
             #elif state != "ESTAB" and reasons_v4[peer] == 'administrative shutdown':
             #    peers_shut_v4.append(peer)
@@ -238,9 +530,9 @@ def main():
                 peers_up_v4.append(peer)
                 
     # Loop through v6 peers      
-    for peer,state in peers_v6.iteritems():
+    for peer,state in peers_v6.items():
         if verbose:
-            print ("{0}\t{1}\t{2}\t{3}".format(
+            output.append("{0}\t{1}\t{2}\t{3}".format(
                 peer,
                 asns_v6[peer],
                 state,
@@ -250,35 +542,173 @@ def main():
         else:
             #if state != "ESTAB" and reasons_v6[peer] != 'administrative shutdown':
             if state != "ESTAB":
-                print ("Neighbor {0} (AS{1}) is DOWN ({2}) -".format(
+                down.append("Neighbor {0} (AS{1}) is DOWN ({2}) -".format(
                     peer,
                     asns_v6[peer],
                     state)
-                       ),
+                       )
                 exitcode = 2
             #elif state != "ESTAB" and reasons_v6[peer] == 'administrative shutdown':
             #    peers_shut_v6.append(peer)
             else:
                 peers_up_v6.append(peer)
     
+    # Down neighbors all go on the status line
+    if down:
+        output.append(" ".join(down))
+    
     # Print summary
     if not verbose and exitcode == 0:
-        #print ("{0} IPv4 neighbors ESTAB ({1} in ADMIN_DOWN), {2} IPv6 neighbors ESTAB ({3} in ADMIN_DOWN)".format(
+        #output.append("{0} IPv4 neighbors ESTAB ({1} in ADMIN_DOWN), {2} IPv6 neighbors ESTAB ({3} in ADMIN_DOWN)".format(
         #    len(peers_up_v4),
         #    len(peers_shut_v4),
         #    len(peers_up_v6),
         #    len(peers_shut_v6))
         #       )
-        print ("{0} IPv4 neighbors ESTAB, {1} IPv6 neighbors ESTAB").format(
+        output.append("{0} IPv4 neighbors ESTAB, {1} IPv6 neighbors ESTAB".format(
             len(peers_up_v4),
-            len(peers_up_v6),
+            len(peers_up_v6))
                )
       
     if verbose:
-        print "---------------------------------------------------------------"
-        print 'Total number of peers:', total_peers
+        output.append("---------------------------------------------------------------")
+        output.append("Total number of peers: {0}".format(total_peers))
+        
+    return (exitcode, "\n".join(output))
+
+#
+# Prefix drops of established peers since the last run
+#
+# Returns the exit code and output to add to check_result's, with
+# -v a listing of every peer's counters and their changes instead
+# of alarms.
+#
+def check_prefixes(prefix_dir,host,prefixes,v4,v6,drop,verbose):
+    previous    = bgp_prefixes.load(prefix_dir,host)
+    names       = {}
+    established = []
+    
+    for index in prefixes:
+        try:
+            type,address,rest = inet_address.decode_cached(index)
+        except inet_address.DecodeError:
+            continue
+        
+        peers,asns,reasons = v4 if type in (inet_address.IPV4, inet_address.IPV4Z) else v6
+        names[index] = (address, asns.get(address))
+        if peers.get(address) == "ESTAB":
+            established.append(index)
+    
+    alarms = bgp_prefixes.evaluate(previous,prefixes,established,drop)
+    
+    # Don't forget the last counts because of one failed walk, nor
+    # the ones a drop is measured from until it recovers
+    if prefixes:
+        bgp_prefixes.save(prefix_dir,host,bgp_prefixes.baseline(previous,prefixes,alarms))
+    
+    if verbose:
+        output = ["", "Neighbor\t\tFamily\t\tAccepted\tDenied\tAdvertised"]
+        for index in sorted(names, key=lambda index: names[index][0]):
+            for family,counts in sorted(prefixes[index].items()):
+                before = previous.get(index, {}).get(family)
+                values = []
+                for n,value in enumerate(counts):
+                    if before and value is not None and before[n] is not None and value != before[n]:
+                        values.append("{0} ({1:+d})".format(value, value - before[n]))
+                    else:
+                        values.append(str(value))
+                output.append("{0}\t{1}\t{2}".format(names[index][0], bgp_prefixes.family_name(family), "\t".join(values)))
+        return (0, "\n".join(output))
+    
+    exitcode = 0
+    output   = []
+    for code,index,family,counter,before,after,loss in alarms:
+        exitcode = max(exitcode, code)
+        output.append("Neighbor {0} (AS{1}) {2} {3} prefixes dropped from {4} to {5} ({6:.0f}%) -".format(
+            names[index][0],
+            names[index][1],
+            bgp_prefixes.family_name(family),
+            counter,
+            before,
+            after,
+            loss)
+               )
+    
+    return (exitcode, " ".join(output))
+
+#
+# Main function
+#
+def main():
+    host,community,verbose,bulk,maxrep,state_dir,stream,json_file,prefix_dir,drop,policy,limiter,profile,replay = options()
+    
+    snmp_replay.use(replay)
+    snmp_retry.use(policy)
+    snmp_limit.use(limiter)
+    snmp_stats.reset(profile)
+    snmp_stats.stats.add_columns(BGP_PEER_COLUMNS)
+    
+    # Run checks
+    if stream:
+        out = json_file and JsonPeers(json_file,host)
+        
+        # Walking and evaluating are interleaved, it all counts as walk
+        with snmp_stats.phase('walk'):
+            try:
+                exitcode,output = check_stream(decode_peers(stream_peer_rows(host,community,maxrep)),verbose,out)
+            except snmp_table.IncompleteWalk as e:
+                exitcode,output = 3, "Incomplete SNMP data ({0})".format(e) # Unknown
+        
+        if out:
+            out.close(exitcode)
+        
+        # With -v the peers are out already, perfdata goes last
+        if verbose:
+            print (output)
+            print ("| " + snmp_stats.perfdata())
+        else:
+            print (snmp_stats.with_perfdata(output,snmp_stats.perfdata()))
+        
+        if profile:
+            snmp_stats.print_histogram()
+        
+        snmp_session.close_all()
+        sys.exit(exitcode)
+    
+    prefixes = {} if prefix_dir else None
+    try:
+        if state_dir:
+            v4,v6 = check_neighbor_status_incremental(host,community,maxrep,state_dir,prefixes)
+        elif bulk or prefix_dir:
+            v4,v6 = check_neighbor_status_table(host,community,maxrep,prefixes)
+        else:
+            v4 = check_neighbor_status_v4(host,community)
+            v6 = check_neighbor_status_v6(host,community)
+    except snmp_table.IncompleteWalk as e:
+        print (snmp_stats.with_perfdata("Incomplete SNMP data ({0})".format(e),snmp_stats.perfdata()))
+        snmp_session.close_all()
+        sys.exit(3) # Unknown
+    
+    with snmp_stats.phase('eval'):
+        exitcode,output = check_result(v4,v6,verbose)
+        
+        # Prefix drops go on the status line, in place of the summary of an OK check
+        if prefix_dir and exitcode != 3:
+            code,alarms = check_prefixes(prefix_dir,host,prefixes,v4,v6,drop,verbose)
+            if verbose:
+                output += alarms
+            elif alarms and exitcode == 0:
+                output = alarms
+            elif alarms:
+                output += " " + alarms
+            exitcode = max(exitcode,code)
+    print(snmp_stats.with_perfdata(output,snmp_stats.perfdata()))
+    
+    if profile:
+        snmp_stats.print_histogram()
         
     # Exit
+    snmp_session.close_all()
     sys.exit(exitcode)
 
 #
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+# Long-running version of the BGP and environment checks.
+#
+# Every Nagios active check pays for interpreter startup,
+# imports and SNMP session setup before it sends a single
+# PDU. This daemon stays up, schedules both checks for every
+# router in the inventory on its own interval, keeps one
+# open session per router between cycles and hands the
+# results to Nagios as passive check results.
+#
+# Results go either to the external command file (-o) as
+# PROCESS_SERVICE_CHECK_RESULT commands, or as check result
+# files into the Nagios checkresults spool directory (-s),
+# see passive_result.py.
+# Exit codes and output texts are the same as the active
+# checks produce.
+
+import asyncio
+import random
+import signal
+import sys
+import time
+import traceback
+
+import passive_result
+import poller
+import snmp_async
+
+DEFAULT_INTERVAL = 300
+
+#
+# Options
+#
+def options():
+    parser = poller.option_parser("usage: %prog -f [inventory] [-c community] (-o [command file] | -s [spool dir]) [-i interval]")
+
+    parser.add_option("-i",
+                      type="int",
+                      dest="interval",
+                      default=DEFAULT_INTERVAL,
+                      help="seconds between checks of a router without its own interval (default %default)")
+
+    parser.add_option("-o",
+                      type="string",
+                      dest="command_file",
+                      help="Nagios external command file to write results to")
+
+    parser.add_option("-s",
+                      type="string",
+                      dest="spool_dir",
+                      help="Nagios check result spool directory to write results to")
+
+    parser.add_option("-B",
+                      type="string",
+                      dest="bgp_service",
+                      default="bgp",
+                      help="service description for BGP results (default %default)")
+
+    parser.add_option("-E",
+                      type="string",
+                      dest="env_service",
+                      default="env",
+                      help="service description for environment results (default %default)")
+
+    options = poller.parse_options(parser)
+
+    if bool(options.command_file) == bool(options.spool_dir):
+        parser.print_help()
+        sys.exit(3) # Unknown
+
+    options.services = {'bgp': options.bgp_service, 'env': options.env_service}
+
+    return (options)
+
+#
+# Check one router forever, keeping its session open between cycles
+#
+async def run_device(host,community,interval,options,devices,writer,stopping):
+    session = None
+
+    # Spread the first checks over the interval so routers don't all fire at once
+    try:
+        await asyncio.wait_for(stopping.wait(), random.uniform(0, interval))
+        return
+    except asyncio.TimeoutError:
+        pass
+
+    while not stopping.is_set():
+        started = time.time()
+        next    = time.monotonic() + interval
+
+        async with devices:
+            try:
+                if session is None:
+                    session = snmp_async.AsyncSession(host,community,
+                                                      policy=options.policy,
+                                                      limiter=options.limiter,
+                                                      limit=options.pdus)
+                    await session.open()
+
+                results = await poller.run_checks(session,options.checks,options.maxrep)
+            except OSError as e:
+                results = [(3, "No SNMP data ({0})".format(e)) for check in options.checks]
+
+                # Start over with a fresh socket next cycle
+                if session is not None:
+                    session.close()
+                    session = None
+            except Exception as e:
+                traceback.print_exc()
+                results = [(3, "Check failed ({0})".format(e)) for check in options.checks]
+
+        finished = time.time()
+        for check,(exitcode,output) in zip(options.checks,results):
+            try:
+                writer.submit(host,options.services[check],exitcode,output,started,finished)
+            except (IOError, OSError) as e:
+                sys.stderr.write("Can't submit {0} result for {1}: {2}\n".format(check, host, e))
+
+        try:
+            await asyncio.wait_for(stopping.wait(), max(0, next - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+
+    if session is not None:
+        session.close()
+
+async def run(inventory,options,writer):
+    loop     = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    devices  = asyncio.Semaphore(options.devices)
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    await asyncio.gather(*[run_device(host,community,interval or options.interval,
+                                      options,devices,writer,stopping)
+                           for host,community,interval in inventory])
+
+def main():
+    opts      = options()
+    inventory = poller.read_inventory(opts.inventory,opts.community)
+    try:
+        writer = passive_result.open_writer(opts.command_file,opts.spool_dir)
+    except IOError as e:
+        print ("Bad spool directory: {0}".format(e))
+        sys.exit(3) # Unknown
+
+    asyncio.run(run(inventory,opts,writer))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+# Nagios script that runs the BGP and environment checks
+# against one router from a single poll.
+#
+# check_bgp_neighbors.py and check_env.py each open their
+# own session, walk their own tables and retry on their own.
+# Here one session walks the cbgpPeer2Table columns and the
+# sensor, threshold and entity tables side by side, every
+# GETBULK carrying whichever columns of either check are not
+# finished yet. Both results are then evaluated from that one
+# set of tables, with the same exit codes and output texts as
+# the single checks in -b mode.
+#
+# One host;check;exitcode;output line is printed per check,
+# as from poller.py, and the exit code is the worst of both.
+# With -o or -s the results are also submitted to Nagios as
+# passive check results for the -B and -E services. Both
+# outputs carry the perfdata of the shared poll.
+
+from __future__ import print_function
+
+import sys
+import time
+from optparse import OptionParser
+
+import check_bgp_neighbors
+import check_env
+import passive_result
+import sensor_eval
+import snmp_limit
+import snmp_replay
+import snmp_retry
+import snmp_session
+import snmp_stats
+import snmp_table
+import snmp_usm
+import state_file
+
+BGP_COLUMNS = [check_bgp_neighbors.BGP_PEER_STATE,
+               check_bgp_neighbors.BGP_PEER_REMOTE_AS,
+               check_bgp_neighbors.BGP_PEER_LAST_ERR]
+
+ENV_GROUPS  = (check_env.SENSOR_COLUMNS,
+               check_env.THRESHOLD_COLUMNS,
+               check_env.PHYSICAL_COLUMNS)
+
+# Every column of both checks, walked in one schedule
+COLUMNS     = (BGP_COLUMNS + [column for columns in ENV_GROUPS for column in columns] +
+               check_env.TREE_COLUMNS)
+
+#
+# Options
+#
+def options():
+    parser = OptionParser(usage="usage: %prog -H [host] (-c [community] | -u [user] -a [auth-pass] [-x priv-pass] [-e engine-dir]) [-v] [-m max-repetitions] [-R rules] [-D history-dir] [-A trend-dir -G trend-rules] [-o command file | -s spool dir] [-B service] [-E service] [-t timeout] [-r retries] [-w backoff] [-l rate] [-n inflight] [-L dir] [-P]")
+
+    parser.add_option("-H",
+                      type="string",
+                      dest="host",
+                      help="hostname of router")
+
+    parser.add_option("-c",
+                      type="string",
+                      dest="community",
+                      help="snmp community")
+
+    parser.add_option("-v",
+                      action="store_true",
+                      dest="verbose",
+                      help="list every BGP neighbor in the BGP result")
+
+    parser.add_option("-m",
+                      type="int",
+                      dest="maxrep",
+                      default=snmp_table.DEFAULT_MAX_REPETITIONS,
+                      help="GETBULK max-repetitions (default %default)")
+
+    parser.add_option("-R",
+                      type="string",
+                      dest="rules",
+                      help="file with local threshold override rules")
+
+    parser.add_option("-D",
+                      type="string",
+                      dest="history_dir",
+                      help="append every sensor reading to a per-device history file in this directory")
+
+    parser.add_option("-A",
+                      type="string",
+                      dest="trend_dir",
+                      help="keep per-sensor baselines in this directory and warn on values moving fast or far off them by the limits from -G")
+
+    parser.add_option("-G",
+                      type="string",
+                      dest="trend_rules",
+                      help="file with rate and deviation limits, needed with -A")
+
+    parser.add_option("-o",
+                      type="string",
+                      dest="command_file",
+                      help="also submit results to this Nagios external command file")
+
+    parser.add_option("-s",
+                      type="string",
+                      dest="spool_dir",
+                      help="also submit results to this Nagios check result spool directory")
+
+    parser.add_option("-B",
+                      type="string",
+                      dest="bgp_service",
+                      default="bgp",
+                      help="service description for BGP results (default %default)")
+
+    parser.add_option("-E",
+                      type="string",
+                      dest="env_service",
+                      default="env",
+                      help="service description for environment results (default %default)")
+
+    snmp_retry.add_options(parser)
+    snmp_limit.add_options(parser)
+    snmp_usm.add_options(parser)
+    snmp_replay.add_options(parser)
+
+    parser.add_option("-P", "--profile",
+                      action="store_true",
+                      dest="profile",
+                      help="print a per-OID latency histogram on stderr")
+
+    (options, args) = parser.parse_args()
+
+    if (not options.host or not snmp_usm.has_auth(options) or
+        (options.record and options.replay) or
+        (options.trend_dir and not options.trend_rules) or
+        (options.command_file and options.spool_dir)):
+        parser.print_help()
+        sys.exit(3) # Unknown
+
+    rules = None
+    if options.rules:
+        try:
+            rules = sensor_eval.Rules.load(options.rules)
+        except (IOError, sensor_eval.RuleError) as e:
+            print ("Bad rules file {0}: {1}".format(options.rules, e))
+            sys.exit(3) # Unknown
+
+    trend_rules = check_env.load_trend_rules(options.trend_rules)
+    try:
+        writer = passive_result.open_writer(options.command_file,options.spool_dir)
+    except IOError as e:
+        print ("Bad spool directory: {0}".format(e))
+        sys.exit(3) # Unknown
+
+    try:
+        replay = snmp_replay.from_options(options)
+    except (snmp_replay.CaptureError, IOError, OSError, ValueError) as e:
+        print ("Bad capture file {0}: {1}".format(options.replay, e))
+        sys.exit(3) # Unknown
+
+    try:
+        state_file.prepare(options.history_dir,options.trend_dir,options.engine_dir)
+    except OSError as e:
+        print ("Bad state directory: {0}".format(e))
+        sys.exit(3) # Unknown
+
+    return(options.host, snmp_usm.from_options(options) or options.community, options.verbose, options.maxrep, rules,
+           options.history_dir, options.trend_dir, trend_rules, writer, {'bgp': options.bgp_service, 'env': options.env_service},
+           snmp_retry.from_options(options), snmp_limit.from_options(options), options.profile,
+           replay)
+
+#
+# Walk the tables of both checks with one GETBULK schedule
+#
+def poll_tables(host,community,maxrep):
+    session = snmp_session.session(host,community)
+
+    # Same snmpd lagg as in check_neighbor_status_v4, back off and walk
+    # only the BGP columns again, the sensor tables came back fine
+    with snmp_stats.phase('walk'):
+        table = snmp_table.bulk_walk(session,COLUMNS,maxrep)
+        table.update(snmp_retry.policy.retry(host,lambda: snmp_table.bulk_walk(session,BGP_COLUMNS,maxrep),
+                                             lambda table: table[check_bgp_neighbors.BGP_PEER_STATE],
+                                             table))
+
+    return (table)
+
+#
+# BGP result from the shared tables
+#
+def bgp_result(table,verbose):
+    v4,v6 = check_bgp_neighbors.split_peer_rows(snmp_table.join_rows(table,BGP_COLUMNS))
+
+    return (check_bgp_neighbors.check_result(v4,v6,verbose))
+
+#
+# Environment result from the shared tables
+#
+def env_result(host,table,rules,trend_dir,trend_rules):
+    rows  = [snmp_table.join_rows(table,columns) for columns in ENV_GROUPS]
+    paths = check_env.entity_paths(snmp_table.join_rows(table,check_env.TREE_COLUMNS),rows[2])
+    exitcode,alarms,sensors,num = check_env.evaluate_sensor_tables(*rows,rules=rules,paths=paths)
+
+    # Trends only warn, the device thresholds stay critical
+    if trend_dir:
+        trends = check_env.check_trends(trend_dir,trend_rules,host,rows[0],rows[2],paths)
+        if trends and exitcode == 0:
+            exitcode = 1
+        alarms = alarms + trends
+
+    if exitcode == 0:
+        return (exitcode, check_env.summary(sensors,num))
+
+    return (exitcode, "\n".join(alarms))
+
+def main():
+    host,community,verbose,maxrep,rules,history_dir,trend_dir,trend_rules,writer,services,policy,limiter,profile,replay = options()
+
+    snmp_replay.use(replay)
+    snmp_retry.use(policy)
+    snmp_limit.use(limiter)
+    snmp_stats.reset(profile)
+    snmp_stats.stats.add_columns(COLUMNS)
+
+    started = snmp_stats.stats.started
+    try:
+        table = poll_tables(host,community,maxrep)
+    except snmp_table.IncompleteWalk as e:
+        # Neither check can tell anything from part of the tables
+        table   = None
+        results = [(check, 3, "Incomplete SNMP data ({0})".format(e)) for check in ('bgp', 'env')]
+
+    if table is not None:
+        if history_dir:
+            check_env.record_history(history_dir,host,snmp_table.join_rows(table,check_env.SENSOR_COLUMNS))
+
+        with snmp_stats.phase('eval'):
+            results = [('bgp',) + bgp_result(table,verbose),
+                       ('env',) + env_result(host,table,rules,trend_dir,trend_rules)]
+
+    perfdata = snmp_stats.perfdata()
+    finished = time.time()
+
+    for check,exitcode,output in results:
+        output = snmp_stats.with_perfdata(output,perfdata)
+        print (passive_result.format_result(host,check,exitcode,output))
+        if writer is not None:
+            try:
+                writer.submit(host,services[check],exitcode,output,started,finished)
+            except (IOError, OSError) as e:
+                print ("Can't submit {0} result: {1}".format(check, e))
+                sys.exit(3) # Unknown
+
+    if profile:
+        snmp_stats.print_histogram()
+
+    # Exit with the worst of both
+    snmp_session.close_all()
+    sys.exit(max(exitcode for check,exitcode,output in results))
+
+#
+#
+#
+if __name__ == "__main__":
+    main()
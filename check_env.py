@@ -29,15 +29,64 @@
 #
 # Marcus Eide, SVT 2015
 
-import netsnmp
+from __future__ import print_function
+
 import sys
+import time
 from optparse import OptionParser
 
+import entity_cache
+import entity_tree
+import sensor_eval
+import sensor_filter
+import sensor_history
+import sensor_trend
+import snmp_limit
+import snmp_replay
+import snmp_retry
+import snmp_session
+import snmp_stats
+import snmp_table
+import snmp_usm
+import state_file
+
+# CISCO-ENTITY-SENSOR-MIB entSensorValueTable columns
+SENSOR_TYPE   = '.1.3.6.1.4.1.9.9.91.1.1.1.1.1'
+SENSOR_SCALE  = '.1.3.6.1.4.1.9.9.91.1.1.1.1.2'
+SENSOR_VALUE  = '.1.3.6.1.4.1.9.9.91.1.1.1.1.4'
+SENSOR_STATUS = '.1.3.6.1.4.1.9.9.91.1.1.1.1.5'
+
+# CISCO-ENTITY-SENSOR-MIB entSensorThresholdTable columns
+THRESHOLD_RELATION     = '.1.3.6.1.4.1.9.9.91.1.2.1.1.3'
+THRESHOLD_VALUE        = '.1.3.6.1.4.1.9.9.91.1.2.1.1.4'
+THRESHOLD_NOTIFICATION = '.1.3.6.1.4.1.9.9.91.1.2.1.1.6'
+
+# ENTITY-MIB entPhysicalTable columns
+PHYSICAL_DESCR = '.1.3.6.1.2.1.47.1.1.1.1.2'
+PHYSICAL_CLASS = '.1.3.6.1.2.1.47.1.1.1.1.5'
+PHYSICAL_NAME  = '.1.3.6.1.2.1.47.1.1.1.1.7'
+PHYSICAL_CONTAINED_IN  = '.1.3.6.1.2.1.47.1.1.1.1.4'
+PHYSICAL_PARENT_RELPOS = '.1.3.6.1.2.1.47.1.1.1.1.6'
+
+SENSOR_COLUMNS    = [SENSOR_STATUS, SENSOR_VALUE, SENSOR_TYPE, SENSOR_SCALE]
+THRESHOLD_COLUMNS = [THRESHOLD_VALUE, THRESHOLD_RELATION, THRESHOLD_NOTIFICATION]
+PHYSICAL_COLUMNS  = [PHYSICAL_CLASS, PHYSICAL_DESCR, PHYSICAL_NAME]
+
+# Containment, walked with PHYSICAL_COLUMNS to place sensors in the chassis
+TREE_COLUMNS      = [PHYSICAL_CONTAINED_IN, PHYSICAL_PARENT_RELPOS]
+
+# Sensor columns that still have to be polled when the rest is cached
+LIVE_COLUMNS      = [SENSOR_STATUS, SENSOR_VALUE]
+
+# Largest share of the sensors a filter may select for them to be
+# fetched with GETs, more are walked with the rest of the table
+GET_SHARE = 0.25
+
 #
 # Options
 #
 def options():
-    parser = OptionParser(usage="usage: %prog -H [host] -c [community] [-v]")
+    parser = OptionParser(usage="usage: %prog -H [host] (-c [community] | -u [user] -a [auth-pass] [-x priv-pass] [-e engine-dir]) [-v] [-b [-m max-repetitions]] [-C cache-dir [-T ttl]] [-R rules] [-D history-dir] [-A trend-dir -G trend-rules] [-I filter] [-E filter] [-t timeout] [-r retries] [-w backoff] [-l rate] [-n inflight] [-L dir] [-P]")
     
     parser.add_option("-H",
                       type="string",
@@ -54,23 +103,127 @@ def options():
                       dest="verbose",
                       help="use verbose output")
     
+    parser.add_option("-b",
+                      action="store_true",
+                      dest="bulk",
+                      help="fetch sensor, threshold and entity tables with GETBULK once per run")
+    
+    parser.add_option("-m",
+                      type="int",
+                      dest="maxrep",
+                      default=snmp_table.DEFAULT_MAX_REPETITIONS,
+                      help="GETBULK max-repetitions used with -b (default %default)")
+    
+    parser.add_option("-C",
+                      type="string",
+                      dest="cache_dir",
+                      help="cache entity metadata and thresholds in this directory, implies -b")
+    
+    parser.add_option("-T",
+                      type="int",
+                      dest="ttl",
+                      default=entity_cache.DEFAULT_TTL,
+                      help="seconds before cached entity data is fetched again (default %default)")
+    
+    parser.add_option("-R",
+                      type="string",
+                      dest="rules",
+                      help="file with local threshold override rules, implies -b")
+    
+    parser.add_option("-D",
+                      type="string",
+                      dest="history_dir",
+                      help="append every sensor reading to a per-device history file in this directory, implies -b")
+    
+    parser.add_option("-A",
+                      type="string",
+                      dest="trend_dir",
+                      help="keep per-sensor baselines in this directory and warn on values moving fast or far off them by the limits from -G, implies -b")
+    
+    parser.add_option("-G",
+                      type="string",
+                      dest="trend_rules",
+                      help="file with rate and deviation limits, needed with -A")
+    
+    parser.add_option("-I",
+                      type="string",
+                      action="append",
+                      dest="include",
+                      help="only check sensors matching type:, class: or name: values, may be repeated, implies -b")
+    
+    parser.add_option("-E",
+                      type="string",
+                      action="append",
+                      dest="exclude",
+                      help="don't check sensors matching type:, class: or name: values, may be repeated, implies -b")
+    
+    snmp_retry.add_options(parser)
+    snmp_limit.add_options(parser)
+    snmp_usm.add_options(parser)
+    snmp_replay.add_options(parser)
+    
+    parser.add_option("-P", "--profile",
+                      action="store_true",
+                      dest="profile",
+                      help="print a per-OID latency histogram on stderr")
+    
     (options, args) = parser.parse_args()
     
-    if (not options.host or not options.community):
+    if (not options.host or not snmp_usm.has_auth(options) or
+        (options.record and options.replay) or
+        (options.trend_dir and not options.trend_rules)):
         parser.print_help()
         sys.exit(3) # Unknown
+    
+    rules = None
+    if options.rules:
+        try:
+            rules = sensor_eval.Rules.load(options.rules)
+        except (IOError, sensor_eval.RuleError) as e:
+            print ("Bad rules file {0}: {1}".format(options.rules, e))
+            sys.exit(3) # Unknown
+    
+    trend_rules = load_trend_rules(options.trend_rules)
+    
+    try:
+        selection = sensor_filter.SensorFilter.parse(options.include,options.exclude)
+    except sensor_filter.FilterError as e:
+        print ("Bad sensor filter: {0}".format(e))
+        sys.exit(3) # Unknown
         
-    return(options.host, options.community, options.verbose)
+    try:
+        replay = snmp_replay.from_options(options)
+    except (snmp_replay.CaptureError, IOError, OSError, ValueError) as e:
+        print ("Bad capture file {0}: {1}".format(options.replay, e))
+        sys.exit(3) # Unknown
+    
+    try:
+        state_file.prepare(options.cache_dir,options.history_dir,options.trend_dir,options.engine_dir)
+    except OSError as e:
+        print ("Bad state directory: {0}".format(e))
+        sys.exit(3) # Unknown
+    
+    return(options.host, snmp_usm.from_options(options) or options.community, options.verbose, options.bulk, options.maxrep,
+           options.cache_dir, options.ttl, rules, options.history_dir,
+           options.trend_dir, trend_rules, snmp_retry.from_options(options),
+           snmp_limit.from_options(options), options.profile,
+           replay, selection)
+
+# Trend limits from -G, defaults without it
+def load_trend_rules(path):
+    if not path:
+        return (sensor_trend.TrendRules())
+    
+    try:
+        return (sensor_trend.TrendRules.load(path))
+    except (IOError, sensor_eval.RuleError) as e:
+        print ("Bad trend rules file {0}: {1}".format(path, e))
+        sys.exit(3) # Unknown
 
 # Walk entSensorStatus and save sensors with status "ok" in a list
 def get_sensor_index(host,community):
-    session = netsnmp.Session(Version   = 2,
-                              DestHost  = host,
-                              Community = community)
-        
-    oid = '.1.3.6.1.4.1.9.9.91.1.1.1.1.5'
-    var = netsnmp.VarList(netsnmp.Varbind(oid))
-    res = session.walk(var)
+    with snmp_stats.phase('walk'):
+        var = snmp_session.walk(host,community,SENSOR_STATUS)
     
     indexes = []
     for v in var:
@@ -83,25 +236,125 @@ def get_sensor_index(host,community):
         #3:nonoperational
 
         if v.val == "1":
-            indexes.append(v.tag.replace("enterprises.9.9.91.1.1.1.1.5.",""))
+            indexes.append(snmp_table.varbind_oid(v).replace(SENSOR_STATUS+".",""))
     
     return (indexes)
 
 # Function to use SNMP Get
 def snmp_get(host,community,oid):
-    session = netsnmp.Session(Version   = 2,
-                              DestHost  = host,
-                              Community = community)
-    
-    session_oid = netsnmp.VarList(netsnmp.Varbind(oid))
-    session_res = session.get(session_oid)
+    session_res = snmp_session.get(host,community,oid)
     
     return (session_res)
 
 
+# Fetch sensor, threshold and entity tables with GETBULK, one walk each,
+# the containment rows and the path to every entity from them
+def get_sensor_tables(host,community,maxrep):
+    session = snmp_session.session(host,community)
+    
+    tables = []
+    for columns in (SENSOR_COLUMNS, THRESHOLD_COLUMNS, PHYSICAL_COLUMNS):
+        # Containment comes along in the entity walk
+        walked = columns + TREE_COLUMNS if columns is PHYSICAL_COLUMNS else columns
+        with snmp_stats.phase('walk'):
+            table = snmp_table.bulk_walk(session,walked,maxrep)
+        tables.append(snmp_table.join_rows(table,columns))
+    
+    sensors,thresholds,physical = tables
+    tree = snmp_table.join_rows(table,TREE_COLUMNS)
+    
+    return (sensors, thresholds, physical, tree, entity_paths(tree,physical))
+
+# Ancestor paths of every entity, see entity_tree
+def entity_paths(tree,physical):
+    return (entity_tree.build(tree,physical,map_PhysicalClass))
+
+# Sensors the filter keeps and how many it left out
+def filter_sensors(selection,sensors,physical,tree):
+    if selection is None or not selection.active():
+        return (sensors, 0)
+    
+    types = dict((index, row[2]) for index,row in sensors.items())
+    kept  = selection.select(types,physical,tree)
+    
+    return (dict((index, sensors[index]) for index in kept), len(sensors) - len(kept))
+
+# Live sensor columns, fetched with GETs for just the given indexes
+# when a filter left most of the total sensors out and that takes
+# fewer PDUs, walked otherwise
+def get_live_rows(host,community,maxrep,indexes,total):
+    get_pdus  = (len(LIVE_COLUMNS) * len(indexes) + snmp_session.GET_BATCH - 1) // snmp_session.GET_BATCH
+    walk_pdus = total // maxrep + 1
+    
+    if len(indexes) > total * GET_SHARE or get_pdus >= walk_pdus:
+        session = snmp_session.session(host,community)
+        with snmp_stats.phase('walk'):
+            table = snmp_table.bulk_walk(session,LIVE_COLUMNS,maxrep)
+        return (snmp_table.join_rows(table,LIVE_COLUMNS))
+    
+    oids = [column + '.' + index for index in indexes for column in LIVE_COLUMNS]
+    with snmp_stats.phase('get'):
+        values = snmp_session.get_many(host,community,oids)
+    
+    live = {}
+    for n,index in enumerate(indexes):
+        status,value = values[n * len(LIVE_COLUMNS):(n + 1) * len(LIVE_COLUMNS)]
+        
+        # Gone since the cache was filled
+        if status is None:
+            continue
+        live[index] = (status, value)
+    
+    return (live)
+
+# Same tables as get_sensor_tables, but only the live sensor columns are
+# fetched while the cached metadata is current, and with a filter only
+# for the selected sensors. Returns the sensors the filter keeps and how
+# many it left out.
+def get_sensor_tables_cached(host,community,maxrep,cache_dir,ttl,selection=None):
+    with snmp_stats.phase('get'):
+        last_change = snmp_get(host,community,entity_cache.ENT_LAST_CHANGE)[0]
+    cache = entity_cache.load(cache_dir,host,last_change,ttl)
+    
+    # Caches from before the paths and containment were kept are out of date too
+    if cache is not None and 'paths' in cache and 'tree' in cache:
+        meta     = cache['sensors']
+        selected = list(meta)
+        if selection is not None and selection.active():
+            selected = selection.select(dict((index, row[0]) for index,row in meta.items()),
+                                        cache['physical'],cache['tree'])
+        
+        # A sensor we have never seen means the cache is out of date after
+        # all. GETs for the selected sensors can't tell, entLastChangeTime
+        # and the TTL still do.
+        live = get_live_rows(host,community,maxrep,selected,len(meta))
+        if all(index in meta for index in live):
+            wanted  = set(selected)
+            sensors = dict((index, (status, value) + meta[index])
+                           for index,(status,value) in live.items() if index in wanted)
+            return (sensors, cache['thresholds'], cache['physical'], cache['paths'], len(meta) - len(selected))
+    
+    sensors,thresholds,physical,tree,paths = get_sensor_tables(host,community,maxrep)
+    
+    # Only type and scale of the sensor rows are static
+    entity_cache.save(cache_dir,host,last_change,
+                      {'sensors':    dict((index, row[2:]) for index,row in sensors.items()),
+                       'thresholds': thresholds,
+                       'physical':   physical,
+                       'tree':       tree,
+                       'paths':      paths})
+    
+    sensors,pruned = filter_sensors(selection,sensors,physical,tree)
+    
+    return (sensors,thresholds,physical,paths,pruned)
+
 def get_PhysicalClass(host,community,index):
     result = snmp_get(host,community,'.1.3.6.1.2.1.47.1.1.1.1.5.'+index)
-    result = int(result[0])
+    
+    return (map_PhysicalClass(result[0]))
+
+def map_PhysicalClass(result):
+    result = int(result)
     
     #Object	entPhysicalClass
     #OID	1.3.6.1.2.1.47.1.1.1.1.5
@@ -159,6 +412,10 @@ def get_PhysicalName(host,community,index):
 def get_SensorType(host,community,index):
     result = snmp_get(host,community,'.1.3.6.1.4.1.9.9.91.1.1.1.1.1.'+index)
     
+    return (map_SensorType(result[0]))
+
+def map_SensorType(result):
+    
     #Object	entSensorType
     #OID	1.3.6.1.4.1.9.9.91.1.1.1.1.1
     #Type	SensorDataType 
@@ -177,33 +434,33 @@ def get_SensorType(host,community,index):
     #13:specialEnum
     #14:dBm
     
-    if result[0] == '1':
+    if result == '1':
         result = 'other'
-    if result[0] == '2':
+    if result == '2':
         result = 'unknown'
-    if result[0] == '3':
+    if result == '3':
         result = 'volts AC'
-    if result[0] == '4':
+    if result == '4':
         result = 'volts DC'
-    if result[0] == '5':
+    if result == '5':
         result = 'amperes'
-    if result[0] == '6':
+    if result == '6':
         result = 'watts'
-    if result[0] == '7':
+    if result == '7':
         result = 'hertz'
-    if result[0] == '8':
+    if result == '8':
         result = 'degrees celsius'
-    if result[0] == '9':
+    if result == '9':
         result = 'percent RH'
-    if result[0] == '10':
+    if result == '10':
         result = 'rpm'
-    if result[0] == '11':
+    if result == '11':
         result = 'cmm'
-    if result[0] == '12':
+    if result == '12':
         result = 'truthvalue'
-    if result[0] == '13':
+    if result == '13':
         result = 'special Enum'
-    if result[0] == '14':
+    if result == '14':
         result = 'dBm'
     
     return (result)
@@ -211,6 +468,10 @@ def get_SensorType(host,community,index):
 def get_SensorScale(host,community,index):
     result = snmp_get(host,community,'.1.3.6.1.4.1.9.9.91.1.1.1.1.2.'+index)
     
+    return (map_SensorScale(result[0]))
+
+def map_SensorScale(result):
+    
     #Object	entSensorScale
     #OID	1.3.6.1.4.1.9.9.91.1.1.1.1.2
     #Type	SensorDataScale 
@@ -232,51 +493,60 @@ def get_SensorScale(host,community,index):
     #16:zetta
     #17:yotta
     
-    if result[0] == '1':
+    if result == '1':
         result = 'yocto'
-    if result[0] == '2':
+    if result == '2':
         result = 'zepto'
-    if result[0] == '3':
+    if result == '3':
         result = 'atto'
-    if result[0] == '4':
+    if result == '4':
         result = 'femto'
-    if result[0] == '5':
+    if result == '5':
         result = 'pico'
-    if result[0] == '6':
+    if result == '6':
         result = 'nano'
-    if result[0] == '7':
+    if result == '7':
         result = 'micro'
-    if result[0] == '8':
+    if result == '8':
         result = 'milli'
-    if result[0] == '9':
+    if result == '9':
         result = ' '
-    if result[0] == '10':
+    if result == '10':
         result = 'kilo'
-    if result[0] == '11':
+    if result == '11':
         result = 'mega'
-    if result[0] == '12':
+    if result == '12':
         result = 'giga'
-    if result[0] == '13':
+    if result == '13':
         result = 'tera'
-    if result[0] == '14':
+    if result == '14':
         result = 'exa'
-    if result[0] == '15':
+    if result == '15':
         result = 'peta'
-    if result[0] == '16':
+    if result == '16':
         result = 'zetta'
-    if result[0] == '17':
+    if result == '17':
         result = 'yotta'
     
     return (result)
 
 def raise_alarm(host,community,index,value,threshold,txt):
-    PhysicalClass = get_PhysicalClass(host,community,index)
-    PhysicalDescr = get_PhysicalDescr(host,community,index)
-    PhysicalName  = get_PhysicalName(host,community,index)
-    SensorType    = get_SensorType(host,community,index)
-    SensorScale   = get_SensorScale(host,community,index)
+    with snmp_stats.phase('alarm'):
+        PhysicalClass = get_PhysicalClass(host,community,index)
+        PhysicalDescr = get_PhysicalDescr(host,community,index)
+        PhysicalName  = get_PhysicalName(host,community,index)
+        SensorType    = get_SensorType(host,community,index)
+        SensorScale   = get_SensorScale(host,community,index)
     
-    print ("{2}: {0} ({1}) reads {3} {4} {5} which {7} {6} {4} {5}".format(
+    return (print_alarm(PhysicalClass,PhysicalDescr,PhysicalName,SensorType,SensorScale,value,threshold,txt))
+
+def print_alarm(PhysicalClass,PhysicalDescr,PhysicalName,SensorType,SensorScale,value,threshold,txt):
+    print (format_alarm(PhysicalClass,PhysicalDescr,PhysicalName,SensorType,SensorScale,value,threshold,txt))
+    
+    return(2)
+
+def format_alarm(PhysicalClass,PhysicalDescr,PhysicalName,SensorType,SensorScale,value,threshold,txt,location=None):
+    return ("{2}: {0} ({1}){8} reads {3} {4} {5} which {7} {6} {4} {5}".format(
         PhysicalDescr,
         PhysicalName,
         PhysicalClass,
@@ -284,102 +554,259 @@ def raise_alarm(host,community,index,value,threshold,txt):
         SensorScale,
         SensorType,
         threshold,
-        txt)
+        txt,
+        format_location(location))
            )
+
+# Where the sensor is, from the entity paths
+def format_location(location):
+    if not location:
+        return ('')
     
-    return(2)
+    return (" in " + location)
 
-def main():
+# Evaluate sensor value against threshold, returns alarm text or None
+def check_threshold(value,relation,threshold):
+    return (sensor_eval.check(value,relation,threshold))
+
+# Check every threshold of every working sensor, one get at a time
+def check_sensors(host,community):
     exitcode = 0
     num      = 0
     
-    # Get options
-    host,community,verbose = options()
-    
     # Start with indexes that have a working sensor
     indexes = get_sensor_index(host,community)
     
     # Loop through them
+    with snmp_stats.phase('get'):
+        for index in indexes:
+            
+            # Each sensor has 6 possible values, so we need to loop through them aswell
+            for i in range(1,7):
+                i = str(i)
+                
+                # Skip sensors that don't report any value
+                threshold    = snmp_get(host,community,'.1.3.6.1.4.1.9.9.91.1.2.1.1.4.'+index+'.'+i)
+                threshold    = int(threshold[0])
+                if threshold == -32768:
+                    continue
+                
+                # Count number of working sensors with sensible values
+                num += 1
+                
+                # Get additional information for each sensor value
+                value        = snmp_get(host,community,'.1.3.6.1.4.1.9.9.91.1.1.1.1.4.'+index)
+                relation     = snmp_get(host,community,'.1.3.6.1.4.1.9.9.91.1.2.1.1.3.'+index+'.'+i)
+                notification = snmp_get(host,community,'.1.3.6.1.4.1.9.9.91.1.2.1.1.6.'+index+'.'+i)
+                
+                # Make our results into integers
+                value        = int(value[0])
+                notification = int(notification[0])
+                relation     = int(relation[0])
+                
+                txt = check_threshold(value,relation,threshold)
+                if txt and notification == 1:
+                    exitcode = raise_alarm(host,community,index,value,threshold,txt)
+    
+    return (exitcode, len(indexes), num)
+
+# Same check as check_sensors, but evaluated on tables fetched with GETBULK
+def check_sensors_table(host,community,maxrep,cache_dir=None,ttl=entity_cache.DEFAULT_TTL,rules=None,
+                        history_dir=None,trend_dir=None,trend_rules=None,selection=None):
+    if cache_dir:
+        sensors,thresholds,physical,paths,pruned = get_sensor_tables_cached(host,community,maxrep,cache_dir,ttl,
+                                                                            selection)
+    else:
+        sensors,thresholds,physical,tree,paths = get_sensor_tables(host,community,maxrep)
+        sensors,pruned = filter_sensors(selection,sensors,physical,tree)
+    
+    if history_dir:
+        record_history(history_dir,host,sensors)
+    
+    with snmp_stats.phase('eval'):
+        exitcode,alarms,indexes,num = evaluate_sensor_tables(sensors,thresholds,physical,rules,paths)
+    
+    # Trends only warn, the device thresholds stay critical
+    if trend_dir:
+        trends = check_trends(trend_dir,trend_rules,host,sensors,physical,paths)
+        if trends and exitcode == 0:
+            exitcode = 1
+        alarms = alarms + trends
+    
+    for alarm in alarms:
+        print (alarm)
+    
+    return (exitcode, indexes, num, pruned)
+
+# Values of working sensors scaled by entSensorScale, as (index, value)
+def scaled_readings(sensors):
+    return ([(index, sensor_history.scaled_value(value,scale))
+             for index,(status,value,sensortype,scale) in sensors.items()
+             if status == "1" and value is not None and scale is not None])
+
+# Append the values of working sensors to the device's history
+def record_history(history_dir,host,sensors):
+    readings = scaled_readings(sensors)
+    
+    with snmp_stats.phase('history'):
+        sensor_history.record(history_dir,host,readings)
+
+# Update the sensors' baselines, returns warnings for values moving
+# too fast or too far off their baseline
+def check_trends(trend_dir,trend_rules,host,sensors,physical,paths=None):
+    readings = []
+    for index,value in scaled_readings(sensors):
+        name = physical.get(index, ('2', '', ''))[2]
+        readings.append((index, value, name, map_SensorType(sensors[index][2])))
+    
+    with snmp_stats.phase('trend'):
+        state        = sensor_trend.load(trend_dir,host)
+        state,trends = sensor_trend.evaluate(state,time.time(),readings,trend_rules)
+        sensor_trend.save(trend_dir,host,state)
+    
+    alarms = []
+    for index,kind,value,amount,limit in trends:
+        PhysicalClass,PhysicalDescr,PhysicalName = physical.get(index, ('2', '', ''))
+        alarms.append(format_trend_alarm(map_PhysicalClass(PhysicalClass),
+                                         PhysicalDescr,
+                                         PhysicalName,
+                                         map_SensorType(sensors[index][2]),
+                                         kind,value,amount,limit,
+                                         paths and paths.get(index)))
+    
+    return (alarms)
+
+def format_trend_alarm(PhysicalClass,PhysicalDescr,PhysicalName,SensorType,kind,value,amount,limit,location=None):
+    if kind == 'rate':
+        txt = "is {0} {1:.3g} per minute, limit {2:g}".format(
+            "rising" if amount > 0 else "falling",
+            abs(amount),
+            limit)
+    else:
+        txt = "is {0:.3g} {1} its baseline of {2:.3g}, limit {3:.3g}".format(
+            abs(amount),
+            "above" if amount > 0 else "below",
+            value - amount,
+            limit)
+    
+    return ("{0}: {1} ({2}){6} reads {3:g} {4} which {5}".format(
+        PhysicalClass,
+        PhysicalDescr,
+        PhysicalName,
+        value,
+        SensorType,
+        txt,
+        format_location(location))
+           )
+
+# Evaluate joined sensor, threshold and entity rows, returns the alarm texts,
+# with the sensors' locations when given their entity paths
+def evaluate_sensor_tables(sensors,thresholds,physical,rules=None,paths=None):
+    columns = sensor_eval.new_columns()
+    
+    # Start with indexes that have a working sensor, in walk order
+    indexes = [index for index in sorted(sensors, key=snmp_table.index_key)
+               if sensors[index][0] == "1"]
+    
     for index in indexes:
+        status,value,sensortype,scale = sensors[index]
+        name = physical.get(index, ('2', '', ''))[2]
+        
+        # Columns missing from a walk that timed out part way come back as None
+        if value is None:
+            continue
         
         # Each sensor has 6 possible values, so we need to loop through them aswell
-        for i in xrange(1,7):
-            i = str(i)
+        for i in range(1,7):
+            row = thresholds.get(index+'.'+str(i))
+            if row is None or None in row:
+                continue
             
             # Skip sensors that don't report any value
-            threshold    = snmp_get(host,community,'.1.3.6.1.4.1.9.9.91.1.2.1.1.4.'+index+'.'+i)
-            threshold    = int(threshold[0])
-            if threshold == -32768:
+            if int(row[0]) == -32768:
                 continue
             
-            # Count number of working sensors with sensible values
-            num += 1
-            
-            # Get additional information for each sensor value
-            value        = snmp_get(host,community,'.1.3.6.1.4.1.9.9.91.1.1.1.1.4.'+index)
-            relation     = snmp_get(host,community,'.1.3.6.1.4.1.9.9.91.1.2.1.1.3.'+index+'.'+i)
-            notification = snmp_get(host,community,'.1.3.6.1.4.1.9.9.91.1.2.1.1.6.'+index+'.'+i)
-            
-            # Make our results into integers
-            value        = int(value[0])
-            notification = int(notification[0])
-            relation     = int(relation[0])
-
-            #Object	entSensorThresholdRelation
-            #OID	1.3.6.1.4.1.9.9.91.1.2.1.1.3
-            #Type	SensorThresholdRelation 
-            #1:lessThan
-            #2:lessOrEqual
-            #3:greaterThan
-            #4:greaterOrEqual
-            #5:equalTo
-            #6:notEqualTo
-            
-            if relation == 1:
-                if value < threshold:
-                    if notification == 1:
-                        txt = "is less than"
-                        exitcode = raise_alarm(host,community,index,value,threshold,txt)
-            
-            if relation == 2:
-                if value <= threshold:
-                    # raise_alarm()
-                    if notification == 1:
-                        txt = "is less or equal than"
-                        exitcode = raise_alarm(host,community,index,value,threshold,txt)
-            
-            if relation == 3:
-                if value > threshold:
-                    if notification == 1:
-                        txt = "is greater than"
-                        exitcode = raise_alarm(host,community,index,value,threshold,txt)
-            
-            if relation == 4:
-                if value >= threshold:
-                    if notification == 1:
-                        txt = "is greater or equal than"
-                        exitcode = raise_alarm(host,community,index,value,threshold,txt)
-
-            if relation == 5:
-                if value == threshold:
-                    if notification == 1:
-                        txt = "is equal to"
-                        exitcode = raise_alarm(host,community,index,value,threshold,txt)
-            
-            if relation == 6:
-                if value != threshold:
-                    if notification == 1:
-                        txt = "is not equal to"
-                        exitcode = raise_alarm(host,community,index,value,threshold,txt)
+            sensor_eval.add_row(columns,index,i,int(value),int(row[0]),int(row[1]),int(row[2]),
+                                name,map_SensorType(sensortype))
+    
+    if rules is not None:
+        columns = rules.apply(columns)
+    
+    alarms = []
+    for n in sensor_eval.evaluate(columns):
+        index = columns['index'][n]
+        status,value,sensortype,scale = sensors[index]
+        PhysicalClass,PhysicalDescr,PhysicalName = physical.get(index, ('2', '', ''))
+        
+        alarms.append(format_alarm(map_PhysicalClass(PhysicalClass),
+                                   PhysicalDescr,
+                                   PhysicalName,
+                                   columns['type'][n],
+                                   map_SensorScale(scale),
+                                   columns['value'][n],
+                                   columns['threshold'][n],
+                                   sensor_eval.relation_text(columns['relation'][n]),
+                                   paths and paths.get(index)))
+    
+    # Count number of working sensors with sensible values
+    num = len(columns['value'])
+    
+    if alarms:
+        return (2, alarms, len(indexes), num)
+    
+    return (0, alarms, len(indexes), num)
+
+# Status line when nothing raised an alarm
+def summary(sensors,num,pruned=0):
+    return ("All {0} sensors are working and all {1} values within limits{2}".format(
+        sensors,
+        num,
+        filtered(pruned))
+            )
+
+# Note on the sensors a filter left out
+def filtered(pruned):
+    if not pruned:
+        return ('')
+    
+    return (", {0} sensors filtered out".format(pruned))
+
+def main():
+    # Get options
+    host,community,verbose,bulk,maxrep,cache_dir,ttl,rules,history_dir,trend_dir,trend_rules,policy,limiter,profile,replay,selection = options()
+    
+    snmp_replay.use(replay)
+    snmp_retry.use(policy)
+    snmp_limit.use(limiter)
+    snmp_stats.reset(profile)
+    snmp_stats.stats.add_columns(SENSOR_COLUMNS + THRESHOLD_COLUMNS + PHYSICAL_COLUMNS + TREE_COLUMNS)
     
-    # Print summary if nothing raised an alarm
+    pruned = 0
+    if bulk or cache_dir or rules or history_dir or trend_dir or selection.active():
+        try:
+            exitcode,sensors,num,pruned = check_sensors_table(host,community,maxrep,cache_dir,ttl,rules,
+                                                              history_dir,trend_dir,trend_rules,selection)
+        except snmp_table.IncompleteWalk as e:
+            print (snmp_stats.with_perfdata("Incomplete SNMP data ({0})".format(e),snmp_stats.perfdata()))
+            snmp_session.close_all()
+            sys.exit(3) # Unknown
+    else:
+        exitcode,sensors,num = check_sensors(host,community)
+    
+    # Print summary if nothing raised an alarm, perfdata goes on the
+    # summary or on a line of its own after the alarms
     if exitcode == 0:
-        print ("All {0} sensors are working and all {1} values within limits".format(
-            len(indexes),
-            num)
-               )
+        print (snmp_stats.with_perfdata(summary(sensors,num,pruned),snmp_stats.perfdata()))
+    elif pruned:
+        print ("{0} sensors filtered out | {1}".format(pruned, snmp_stats.perfdata()))
+    else:
+        print ("| " + snmp_stats.perfdata())
+    
+    if profile:
+        snmp_stats.print_histogram()
     
     # Exit
+    snmp_session.close_all()
     sys.exit(exitcode)
     
 # only execute when you want to run the module as a program
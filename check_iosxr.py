@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+
+# One entry point for all the single-router checks.
+#
+#   ./check_iosxr.py bgp -H router1 -c public -b
+#   ./check_iosxr.py env -H router1 -c public -b
+#   ./check_iosxr.py device -H router1 -c public
+#
+# takes the same options as check_bgp_neighbors.py,
+# check_env.py and check_device.py.
+#
+# A Nagios check runs for a few hundred milliseconds at most,
+# and a good share of that goes to starting Python and
+# importing the check modules before the first PDU is sent.
+# With a check server running
+#
+#   ./check_iosxr.py -S [socket]
+#
+# that is done once. Every check run connects to the
+# server's UNIX socket and passes its arguments, working
+# directory, stdin, stdout and stderr. The server forks a
+# child that has everything imported already, runs the check
+# on those descriptors and sends back the exit code. Without
+# a server, or on Python 2, the check runs in this process.
+#
+# Arguments carry communities and passwords, so the default
+# socket sits in a directory only its user can enter, and the
+# client only talks to a server run by the same user, and the
+# server to clients of its own user. The server runs at most
+# MAX_CHILDREN checks at a time.
+#
+# This file only imports what talking to the server takes,
+# check modules are imported when a check runs here.
+
+import errno
+import os
+import socket
+import stat
+import struct
+import sys
+
+CHECKS = {'bgp':    'check_bgp_neighbors',
+          'env':    'check_env',
+          'device': 'check_device'}
+
+# Private directory per user in the temp directory
+DEFAULT_DIR    = os.path.join(os.environ.get('TMPDIR', '/tmp'), 'iosxr-check-{0}'.format(os.getuid()))
+DEFAULT_SOCKET = os.path.join(DEFAULT_DIR, 'check.sock')
+
+# Length of a request, and the exit code that answers it
+LENGTH = struct.Struct('!I')
+EXIT   = struct.Struct('!i')
+
+# stdin, stdout and stderr go to the server with every request
+STDIO = [0, 1, 2]
+
+# Seconds a client gets to send its request, one that never does
+# mustn't hold up the checks queued behind it
+REQUEST_TIMEOUT = 5.0
+
+# Longest request taken, in bytes
+MAX_REQUEST = 65536
+
+# Checks running at once, more requests wait for one to finish
+MAX_CHILDREN = 32
+
+class ServerError(Exception):
+    pass
+
+def usage():
+    sys.stderr.write("usage: {0} [-s socket] bgp|env|device [check options]\n"
+                     "       {0} -S [socket]\n".format(sys.argv[0]))
+    sys.exit(3) # Unknown
+
+#
+# Run a check in this process
+#
+def run_check(check,args):
+    module   = __import__(CHECKS[check])
+    sys.argv = [module.__file__] + args
+    module.main()
+
+#
+# Client side, returns the check's exit code or None if there
+# is no server to talk to
+#
+def request(path,check,args):
+    if not hasattr(socket, 'AF_UNIX') or not hasattr(socket.socket, 'sendmsg'):
+        return (None)
+
+    import array
+
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            conn.connect(path)
+        except (IOError, OSError):
+            return (None)
+
+        # Don't hand the arguments to anyone else's server
+        if peer_uid(conn,path) != os.getuid():
+            raise ServerError("{0} is not run by this user".format(path))
+
+        payload = '\0'.join([os.getcwd(), check] + args).encode('utf-8')
+        conn.sendmsg([LENGTH.pack(len(payload)) + payload],
+                     [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', STDIO))])
+
+        reply = recv_exactly(conn,EXIT.size)
+    finally:
+        conn.close()
+
+    if reply is None:
+        sys.stdout.write("Check server went away\n")
+        return (3) # Unknown
+
+    return (EXIT.unpack(reply)[0])
+
+#
+# User at the other end of a UNIX socket. Where the system can't
+# tell, the owner of the socket file.
+#
+def peer_uid(conn,path=None):
+    if hasattr(socket, 'SO_PEERCRED'):
+        creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        return (struct.unpack('3i', creds)[1])
+
+    return (os.lstat(path).st_uid)
+
+#
+# Create the default socket directory, raises ServerError if it
+# isn't private to this user
+#
+def private_dir(path):
+    try:
+        os.makedirs(path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise ServerError("can't create {0}: {1}".format(path, e.strerror))
+
+    st = os.lstat(path)
+    if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or
+        st.st_mode & (stat.S_IRWXG | stat.S_IRWXO)):
+        raise ServerError("{0} is not a private directory of this user".format(path))
+
+def recv_exactly(conn,size):
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            return (None)
+        data += chunk
+
+    return (data)
+
+#
+# Server side
+#
+def serve(path):
+    import array
+
+    # Everything a check needs, imported once
+    for module in CHECKS.values():
+        __import__(module)
+    try:
+        import netsnmp
+    except ImportError:
+        pass
+    import sensor_eval
+    sensor_eval.load_numpy()
+
+    if path == DEFAULT_SOCKET:
+        private_dir(DEFAULT_DIR)
+    if os.path.exists(path):
+        os.unlink(path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask    = os.umask(0o077)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(umask)
+    listener.listen(64)
+
+    itemsize = array.array('i').itemsize
+    fds_size = socket.CMSG_LEN(len(STDIO) * itemsize)
+    children = set()
+    while True:
+        conn,address = listener.accept()
+        conn.settimeout(REQUEST_TIMEOUT)
+        fds = []
+        try:
+            if peer_uid(conn,path) != os.getuid():
+                raise OSError(errno.EPERM, "client of another user")
+
+            data,ancdata,flags,address = conn.recvmsg(LENGTH.size, fds_size)
+            for level,type,cdata in ancdata:
+                if level == socket.SOL_SOCKET and type == socket.SCM_RIGHTS:
+                    fds.extend(array.array('i', cdata[:len(cdata) - len(cdata) % itemsize]))
+
+            if len(data) < LENGTH.size:
+                data += recv_exactly(conn,LENGTH.size - len(data)) or b''
+            length = LENGTH.unpack(data)[0]
+            if length > MAX_REQUEST:
+                raise OSError(errno.EMSGSIZE, "request too long")
+            payload = recv_exactly(conn,length)
+        except (IOError, OSError, struct.error):
+            payload = None
+
+        if payload is not None and len(fds) == len(STDIO):
+            wait_children(children,MAX_CHILDREN - 1)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                listener.close()
+                conn.settimeout(None)
+                run_child(conn,fds,payload.decode('utf-8').split('\0'))
+            children.add(pid)
+
+        for fd in fds:
+            os.close(fd)
+        conn.close()
+
+#
+# Reap the children that are done, waiting for some to finish
+# while more than most are still running
+#
+def wait_children(children,most):
+    while children:
+        try:
+            pid,status = os.waitpid(-1, 0 if len(children) > most else os.WNOHANG)
+        except OSError:
+            children.clear()
+            break
+        if pid == 0:
+            break
+        children.discard(pid)
+
+#
+# Forked child, runs one check on the client's descriptors and
+# never returns
+#
+def run_child(conn,fds,fields):
+    import traceback
+
+    exitcode = 3 # Unknown
+    try:
+        for fd,target in zip(fds,STDIO):
+            os.dup2(fd,target)
+            os.close(fd)
+
+        cwd,check,args = fields[0],fields[1],fields[2:]
+        os.chdir(cwd)
+
+        if check in CHECKS:
+            run_check(check,args)
+            exitcode = 0
+        else:
+            sys.stdout.write("Unknown check {0}\n".format(check))
+    except SystemExit as e:
+        exitcode = e.code or 0
+    except Exception:
+        traceback.print_exc()
+
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        conn.sendall(EXIT.pack(exitcode))
+    finally:
+        os._exit(0)
+
+def main():
+    args = sys.argv[1:]
+    path = os.environ.get('IOSXR_CHECK_SOCKET', DEFAULT_SOCKET)
+
+    if args and args[0] == '-S':
+        if sys.version_info[0] < 3:
+            sys.stderr.write("The check server needs Python 3\n")
+            sys.exit(3)
+        try:
+            serve(args[1] if len(args) > 1 else path)
+        except ServerError as e:
+            sys.stderr.write("Can't start check server: {0}\n".format(e))
+            sys.exit(3)
+        return
+
+    if len(args) > 1 and args[0] == '-s':
+        path = args[1]
+        args = args[2:]
+
+    if not args or args[0] not in CHECKS:
+        usage()
+
+    try:
+        exitcode = request(path,args[0],args[1:])
+    except ServerError as e:
+        sys.stdout.write("Not using check server: {0}\n".format(e))
+        sys.exit(3) # Unknown
+    if exitcode is None:
+        run_check(args[0],args[1:])
+        return
+
+    sys.exit(exitcode)
+
+if __name__ == "__main__":
+    main()
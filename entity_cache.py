@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+# On-disk per-device cache of inventory metadata.
+#
+# entPhysicalClass/Descr/Name, entSensorType/Scale and the
+# threshold rows hardly ever change, but used to be fetched
+# again on every run and for every alarm. They are kept in
+# one JSON file per device and reused for as long as
+# ENTITY-MIB entLastChangeTime stays the same and the file
+# is younger than the TTL.
+#
+# The file holds named sections of {index: row} tables, so
+# more static tables can be cached next to them later. Rows
+# are tuples, or single values like the entity paths.
+
+import os
+import time
+
+import state_file
+
+# ENTITY-MIB entLastChangeTime.0
+ENT_LAST_CHANGE = '.1.3.6.1.2.1.47.1.4.1.0'
+
+DEFAULT_TTL = 86400
+
+def cache_path(cache_dir,host):
+    return (os.path.join(cache_dir, host + '.entity.json'))
+
+#
+# Return the cached sections for a device, or None if there
+# is no cache or it is out of date
+#
+def load(cache_dir,host,last_change,ttl=DEFAULT_TTL):
+    cache = state_file.read(cache_path(cache_dir,host))
+    if cache is None:
+        return (None)
+
+    # Agents without entLastChangeTime only get the TTL
+    if cache.get('last_change') != last_change:
+        return (None)
+
+    if time.time() - cache.get('fetched', 0) > ttl:
+        return (None)
+
+    sections = {}
+    for name,rows in cache['sections'].items():
+        sections[name] = dict((index, tuple(row) if isinstance(row, list) else row)
+                              for index,row in rows.items())
+
+    return (sections)
+
+#
+# Write the sections for a device, replacing any older cache
+#
+def save(cache_dir,host,last_change,sections):
+    cache = {'last_change': last_change,
+             'fetched':     time.time(),
+             'sections':    sections}
+
+    state_file.write(cache_path(cache_dir,host),cache)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# Where an entity sits in the chassis.
+#
+# entPhysicalContainedIn points every entity at the one it is
+# in, 0 at the top, and entPhysicalParentRelPos gives its
+# position there. Both are walked once with the rest of
+# entPhysicalTable, and every entity gets the path of names
+# from the top down to its parent, e.g.
+#
+#   Rack 0 / 0/RSP0 / 0/RSP0/CPU0
+#
+# so an alarm can say where a sensor is without any more
+# requests. Entities without a name are shown by class and
+# position, "slot 3" style. The paths are kept in the entity
+# cache next to the other entPhysicalTable rows and rebuilt
+# with them when entLastChangeTime moves.
+
+SEPARATOR = ' / '
+
+# Deeper than any real chassis, stops loops in a broken table
+MAX_DEPTH = 32
+
+#
+# Name of an entity in a path
+#
+def label(row,position,class_name):
+    PhysicalClass,PhysicalDescr,PhysicalName = row
+    if PhysicalName:
+        return (PhysicalName)
+
+    if PhysicalClass is None:
+        return ('entity')
+
+    # Unnamed containers are the slots and bays
+    name = class_name(PhysicalClass)
+    if name == 'container':
+        name = 'slot'
+    if position is not None and position != '-1':
+        return ("{0} {1}".format(name, position))
+
+    return (name)
+
+#
+# Ancestor paths of every entity
+#
+# tree is {index: (contained in, parent position)} and physical
+# {index: (class, descr, name)} as walked, class_name turns an
+# entPhysicalClass into text. Returns {index: path}, empty for
+# entities at the top.
+#
+def build(tree,physical,class_name=str):
+    full = {}
+
+    def full_path(index):
+        # Climb to the first entity with a known path, or the top
+        chain   = []
+        current = index
+        while (current in tree and current not in full and current not in chain
+               and len(chain) < MAX_DEPTH):
+            chain.append(current)
+            current = tree[current][0]
+
+        prefix = full.get(current, '')
+        for entity in reversed(chain):
+            name   = label(physical.get(entity, ('2', '', '')),tree[entity][1],class_name)
+            prefix = prefix + SEPARATOR + name if prefix else name
+            full[entity] = prefix
+
+        return (full.get(index, prefix))
+
+    paths = {}
+    for index,(contained_in,position) in tree.items():
+        if contained_in in tree:
+            paths[index] = full_path(contained_in)
+        else:
+            paths[index] = ''
+
+    return (paths)
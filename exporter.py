@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+
+# Prometheus exporter for the BGP and environment checks.
+#
+# Serves BGP peer states and AS numbers, sensor values and
+# thresholds and the checks' own exit codes for every router
+# in the inventory, in the Prometheus text format:
+#
+#   /metrics?target=<host>   one router
+#   /metrics                 every router in the inventory
+#
+# The tables are walked the same way poller.py does and
+# evaluated by the checks' code, over one session per router
+# that stays open between polls. A router's result is kept
+# for -a seconds and every scrape in that time gets the same
+# one, so a router is polled at most once per -a however many
+# Prometheus replicas scrape it. Scrapes of a router that is
+# being polled wait for that poll instead of starting another.
+# The age of a result is in iosxr_result_age_seconds. Only
+# routers in the inventory are polled, other targets get a 404.
+
+import asyncio
+import signal
+import sys
+import time
+import traceback
+from urllib.parse import parse_qs, urlsplit
+
+import check_bgp_neighbors
+import check_env
+import inet_address
+import poller
+import sensor_eval
+import sensor_history
+import snmp_async
+import snmp_stats
+import snmp_table
+
+DEFAULT_LISTEN  = ':9431'
+DEFAULT_MAX_AGE = 60
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+FAMILIES = {inet_address.IPV4:  'ipv4',
+            inet_address.IPV4Z: 'ipv4',
+            inet_address.IPV6:  'ipv6',
+            inet_address.IPV6Z: 'ipv6'}
+
+METRICS = [
+    ('iosxr_up',                   'Whether the last poll of the router got an answer'),
+    ('iosxr_check_status',         'Exit code the check gives for the polled tables'),
+    ('iosxr_bgp_peer_state',       'cbgpPeer2State, 1 idle to 6 established'),
+    ('iosxr_bgp_peer_remote_as',   'cbgpPeer2RemoteAs'),
+    ('iosxr_sensor_value',         'Sensor reading scaled to units'),
+    ('iosxr_sensor_threshold',     'Sensor threshold scaled to units'),
+    ('iosxr_poll_seconds',         'Time the last poll of the router took'),
+    ('iosxr_poll_pdus',            'PDUs the last poll of the router sent'),
+    ('iosxr_poll_timeouts',        'Timeouts in the last poll of the router'),
+    ('iosxr_result_age_seconds',   'Seconds since the served result was polled'),
+]
+
+EXPORTER_METRICS = [
+    ('iosxr_exporter_polls_total',       'Polls of routers started', 'counter'),
+    ('iosxr_exporter_cache_hits_total',  'Scrapes served from a cached result', 'counter'),
+    ('iosxr_exporter_shared_polls_total', 'Scrapes that waited for a poll already running', 'counter'),
+]
+
+#
+# Options
+#
+def options():
+    parser = poller.option_parser("usage: %prog -f [inventory] [-c community] [-p [address]:port] [-a max age]")
+
+    parser.add_option("-p",
+                      type="string",
+                      dest="listen",
+                      default=DEFAULT_LISTEN,
+                      help="address and port to serve /metrics on (default %default)")
+
+    parser.add_option("-a",
+                      type="float",
+                      dest="max_age",
+                      default=DEFAULT_MAX_AGE,
+                      help="seconds a router's result is served before it is polled again (default %default)")
+
+    options = poller.parse_options(parser)
+
+    address,sep,port = options.listen.rpartition(':')
+    if not port.isdigit():
+        parser.print_help()
+        sys.exit(3) # Unknown
+    options.address = address.strip('[]') or None
+    options.port    = int(port)
+
+    return (options)
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+
+def sample(name,labels,value):
+    return ("{0}{{{1}}} {2}".format(
+        name,
+        ",".join('{0}="{1}"'.format(key, escape(label)) for key,label in labels),
+        value)
+            )
+
+#
+# Samples for cbgpPeer2Table and the check's exit code
+#
+def bgp_samples(host,table):
+    rows    = snmp_table.join_rows(table,poller.BGP_COLUMNS)
+    samples = []
+
+    for index,(state,asn,reason) in rows.items():
+        try:
+            type,address,rest = inet_address.decode_cached(index)
+        except inet_address.DecodeError:
+            continue
+        if type not in FAMILIES:
+            continue
+
+        labels = [('device', host), ('peer', address), ('family', FAMILIES[type])]
+        if state is not None:
+            samples.append(sample('iosxr_bgp_peer_state',labels,state))
+        if asn is not None:
+            samples.append(sample('iosxr_bgp_peer_remote_as',labels,asn))
+
+    v4,v6 = check_bgp_neighbors.split_peer_rows(rows)
+    exitcode,output = check_bgp_neighbors.check_result(v4,v6,False)
+    samples.append(sample('iosxr_check_status',[('device', host), ('check', 'bgp')],exitcode))
+
+    return (samples)
+
+#
+# Samples for the working sensors, their thresholds and the
+# check's exit code
+#
+def env_samples(host,tables):
+    sensors,thresholds,physical,paths = poller.env_rows(tables)
+    samples = []
+
+    for index in sorted(sensors, key=snmp_table.index_key):
+        status,value,sensortype,scale = sensors[index]
+        if status != "1" or value is None:
+            continue
+
+        labels = [('device', host), ('sensor', index),
+                  ('name', physical.get(index, ('2', '', ''))[2]),
+                  ('type', check_env.map_SensorType(sensortype)),
+                  ('location', paths.get(index, ''))]
+        samples.append(sample('iosxr_sensor_value',labels,"{0:g}".format(sensor_history.scaled_value(value,scale))))
+
+        for i in range(1,7):
+            row = thresholds.get(index+'.'+str(i))
+            if row is None or row[0] is None or int(row[0]) == -32768:
+                continue
+            relation = sensor_eval.RELATIONS.get(int(row[1]), (row[1],))[0]
+            samples.append(sample('iosxr_sensor_threshold',labels + [('threshold', i), ('relation', relation)],
+                                  "{0:g}".format(sensor_history.scaled_value(row[0],scale))))
+
+    exitcode,alarms,working,num = check_env.evaluate_sensor_tables(sensors,thresholds,physical,paths=paths)
+    samples.append(sample('iosxr_check_status',[('device', host), ('check', 'env')],exitcode))
+
+    return (samples)
+
+WALKS   = {'bgp': poller.walk_bgp, 'env': poller.walk_env}
+SAMPLES = {'bgp': bgp_samples, 'env': env_samples}
+
+#
+# Polls routers, keeping one session open per router
+#
+class Poller(object):
+
+    def __init__(self,inventory,options):
+        self.communities = dict((host, community) for host,community,interval in inventory)
+        self.options     = options
+        self.devices     = asyncio.Semaphore(options.devices)
+        self.sessions    = {}
+
+    async def session(self,host):
+        if host not in self.sessions:
+            session = snmp_async.AsyncSession(host,self.communities[host],
+                                              policy=self.options.policy,
+                                              limiter=self.options.limiter,
+                                              limit=self.options.pdus)
+            await session.open()
+            self.sessions[host] = session
+
+        return (self.sessions[host])
+
+    #
+    # Walk and evaluate every check, returns the samples
+    #
+    async def poll(self,host):
+        stats   = snmp_stats.Stats()
+        samples = []
+
+        async with self.devices:
+            try:
+                session = await self.session(host)
+                tables  = await asyncio.gather(*[WALKS[check](session,self.options.maxrep,stats)
+                                                 for check in self.options.checks])
+            except snmp_table.IncompleteWalk:
+                tables  = None
+            except OSError:
+                tables  = None
+
+                # Start over with a fresh socket next poll
+                if host in self.sessions:
+                    self.sessions.pop(host).close()
+            except Exception:
+                traceback.print_exc()
+                tables  = None
+
+        # Walks that timed out come back empty, there is nothing to evaluate
+        up = tables is not None and stats.pdus > stats.timeouts
+        if up:
+            try:
+                with stats.phase('eval'):
+                    checked = []
+                    for check,table in zip(self.options.checks,tables):
+                        checked.extend(SAMPLES[check](host,table))
+                samples.extend(checked)
+            except Exception:
+                # Tables a check can't make sense of shouldn't take
+                # the other routers in the scrape down with them
+                traceback.print_exc()
+                up = False
+
+        labels = [('device', host)]
+        if not up:
+            samples.extend(sample('iosxr_check_status',labels + [('check', check)],3)
+                           for check in self.options.checks)
+        samples.append(sample('iosxr_up',labels,int(up)))
+        samples.append(sample('iosxr_poll_seconds',labels,"{0:.3f}".format(time.time() - stats.started)))
+        samples.append(sample('iosxr_poll_pdus',labels,stats.pdus))
+        samples.append(sample('iosxr_poll_timeouts',labels,stats.timeouts))
+
+        return (samples)
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+        self.sessions = {}
+
+#
+# Results by router, polled at most once per max_age
+#
+# A router's result is (time polled, samples). While a poll of
+# a router runs, further requests for it wait for that poll. The
+# poll is shielded, a scraper that gives up doesn't cancel it for
+# the others.
+#
+class ResultCache(object):
+
+    def __init__(self,poll,max_age):
+        self.poll    = poll
+        self.max_age = max_age
+        self.results = {}
+        self.polling = {}
+        self.polls   = 0
+        self.hits    = 0
+        self.shared  = 0
+
+    async def get(self,host):
+        result = self.results.get(host)
+        if result is not None and time.monotonic() - result[0] <= self.max_age:
+            self.hits += 1
+            return (result)
+
+        task = self.polling.get(host)
+        if task is None:
+            task = asyncio.ensure_future(self._poll(host))
+            self.polling[host] = task
+        else:
+            self.shared += 1
+
+        return (await asyncio.shield(task))
+
+    async def _poll(self,host):
+        self.polls += 1
+        try:
+            result = (time.monotonic(), await self.poll(host))
+            self.results[host] = result
+        finally:
+            del self.polling[host]
+
+        return (result)
+
+#
+# Text of a scrape of the given routers, each one once however
+# often it is asked for
+#
+async def scrape(cache,hosts):
+    hosts   = list(dict.fromkeys(hosts))
+    results = await asyncio.gather(*[cache.get(host) for host in hosts])
+    now     = time.monotonic()
+
+    samples = {}
+    for host,(polled,lines) in zip(hosts,results):
+        for line in lines:
+            samples.setdefault(line[:line.index('{')], []).append(line)
+        samples.setdefault('iosxr_result_age_seconds', []).append(
+            sample('iosxr_result_age_seconds',[('device', host)],"{0:.3f}".format(now - polled)))
+
+    output = []
+    for name,help in METRICS:
+        if name in samples:
+            output.append("# HELP {0} {1}".format(name, help))
+            output.append("# TYPE {0} gauge".format(name))
+            output.extend(samples[name])
+
+    for (name,help,type),value in zip(EXPORTER_METRICS,(cache.polls, cache.hits, cache.shared)):
+        output.append("# HELP {0} {1}".format(name, help))
+        output.append("# TYPE {0} {1}".format(name, type))
+        output.append("{0} {1}".format(name, value))
+
+    return ("\n".join(output) + "\n")
+
+#
+# Write a response, HEAD gets the headers only
+#
+def response(writer,status,body,content_type='text/plain; charset=utf-8',head=False):
+    body = body.encode('utf-8')
+    writer.write("HTTP/1.0 {0}\r\nContent-Type: {1}\r\nContent-Length: {2}\r\nConnection: close\r\n\r\n".format(
+        status, content_type, len(body)).encode('ascii') + (b'' if head else body))
+
+#
+# One HTTP request, GET /metrics with an optional target
+#
+async def handle(cache,hosts,reader,writer):
+    try:
+        request = (await reader.readline()).decode('latin-1').split()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+
+        if len(request) < 2 or request[0] not in ('GET', 'HEAD'):
+            response(writer,'405 Method Not Allowed',"Only GET and HEAD\n")
+            return
+
+        head    = request[0] == 'HEAD'
+        url     = urlsplit(request[1])
+        targets = parse_qs(url.query).get('target')
+        if url.path != '/metrics':
+            response(writer,'404 Not Found',"Try /metrics\n",head=head)
+        elif targets and [target for target in targets if target not in hosts]:
+            response(writer,'404 Not Found',"Not in the inventory\n",head=head)
+        else:
+            response(writer,'200 OK',await scrape(cache,targets or hosts),CONTENT_TYPE,head)
+
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def run(inventory,options):
+    loop     = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    devices  = Poller(inventory,options)
+    cache    = ResultCache(devices.poll,options.max_age)
+    hosts    = [host for host,community,interval in inventory]
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    server = await asyncio.start_server(lambda reader,writer: handle(cache,hosts,reader,writer),
+                                        options.address,options.port)
+    try:
+        await stopping.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        devices.close()
+
+def main():
+    opts      = options()
+    inventory = poller.read_inventory(opts.inventory,opts.community)
+
+    asyncio.run(run(inventory,opts))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+# Decode INET-ADDRESS-MIB style OID indexes.
+#
+# Tables like cbgpPeer2Table are indexed by an InetAddressType
+# followed by an InetAddress, which in an OID is a length and
+# that many octets:
+#
+#   1.4.10.0.0.1                        ipv4  10.0.0.1
+#   2.16.32.1.7.248.0.13.0.252.0...115  ipv6  2001:7f8:d:fc::73
+#   3.8.<4 octets>.<4 octet zone>       ipv4z 10.0.0.1%3
+#   4.20.<16 octets>.<4 octet zone>     ipv6z fe80::1%3
+#
+# Addresses are packed into bytes and formatted with
+# inet_ntop, which gives the canonical RFC 5952 form. Decoded
+# indexes are kept in a bounded LRU keyed by the raw suffix,
+# since the same peers come back on every poll.
+
+import collections
+import struct
+
+IPV4  = 1
+IPV6  = 2
+IPV4Z = 3
+IPV6Z = 4
+DNS   = 16
+
+DEFAULT_CACHE_SIZE = 65536
+
+class DecodeError(Exception):
+    pass
+
+#
+# Format one address from its type and octets
+#
+def format_address(type,octets):
+    if type == IPV4 and len(octets) == 4:
+        return ('%d.%d.%d.%d' % tuple(octets))
+
+    if type == IPV6 and len(octets) == 16:
+        import socket
+        return (socket.inet_ntop(socket.AF_INET6, struct.pack('16B', *octets)))
+
+    if type == IPV4Z and len(octets) == 8:
+        zone = struct.unpack('>I', struct.pack('4B', *octets[4:]))[0]
+        return ('%d.%d.%d.%d%%%d' % (tuple(octets[:4]) + (zone,)))
+
+    if type == IPV6Z and len(octets) == 20:
+        import socket
+        zone    = struct.unpack('>I', struct.pack('4B', *octets[16:]))[0]
+        address = socket.inet_ntop(socket.AF_INET6, struct.pack('16B', *octets[:16]))
+        return ('%s%%%d' % (address, zone))
+
+    if type == DNS:
+        return (''.join(chr(octet) for octet in octets))
+
+    raise DecodeError("bad InetAddress type {0} with {1} octets".format(type, len(octets)))
+
+#
+# Decode 'type.length.octets[.rest]' into (type, address, rest)
+#
+# rest is whatever index follows the address, '' if nothing.
+#
+def decode(suffix):
+    parts = suffix.split('.')
+    try:
+        type   = int(parts[0])
+        length = int(parts[1])
+        octets = [int(octet) for octet in parts[2:2 + length]]
+    except (IndexError, ValueError):
+        raise DecodeError("bad InetAddress index '{0}'".format(suffix))
+
+    if len(octets) != length:
+        raise DecodeError("short InetAddress index '{0}'".format(suffix))
+    if any(octet < 0 or octet > 255 for octet in octets):
+        raise DecodeError("bad octet in InetAddress index '{0}'".format(suffix))
+
+    return (type, format_address(type,octets), '.'.join(parts[2 + length:]))
+
+#
+# Bounded LRU in front of decode
+#
+# functools.lru_cache isn't there on Python 2, an OrderedDict
+# with the most recently used suffix at the end does the job.
+#
+class Decoder(object):
+
+    def __init__(self,size=DEFAULT_CACHE_SIZE):
+        self.size   = size
+        self.cache  = collections.OrderedDict()
+        self.hits   = 0
+        self.misses = 0
+
+    def decode(self,suffix):
+        result = self.cache.pop(suffix, None)
+        if result is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            result = decode(suffix)
+            if len(self.cache) >= self.size:
+                self.cache.popitem(last=False)
+
+        self.cache[suffix] = result
+
+        return (result)
+
+decoder = Decoder()
+
+def decode_cached(suffix):
+    return (decoder.decode(suffix))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+# Hand check results to Nagios as passive check results.
+#
+# Used by scripts that produce more than one result per run,
+# like check_daemon.py and check_device.py. Results go either
+# to the external command file as PROCESS_SERVICE_CHECK_RESULT
+# commands, or as check result files into the Nagios
+# checkresults spool directory.
+
+import errno
+import os
+import random
+import string
+import time
+
+# Nagios only reads result files named c and six more characters
+SPOOL_CHARS = string.ascii_letters + string.digits
+
+#
+# Passive results through the external command file
+#
+class CommandFileWriter(object):
+
+    def __init__(self,path):
+        self.path = path
+
+    def submit(self,host,service,exitcode,output,start,finish):
+        command = "[{0}] PROCESS_SERVICE_CHECK_RESULT;{1};{2};{3};{4}\n".format(
+            int(finish),
+            host,
+            service,
+            exitcode,
+            output.replace("\n", "\\n"))
+
+        # The command file is a named pipe, one write per command
+        with open(self.path, "a") as f:
+            f.write(command)
+
+#
+# Passive results as files in the checkresults spool directory
+#
+class SpoolDirWriter(object):
+
+    def __init__(self,path):
+        if not os.path.isdir(path):
+            raise IOError("{0} is not a directory".format(path))
+        self.path = path
+
+    #
+    # Create a new cXXXXXX file, the way Nagios names its own
+    #
+    def create(self):
+        rand = random.SystemRandom()
+        while True:
+            name = "c" + "".join(rand.choice(SPOOL_CHARS) for i in range(6))
+            path = os.path.join(self.path, name)
+            try:
+                return (os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), path)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def submit(self,host,service,exitcode,output,start,finish):
+        fd,path = self.create()
+
+        with os.fdopen(fd, "w") as f:
+            f.write("### Passive Check Result File ###\n")
+            f.write("file_time={0}\n\n".format(int(finish)))
+            f.write("### Nagios Service Check Result ###\n")
+            f.write("# Time: {0}\n".format(time.ctime(finish)))
+            f.write("host_name={0}\n".format(host))
+            f.write("service_description={0}\n".format(service))
+            f.write("check_type=1\n")
+            f.write("check_options=0\n")
+            f.write("scheduled_check=0\n")
+            f.write("reschedule_check=0\n")
+            f.write("latency=0.0\n")
+            f.write("start_time={0:.6f}\n".format(start))
+            f.write("finish_time={0:.6f}\n".format(finish))
+            f.write("early_timeout=0\n")
+            f.write("exited_ok=1\n")
+            f.write("return_code={0}\n".format(exitcode))
+            f.write("output={0}\n".format(output.replace("\n", "\\n")))
+
+        # Nagios only picks up result files that have an .ok marker
+        open(path + ".ok", "w").close()
+
+#
+# Writer for whichever of the two was given, raises IOError
+# if the spool directory is missing
+#
+def open_writer(command_file=None,spool_dir=None):
+    if command_file:
+        return (CommandFileWriter(command_file))
+    if spool_dir:
+        return (SpoolDirWriter(spool_dir))
+
+    return (None)
+
+#
+# Format a result as host;check;exitcode;output
+#
+def format_result(host,check,exitcode,output):
+    return ("{0};{1};{2};{3}".format(host, check, exitcode, output.replace("\n", "\\n")))
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+
+# Poll a whole inventory of IOS-XR routers from one process.
+#
+# Runs the same BGP and environment checks as
+# check_bgp_neighbors.py and check_env.py, but over
+# non-blocking UDP (snmp_async) so hundreds of routers are
+# polled concurrently instead of one Nagios fork per host
+# and check.
+#
+# The inventory file has one router per line:
+#
+#   <host> [community [interval]]
+#
+# Lines starting with '#' are ignored, a missing community
+# falls back to -c. The interval in seconds is only used by
+# check_daemon.py. One line is printed per router and
+# check, in the same host;check;exitcode;output form Nagios
+# uses for passive results, with newlines in the output
+# escaped as \n. Each output carries the check's own
+# perfdata, as from the single-host scripts, and a total
+# over all routers goes to stderr at the end.
+#
+# With -j the inventory is split into shards, one per worker
+# process, each running its own event loop. Decoding and
+# evaluating thousands of tables then uses more than one
+# core. A worker that is done with its shard takes routers
+# from the back of the fullest other shard, so a shard full
+# of slow routers doesn't hold up the whole run. The parent
+# prints results as workers send them and adds up their
+# totals.
+
+import asyncio
+import multiprocessing
+import queue
+import sys
+import time
+import traceback
+from optparse import OptionParser
+
+import check_bgp_neighbors
+import check_env
+import passive_result
+import snmp_async
+import snmp_limit
+import snmp_retry
+import snmp_stats
+import snmp_table
+
+CHECKS = ['bgp', 'env']
+
+#
+# Options shared with check_daemon.py
+#
+def option_parser(usage):
+    parser = OptionParser(usage=usage)
+
+    parser.add_option("-f",
+                      type="string",
+                      dest="inventory",
+                      help="file with one router per line")
+
+    parser.add_option("-c",
+                      type="string",
+                      dest="community",
+                      help="snmp community for routers without one in the inventory")
+
+    parser.add_option("-C",
+                      type="string",
+                      dest="checks",
+                      default=",".join(CHECKS),
+                      help="comma separated checks to run (default %default)")
+
+    parser.add_option("-g",
+                      type="int",
+                      dest="devices",
+                      default=64,
+                      help="routers polled at the same time (default %default)")
+
+    parser.add_option("-d",
+                      type="int",
+                      dest="pdus",
+                      default=2,
+                      help="PDUs in flight towards one router (default %default)")
+
+    parser.add_option("-m",
+                      type="int",
+                      dest="maxrep",
+                      default=snmp_table.DEFAULT_MAX_REPETITIONS,
+                      help="GETBULK max-repetitions (default %default)")
+
+    snmp_retry.add_options(parser)
+    snmp_limit.add_options(parser)
+
+    return (parser)
+
+#
+# Parse and check options
+#
+def parse_options(parser):
+    (options, args) = parser.parse_args()
+
+    checks = options.checks.split(",")
+    if not options.inventory or [check for check in checks if check not in CHECKS]:
+        parser.print_help()
+        sys.exit(3) # Unknown
+
+    options.checks  = checks
+    options.policy  = snmp_retry.from_options(options)
+    options.limiter = snmp_limit.from_options(options)
+
+    return (options)
+
+def options():
+    parser = option_parser("usage: %prog -f [inventory] [-c community] [-C bgp,env] [-g devices] [-d pdus] [-j workers]")
+
+    parser.add_option("-j",
+                      type="int",
+                      dest="workers",
+                      default=1,
+                      help="worker processes sharing the inventory, -g is split between them (default %default)")
+
+    return (parse_options(parser))
+
+#
+# Read (host, community, interval) from the inventory file,
+# interval is None unless the line sets one
+#
+def read_inventory(path,community):
+    devices = []
+    for line in open(path):
+        fields = line.split()
+        if not fields or fields[0].startswith('#'):
+            continue
+
+        if len(fields) > 2:
+            devices.append((fields[0], fields[1], int(fields[2])))
+        elif len(fields) > 1:
+            devices.append((fields[0], fields[1], None))
+        elif community:
+            devices.append((fields[0], community, None))
+
+    return (devices)
+
+BGP_COLUMNS = [check_bgp_neighbors.BGP_PEER_STATE,
+               check_bgp_neighbors.BGP_PEER_REMOTE_AS,
+               check_bgp_neighbors.BGP_PEER_LAST_ERR]
+
+#
+# Walk cbgpPeer2Table, returns the table
+#
+async def walk_bgp(session,maxrep,stats):
+    with stats.phase('walk'):
+        table = await session.bulk_walk(BGP_COLUMNS,maxrep,stats)
+
+    # Same snmpd lagg as in check_neighbor_status_v4, back off and try again
+    for attempt in range(session.policy.retries):
+        if table[check_bgp_neighbors.BGP_PEER_STATE] or session.host in session.policy.down:
+            break
+        with stats.phase('wait'):
+            await asyncio.sleep(session.policy.backoff(attempt,snmp_retry.EMPTY_BACKOFF))
+        stats.retry()
+        with stats.phase('walk'):
+            table = await session.bulk_walk(BGP_COLUMNS,maxrep,stats)
+
+    return (table)
+
+#
+# check_bgp_neighbors.check_neighbor_status_table, non-blocking
+#
+async def poll_bgp(session,maxrep,total=None):
+    stats = snmp_stats.Stats()
+    try:
+        table = await walk_bgp(session,maxrep,stats)
+    except snmp_table.IncompleteWalk as e:
+        return (incomplete(e,stats,total))
+
+    with stats.phase('eval'):
+        v4,v6 = check_bgp_neighbors.split_peer_rows(snmp_table.join_rows(table,BGP_COLUMNS))
+        exitcode,output = check_bgp_neighbors.check_result(v4,v6,False)
+
+    if total is not None:
+        total.merge(stats)
+
+    return (exitcode, snmp_stats.with_perfdata(output,stats.perfdata()))
+
+#
+# Result of a check whose walk stopped partway
+#
+def incomplete(error,stats,total=None):
+    if total is not None:
+        total.merge(stats)
+
+    return (3, snmp_stats.with_perfdata("Incomplete SNMP data ({0})".format(error),stats.perfdata())) # Unknown
+
+ENV_GROUPS = (check_env.SENSOR_COLUMNS,
+              check_env.THRESHOLD_COLUMNS,
+              check_env.PHYSICAL_COLUMNS)
+
+#
+# Walk the sensor, threshold and entity tables side by side,
+# returns the tables
+#
+async def walk_env(session,maxrep,stats):
+    walked = ENV_GROUPS[:2] + (check_env.PHYSICAL_COLUMNS + check_env.TREE_COLUMNS,)
+
+    with stats.phase('walk'):
+        return (await asyncio.gather(*[session.bulk_walk(columns,maxrep,stats) for columns in walked]))
+
+#
+# Joined sensor, threshold and entity rows and entity paths
+# from the walked tables
+#
+def env_rows(tables):
+    sensors,thresholds,physical = [snmp_table.join_rows(table,columns) for table,columns in zip(tables,ENV_GROUPS)]
+    paths = check_env.entity_paths(snmp_table.join_rows(tables[2],check_env.TREE_COLUMNS),physical)
+
+    return (sensors, thresholds, physical, paths)
+
+#
+# check_env.check_sensors_table, non-blocking
+#
+async def poll_env(session,maxrep,total=None):
+    stats  = snmp_stats.Stats()
+    try:
+        tables = await walk_env(session,maxrep,stats)
+    except snmp_table.IncompleteWalk as e:
+        return (incomplete(e,stats,total))
+
+    # Walks that timed out come back empty, that isn't a router with no sensors
+    if not stats.pdus > stats.timeouts:
+        if total is not None:
+            total.merge(stats)
+        return (3, snmp_stats.with_perfdata("No SNMP data",stats.perfdata())) # Unknown
+
+    with stats.phase('eval'):
+        sensors,thresholds,physical,paths = env_rows(tables)
+        exitcode,alarms,sensors,num = check_env.evaluate_sensor_tables(sensors,thresholds,physical,paths=paths)
+
+    if total is not None:
+        total.merge(stats)
+
+    if exitcode == 0:
+        return (exitcode, snmp_stats.with_perfdata(check_env.summary(sensors,num),stats.perfdata()))
+
+    return (exitcode, snmp_stats.with_perfdata("\n".join(alarms),stats.perfdata()))
+
+POLLERS = {'bgp': poll_bgp, 'env': poll_env}
+
+#
+# Run checks side by side on an open session, returns
+# one (exitcode, output) per check. Their stats are added
+# to total if given.
+#
+async def run_checks(session,checks,maxrep,total=None):
+    try:
+        results = await asyncio.gather(*[POLLERS[check](session,maxrep,total) for check in checks])
+    except OSError as e:
+        results = [(3, "No SNMP data ({0})".format(e)) for check in checks]
+    except Exception as e:
+        # Tables a check can't make sense of shouldn't take the
+        # other routers in the run down with them
+        traceback.print_exc()
+        results = [(3, "Check failed ({0})".format(e)) for check in checks]
+
+    return (results)
+
+#
+# Run every check against one router
+#
+async def poll_device(host,community,options,devices,total=None):
+    async with devices:
+        try:
+            async with snmp_async.AsyncSession(host,community,
+                                               policy=options.policy,
+                                               limiter=options.limiter,
+                                               limit=options.pdus) as session:
+                results = await run_checks(session,options.checks,options.maxrep,total)
+        except OSError as e:
+            results = [(3, "No SNMP data ({0})".format(e)) for check in options.checks]
+        except Exception as e:
+            traceback.print_exc()
+            results = [(3, "Check failed ({0})".format(e)) for check in options.checks]
+
+    return ([(host, check, exitcode, output)
+             for check,(exitcode,output) in zip(options.checks,results)])
+
+#
+# Run checks against one router and wait for the results, for
+# callers that are not async themselves
+#
+def check_device(host,community,checks,maxrep=snmp_table.DEFAULT_MAX_REPETITIONS,
+                 port=snmp_async.DEFAULT_PORT,policy=None):
+    async def run():
+        async with snmp_async.AsyncSession(host,community,port=port,
+                                           policy=policy) as session:
+            return (await run_checks(session,checks,maxrep))
+
+    return (asyncio.run(run()))
+
+def print_results(results):
+    for result in results:
+        print(passive_result.format_result(*result))
+    sys.stdout.flush()
+
+async def poll(inventory,options,total):
+    devices = asyncio.Semaphore(options.devices)
+    tasks   = [poll_device(host,community,options,devices,total) for host,community,interval in inventory]
+
+    # Print results as routers finish, slow ones don't hold up the rest
+    for task in asyncio.as_completed(tasks):
+        print_results(await task)
+
+#
+# Inventory split into one shard per worker process
+#
+# Each shard is a range of the inventory. Workers take from the
+# front of their own and, once it is empty, steal from the back
+# of the one with most routers left.
+#
+class Shards(object):
+
+    def __init__(self,inventory,workers):
+        bounds = [len(inventory) * n // workers for n in range(workers + 1)]
+
+        self.inventory = inventory
+        self.lock      = multiprocessing.Lock()
+        self.start     = multiprocessing.RawArray('i', bounds[:-1])
+        self.end       = multiprocessing.RawArray('i', bounds[1:])
+
+    def take(self,worker):
+        with self.lock:
+            if self.start[worker] < self.end[worker]:
+                self.start[worker] += 1
+                return (self.inventory[self.start[worker] - 1])
+
+            victim = max(range(len(self.start)), key=lambda n: self.end[n] - self.start[n])
+            if self.start[victim] < self.end[victim]:
+                self.end[victim] -= 1
+                return (self.inventory[self.end[victim]])
+
+        return (None)
+
+#
+# Worker process, polls routers until every shard is empty and
+# sends results and finally its totals to the parent
+#
+def run_worker(worker,shards,options,results):
+    total = snmp_stats.Stats()
+
+    async def runner(devices):
+        device = shards.take(worker)
+        while device is not None:
+            host,community,interval = device
+            results.put(('result', await poll_device(host,community,options,devices,total)))
+            device = shards.take(worker)
+
+    async def run():
+        devices = asyncio.Semaphore(options.devices)
+        await asyncio.gather(*[runner(devices) for n in range(options.devices)])
+
+    asyncio.run(run())
+    results.put(('done', total))
+
+def poll_sharded(inventory,options,total):
+    options.devices = max(1, options.devices // options.workers)
+
+    shards  = Shards(inventory,options.workers)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_worker, args=(n,shards,options,results))
+               for n in range(options.workers)]
+    for worker in workers:
+        worker.start()
+
+    done = 0
+    while done < len(workers):
+        try:
+            kind,data = results.get(timeout=1)
+        except queue.Empty:
+            # A worker that died never says it is done
+            if not any(worker.is_alive() for worker in workers):
+                break
+            continue
+
+        if kind == 'result':
+            print_results(data)
+        else:
+            total.merge(data)
+            done += 1
+
+    for worker in workers:
+        worker.join()
+
+def main():
+    opts      = options()
+    inventory = read_inventory(opts.inventory,opts.community)
+    total     = snmp_stats.Stats()
+
+    if opts.workers > 1:
+        poll_sharded(inventory,opts,total)
+    else:
+        asyncio.run(poll(inventory,opts,total))
+
+    print("{0} routers | {1}".format(len(inventory), total.perfdata()), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
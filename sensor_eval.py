@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+# Table-driven evaluation of entSensorThresholdRelation.
+#
+# Instead of testing one threshold at a time while fetching
+# it, every threshold row of a device (or of many devices)
+# is laid out in columns:
+#
+#   index, slot, value, threshold, relation, notification
+#
+# and all relations are evaluated in one pass, with NumPy
+# when it is installed and plain Python otherwise. The
+# result is the list of row numbers that should alarm.
+# NumPy takes longer to import than a small check takes to
+# run, so it is only loaded once there are rows to evaluate.
+#
+# Local override rules can replace the device's relation and
+# threshold, or ignore a sensor, matched per entPhysicalName
+# or sensor type. Rules are compiled once and rewrite the
+# columns before evaluation, so alarm texts show the values
+# that were actually compared.
+#
+#   Object  entSensorThresholdRelation
+#   OID     1.3.6.1.4.1.9.9.91.1.2.1.1.3
+#   Type    SensorThresholdRelation
+#   1:lessThan
+#   2:lessOrEqual
+#   3:greaterThan
+#   4:greaterOrEqual
+#   5:equalTo
+#   6:notEqualTo
+
+import fnmatch
+import operator
+import re
+
+# NumPy module, None if it isn't installed, False until first tried
+numpy = False
+
+RELATIONS = {
+    1: ('lessThan',       operator.lt, "is less than"),
+    2: ('lessOrEqual',    operator.le, "is less or equal than"),
+    3: ('greaterThan',    operator.gt, "is greater than"),
+    4: ('greaterOrEqual', operator.ge, "is greater or equal than"),
+    5: ('equalTo',        operator.eq, "is equal to"),
+    6: ('notEqualTo',     operator.ne, "is not equal to"),
+}
+
+RELATION_CODES = dict((name, code) for code,(name, op, txt) in RELATIONS.items())
+
+COLUMNS = ('index', 'slot', 'value', 'threshold', 'relation', 'notification', 'name', 'type')
+
+class RuleError(Exception):
+    pass
+
+#
+# Alarm text for a relation, or None
+#
+def relation_text(relation):
+    if relation in RELATIONS:
+        return (RELATIONS[relation][2])
+
+    return (None)
+
+#
+# Evaluate a single value, for callers that still go one row at a time
+#
+def check(value,relation,threshold):
+    if relation in RELATIONS and RELATIONS[relation][1](value, threshold):
+        return (RELATIONS[relation][2])
+
+    return (None)
+
+#
+# Empty set of columns to append rows to
+#
+def new_columns():
+    return (dict((column, []) for column in COLUMNS))
+
+def add_row(columns,index,slot,value,threshold,relation,notification,name='',type=''):
+    columns['index'].append(index)
+    columns['slot'].append(slot)
+    columns['value'].append(value)
+    columns['threshold'].append(threshold)
+    columns['relation'].append(relation)
+    columns['notification'].append(notification)
+    columns['name'].append(name)
+    columns['type'].append(type)
+
+#
+# Evaluate every row, returns the row numbers that alarm
+#
+# Rows only alarm when the relation holds and notification is
+# enabled, as in the CISCO-ENTITY-SENSOR-MIB pseudo-code.
+#
+def evaluate(columns):
+    values        = columns['value']
+    thresholds    = columns['threshold']
+    relations     = columns['relation']
+    notifications = columns['notification']
+
+    if values and load_numpy() is not None:
+        return (_evaluate_numpy(values,thresholds,relations,notifications))
+
+    alarms = []
+    for n in range(len(values)):
+        if notifications[n] != 1:
+            continue
+
+        relation = RELATIONS.get(relations[n])
+        if relation is not None and relation[1](values[n], thresholds[n]):
+            alarms.append(n)
+
+    return (alarms)
+
+def load_numpy():
+    global numpy
+    if numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+
+    return (numpy)
+
+def _evaluate_numpy(values,thresholds,relations,notifications):
+    values     = numpy.asarray(values, dtype=numpy.int64)
+    thresholds = numpy.asarray(thresholds, dtype=numpy.int64)
+    relations  = numpy.asarray(relations, dtype=numpy.int64)
+
+    mask = numpy.zeros(len(values), dtype=bool)
+    for code,(name, op, txt) in RELATIONS.items():
+        mask |= (relations == code) & op(values, thresholds)
+
+    mask &= numpy.asarray(notifications) == 1
+
+    return ([int(n) for n in numpy.nonzero(mask)[0]])
+
+#
+# Rule files
+#
+# One rule per line, a match and actions, first match wins:
+#
+#   <name|type>:<glob> [<key>[=<value>] ...]
+#
+# name matches entPhysicalName, type the sensor type as the
+# check prints it (e.g. "dBm", "degrees?celsius"). Globs can't
+# contain blanks, use ? instead. Everything after a # is a
+# comment.
+#
+# actions maps each key allowed to a function turning its
+# value into a setting, raising ValueError for a bad one.
+# Returns a list of (field, regex, settings), settings being
+# {key: setting} for the actions given.
+#
+def parse_rules(lines,actions):
+    rules = []
+    for number,line in enumerate(lines, 1):
+        line = line.split('#')[0].strip()
+        if not line:
+            continue
+
+        fields = line.split(None, 1)
+        field,_,pattern = fields[0].partition(':')
+        if field not in ('name', 'type') or not pattern:
+            raise RuleError("line {0}: expected name:<glob> or type:<glob>".format(number))
+
+        settings = {}
+        for action in (fields[1] if len(fields) > 1 else '').split():
+            key,_,value = action.partition('=')
+            try:
+                settings[key] = actions[key](value)
+            except (KeyError, ValueError):
+                raise RuleError("line {0}: bad action '{1}'".format(number, action))
+
+        rules.append((field, re.compile(fnmatch.translate(pattern)), settings))
+
+    return (rules)
+
+#
+# Rule matching a sensor's name or type, or None
+#
+def match_rule(rules,name,type):
+    for rule in rules:
+        field,regex = rule[:2]
+        subject = name if field == 'name' else type
+        if regex.match(subject or ''):
+            return (rule)
+
+    return (None)
+
+#
+# Action without a value, like ignore
+#
+def flag(value):
+    if value:
+        raise ValueError(value)
+
+    return (True)
+
+#
+# Relation by name or number, ValueError for anything else
+#
+def relation_code(value):
+    code = RELATION_CODES.get(value) or int(value)
+    if code not in RELATIONS:
+        raise ValueError(value)
+
+    return (code)
+
+#
+# Local override rules
+#
+# Rule files as above, with the actions
+#
+#   ignore
+#   [slot=<n>] [relation=<name|1-6>] [threshold=<value>]
+#
+class Rules(object):
+
+    ACTIONS = {'ignore':    flag,
+               'slot':      int,
+               'relation':  relation_code,
+               'threshold': int}
+
+    def __init__(self,rules):
+        # (field, regex, slot, ignore, relation, threshold)
+        self.rules = rules
+
+    @classmethod
+    def parse(cls,lines):
+        return (cls([(field, regex, settings.get('slot'), settings.get('ignore', False),
+                      settings.get('relation'), settings.get('threshold'))
+                     for field,regex,settings in parse_rules(lines,cls.ACTIONS)]))
+
+    @classmethod
+    def load(cls,path):
+        with open(path) as f:
+            return (cls.parse(f))
+
+    #
+    # Rule for one row, matching is cached per (name, type, slot)
+    # since most rows share them
+    #
+    def _lookup(self,cache,name,type,slot):
+        key = (name, type, slot)
+        if key not in cache:
+            cache[key] = match_rule([rule for rule in self.rules if rule[2] is None or rule[2] == slot],
+                                    name,type)
+
+        return (cache[key])
+
+    #
+    # Return a copy of the columns with the overrides applied,
+    # ignored rows get their notification turned off
+    #
+    def apply(self,columns):
+        thresholds    = list(columns['threshold'])
+        relations     = list(columns['relation'])
+        notifications = list(columns['notification'])
+        cache         = {}
+
+        for n in range(len(thresholds)):
+            rule = self._lookup(cache,columns['name'][n],columns['type'][n],columns['slot'][n])
+            if rule is None:
+                continue
+
+            field,regex,slot,ignore,relation,threshold = rule
+            if ignore:
+                notifications[n] = 2
+            if relation is not None:
+                relations[n] = relation
+            if threshold is not None:
+                thresholds[n] = threshold
+
+        applied = dict(columns)
+        applied['threshold']    = thresholds
+        applied['relation']     = relations
+        applied['notification'] = notifications
+
+        return (applied)
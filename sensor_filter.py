@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+# Which sensors check_env.py looks at.
+#
+# Filters are given as field:values, with comma separated
+# values:
+#
+#   type:dBm,celsius     entSensorType, MIB name or number
+#   class:port           entPhysicalClass of the sensor or of
+#                        the entity it is contained in
+#   name:*Lane*          shell pattern on entPhysicalName
+#
+# A sensor is checked when it matches every include filter
+# (-I) and none of the exclude filters (-E), so
+#
+#   -E type:dBm -E class:port
+#
+# leaves out the optics readings of every port. The filters
+# only need the static entity and sensor type columns. With
+# the entity cache they are resolved before the live columns
+# are fetched, and excluded sensors are not requested at all.
+
+from fnmatch import fnmatchcase
+
+import snmp_table
+
+# CISCO-ENTITY-SENSOR-MIB SensorDataType
+TYPES = {'other':       '1',
+         'unknown':     '2',
+         'voltsac':     '3',
+         'voltsdc':     '4',
+         'amperes':     '5',
+         'watts':       '6',
+         'hertz':       '7',
+         'celsius':     '8',
+         'percentrh':   '9',
+         'rpm':         '10',
+         'cmm':         '11',
+         'truthvalue':  '12',
+         'specialenum': '13',
+         'dbm':         '14'}
+
+# ENTITY-MIB PhysicalClass
+CLASSES = {'other':       '1',
+           'unknown':     '2',
+           'chassis':     '3',
+           'backplane':   '4',
+           'container':   '5',
+           'powersupply': '6',
+           'fan':         '7',
+           'sensor':      '8',
+           'module':      '9',
+           'port':        '10',
+           'stack':       '11',
+           'cpu':         '12'}
+
+FIELDS = {'type': TYPES, 'class': CLASSES, 'name': None}
+
+class FilterError(Exception):
+    pass
+
+#
+# One filter from the command line as (field, values), values
+# being enumeration numbers or name patterns
+#
+def parse(spec):
+    field,sep,values = spec.partition(':')
+    if not sep or field not in FIELDS or not values:
+        raise FilterError("expected type:, class: or name: followed by values")
+
+    names = FIELDS[field]
+    if names is None:
+        return ((field, values.split(',')))
+
+    codes = set()
+    for value in values.split(','):
+        if value.isdigit():
+            codes.add(value)
+        elif value.lower() in names:
+            codes.add(names[value.lower()])
+        else:
+            raise FilterError("unknown {0} {1}".format(field, value))
+
+    return ((field, codes))
+
+class SensorFilter(object):
+
+    def __init__(self,include=(),exclude=()):
+        self.include = list(include)
+        self.exclude = list(exclude)
+
+    @classmethod
+    def parse(cls,include=None,exclude=None):
+        return (cls([parse(spec) for spec in include or ()],
+                    [parse(spec) for spec in exclude or ()]))
+
+    def active(self):
+        return (bool(self.include or self.exclude))
+
+    #
+    # Static attributes of a sensor: its type, the classes of
+    # its entity and of the one containing it, and its name
+    #
+    def attributes(self,index,sensortype,physical,tree):
+        PhysicalClass,PhysicalDescr,PhysicalName = physical.get(index, ('2', '', ''))
+        classes = set([PhysicalClass])
+
+        parent = tree.get(index, (None, None))[0]
+        if parent in physical:
+            classes.add(physical[parent][0])
+
+        return ({'type': set([sensortype]), 'class': classes, 'name': PhysicalName or ''})
+
+    def matches(self,attributes):
+        def match(field,values):
+            if field == 'name':
+                return (any(fnmatchcase(attributes['name'], pattern) for pattern in values))
+            return (bool(attributes[field] & values))
+
+        return (all(match(field,values) for field,values in self.include) and
+                not any(match(field,values) for field,values in self.exclude))
+
+    #
+    # Indexes of the sensors to check, in walk order. types is
+    # {index: entSensorType}, physical and tree the entity rows
+    # as walked.
+    #
+    def select(self,types,physical,tree):
+        return ([index for index in sorted(types, key=snmp_table.index_key)
+                 if self.matches(self.attributes(index,types[index],physical,tree))])
+
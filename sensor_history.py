@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+
+# Per-device history of sensor readings.
+#
+# check_env.py fetches every entSensorValue anyway, so with
+# -D it also appends them here instead of a second poller
+# hitting the routers for trend data. Each device has one
+# file of fixed size, memory-mapped and used as a ring
+# buffer, so old readings are overwritten and the file never
+# grows:
+#
+#   header   magic, version, capacity, next slot, records used
+#   records  capacity x (unix time, sensor index, value)
+#
+# Values are stored scaled by entSensorScale, so a reading of
+# 12000 milli volts is kept as 12.0. Records are appended in
+# time order, which lets a query find the start of a time
+# range with a binary search instead of reading the file.
+# Writers hold an exclusive flock, readers a shared one.
+#
+# Run as a script it prints the history of a device:
+#
+#   ./sensor_history.py -D /var/lib/iosxr/history -H router1 -i 1012 -s -3600
+
+from __future__ import print_function
+
+import errno
+import fcntl
+import mmap
+import os
+import struct
+import sys
+import time
+from optparse import OptionParser
+
+MAGIC   = b'SHST'
+VERSION = 1
+
+# magic, version, capacity, next slot, records used
+HEADER = struct.Struct('<4sIIII')
+
+# unix time, sensor index, scaled value
+RECORD = struct.Struct('<dId')
+
+# About 5 MB per device, days of history for a few hundred sensors
+DEFAULT_CAPACITY = 262144
+
+class HistoryError(Exception):
+    pass
+
+class History(object):
+
+    #
+    # Open a history file, with readonly an existing one just for
+    # reading
+    #
+    def __init__(self,path,capacity=DEFAULT_CAPACITY,readonly=False):
+        self.path = path
+        self.map  = None
+        if readonly:
+            self.fd = os.open(path, os.O_RDONLY)
+        else:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_SH if readonly else fcntl.LOCK_EX)
+            try:
+                self._init(capacity,readonly)
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+            if self.capacity:
+                self.map = mmap.mmap(self.fd, HEADER.size + self.capacity * RECORD.size,
+                                     access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+        except:
+            os.close(self.fd)
+            raise
+
+    #
+    # Lay out a new file, or take the capacity of an existing one.
+    # A reader takes a file no writer has laid out yet as empty.
+    #
+    def _init(self,capacity,readonly=False):
+        data = os.read(self.fd, HEADER.size)
+
+        if not data and readonly:
+            self.capacity = 0
+            return
+        if not data:
+            os.ftruncate(self.fd, HEADER.size + capacity * RECORD.size)
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            os.write(self.fd, HEADER.pack(MAGIC, VERSION, capacity, 0, 0))
+            self.capacity = capacity
+            return
+
+        if len(data) < HEADER.size:
+            raise HistoryError("{0}: truncated header".format(self.path))
+
+        magic,version,self.capacity,head,count = HEADER.unpack(data)
+        if magic != MAGIC or version != VERSION:
+            raise HistoryError("{0}: not a sensor history file".format(self.path))
+
+        if os.fstat(self.fd).st_size < HEADER.size + self.capacity * RECORD.size:
+            raise HistoryError("{0}: truncated records".format(self.path))
+
+    def _header(self):
+        magic,version,capacity,head,count = HEADER.unpack_from(self.map, 0)
+
+        return (head, count)
+
+    #
+    # Append readings taken at one time, a list of (index, value)
+    #
+    def append(self,timestamp,readings):
+        # More readings than fit only leaves the last ones
+        readings = readings[-self.capacity:]
+        data     = b''.join(RECORD.pack(timestamp, int(index), value) for index,value in readings)
+
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            head,count = self._header()
+
+            # Write in at most two pieces, up to the end of the file and from the start
+            first = min(len(readings), self.capacity - head) * RECORD.size
+            start = HEADER.size + head * RECORD.size
+            self.map[start:start + first] = data[:first]
+            if first < len(data):
+                self.map[HEADER.size:HEADER.size + len(data) - first] = data[first:]
+
+            head  = (head + len(readings)) % self.capacity
+            count = min(self.capacity, count + len(readings))
+            HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.capacity, head, count)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    # Record number n, counting from the oldest
+    def _record(self,head,count,n):
+        slot = (head - count + n) % self.capacity
+
+        return (RECORD.unpack_from(self.map, HEADER.size + slot * RECORD.size))
+
+    #
+    # Readings between start and end (unix times, inclusive), for
+    # one sensor index or all of them, as (time, index, value)
+    # oldest first
+    #
+    def read(self,index=None,start=None,end=None):
+        if index is not None:
+            index = int(index)
+        if self.map is None:
+            return ([])
+
+        fcntl.flock(self.fd, fcntl.LOCK_SH)
+        try:
+            head,count = self._header()
+
+            # First record at or after start
+            low,high = 0,count
+            if start is not None:
+                while low < high:
+                    middle = (low + high) // 2
+                    if self._record(head,count,middle)[0] < start:
+                        low = middle + 1
+                    else:
+                        high = middle
+
+            readings = []
+            for n in range(low, count):
+                record = self._record(head,count,n)
+                if end is not None and record[0] > end:
+                    break
+                if index is None or record[1] == index:
+                    readings.append(record)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+        return (readings)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        os.close(self.fd)
+
+def history_path(history_dir,host):
+    return (os.path.join(history_dir, host + '.history'))
+
+#
+# Append one poll's readings to a device's history
+#
+def record(history_dir,host,readings,now=None,capacity=DEFAULT_CAPACITY):
+    if now is None:
+        now = time.time()
+
+    try:
+        os.makedirs(history_dir)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    history = History(history_path(history_dir,host),capacity)
+    try:
+        history.append(now,readings)
+    finally:
+        history.close()
+
+#
+# Read a device's history, empty if there is none
+#
+def query(history_dir,host,index=None,start=None,end=None):
+    path = history_path(history_dir,host)
+    if not os.path.exists(path):
+        return ([])
+
+    history = History(path,readonly=True)
+    try:
+        return (history.read(index,start,end))
+    finally:
+        history.close()
+
+#
+# entSensorValue scaled by entSensorScale, 9 is units and
+# every step is a factor of 1000
+#
+def scaled_value(value,scale):
+    return (float(value) * 1000.0 ** (int(scale) - 9))
+
+#
+# Time given on the command line, unix time or seconds back from now if negative
+#
+def parse_time(value,now):
+    value = float(value)
+    if value < 0:
+        return (now + value)
+
+    return (value)
+
+def main():
+    parser = OptionParser(usage="usage: %prog -D [history dir] -H [host] [-i index] [-s start] [-e end]")
+
+    parser.add_option("-D",
+                      type="string",
+                      dest="history_dir",
+                      help="directory with the history files")
+
+    parser.add_option("-H",
+                      type="string",
+                      dest="host",
+                      help="hostname of router")
+
+    parser.add_option("-i",
+                      type="string",
+                      dest="index",
+                      help="only readings of this sensor index (default all)")
+
+    parser.add_option("-s",
+                      type="string",
+                      dest="start",
+                      help="unix time of the first reading, negative for seconds ago (default oldest)")
+
+    parser.add_option("-e",
+                      type="string",
+                      dest="end",
+                      help="unix time of the last reading, negative for seconds ago (default newest)")
+
+    (options, args) = parser.parse_args()
+
+    if not options.history_dir or not options.host:
+        parser.print_help()
+        sys.exit(3)
+
+    now   = time.time()
+    start = options.start and parse_time(options.start,now)
+    end   = options.end and parse_time(options.end,now)
+
+    try:
+        readings = query(options.history_dir,options.host,options.index,start,end)
+    except (HistoryError, IOError, OSError, ValueError) as e:
+        print ("Can't read history: {0}".format(e), file=sys.stderr)
+        sys.exit(1)
+
+    for timestamp,index,value in readings:
+        print ("{0}\t{1}\t{2:g}".format(
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)),
+            index,
+            value)
+               )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+# Rate of change and baseline alarms on sensor readings.
+#
+# The device thresholds only fire once a value is already
+# out of range. A fan slowing down or a power supply heating
+# up shows earlier as a value moving fast, or far away from
+# where it usually is. For that every sensor keeps a few
+# numbers between runs, updated in O(1) per reading and
+# without looking at any history:
+#
+#   [time, value, baseline, variance, slope, readings]
+#
+# baseline and variance are an exponentially weighted mean
+# and variance with a time constant of an hour, slope the
+# change per minute smoothed the same way over 15 minutes.
+# Weights follow the time between readings, so a missed run
+# counts for as much as it should. A reading alarms when
+#
+#   |slope| > rate
+#   |value - baseline| > deviation * spread
+#
+# where spread is the standard deviation, but at least 1% of
+# the baseline so a sensor that never moved doesn't alarm on
+# its first wiggle. Deviation alarms wait until the baseline
+# has seen WARMUP readings. Both are off unless a rule turns
+# them on: what a normal spread is depends too much on the
+# sensor for one default to fit them all, so the checks take
+# no trend directory without a rules file.
+#
+# State is one JSON file per device next to the other state
+# files, sensors that are gone are dropped from it.
+#
+# Rules pick rate and deviation per sensor, first match wins:
+#
+#   <name|type>:<glob> ignore
+#   <name|type>:<glob> [rate=<change per minute>] [deviation[=<spreads>]]
+#
+# with the same matching as the threshold override rules in
+# sensor_eval, deviation alone meaning DEFAULT_DEVIATION spreads.
+# Values are scaled by entSensorScale, so rates are in volts,
+# not millivolts.
+
+import math
+import os
+
+import sensor_eval
+import state_file
+
+DEFAULT_BASELINE  = 3600.0 # seconds
+DEFAULT_WINDOW    = 900.0  # seconds
+DEFAULT_DEVIATION = 6.0    # spreads
+
+# Smallest spread, as a share of the baseline
+MIN_SPREAD = 0.01
+
+# Readings before deviation alarms start
+WARMUP = 10
+
+# Readings closer than this to the last one are skipped, a check
+# run again by hand shouldn't look like a sudden jump
+MIN_INTERVAL = 10.0 # seconds
+
+def spreads(value):
+    if not value:
+        return (DEFAULT_DEVIATION)
+
+    return (float(value))
+
+#
+# Rate and deviation limits per sensor
+#
+class TrendRules(object):
+
+    ACTIONS = {'ignore':    sensor_eval.flag,
+               'rate':      float,
+               'deviation': spreads}
+
+    def __init__(self,rules=()):
+        # (field, regex, ignore, rate, deviation)
+        self.rules   = list(rules)
+        self.default = (None, None, False, None, None)
+        self.cache   = {}
+
+    @classmethod
+    def parse(cls,lines):
+        return (cls([(field, regex, settings.get('ignore', False), settings.get('rate'),
+                      settings.get('deviation'))
+                     for field,regex,settings in sensor_eval.parse_rules(lines,cls.ACTIONS)]))
+
+    @classmethod
+    def load(cls,path):
+        with open(path) as f:
+            return (cls.parse(f))
+
+    #
+    # Rule for a sensor, cached per (name, type)
+    #
+    def lookup(self,name,type):
+        key = (name, type)
+        if key not in self.cache:
+            self.cache[key] = sensor_eval.match_rule(self.rules,name,type) or self.default
+
+        return (self.cache[key])
+
+def state_path(state_dir,host):
+    return (os.path.join(state_dir, host + '.trend.json'))
+
+def load(state_dir,host):
+    state = state_file.read(state_path(state_dir,host))
+    if state is None:
+        return ({})
+
+    return (state)
+
+def save(state_dir,host,state):
+    state_file.write(state_path(state_dir,host),state)
+
+#
+# Fold one reading into a sensor's state, returns the new state
+#
+def update(sensor,now,value,baseline=DEFAULT_BASELINE,window=DEFAULT_WINDOW):
+    if sensor is None:
+        return ([now, value, value, 0.0, 0.0, 1])
+
+    last,previous,mean,variance,slope,readings = sensor
+    elapsed = now - last
+    if elapsed < MIN_INTERVAL:
+        return (sensor)
+
+    # Exponential weights for the time since the last reading
+    alpha = 1 - math.exp(-elapsed / baseline)
+    beta  = 1 - math.exp(-elapsed / window)
+
+    slope    += beta * ((value - previous) / elapsed * 60 - slope)
+
+    diff      = value - mean
+    mean     += alpha * diff
+    variance  = (1 - alpha) * (variance + alpha * diff * diff)
+
+    return ([now, value, mean, variance, slope, readings + 1])
+
+#
+# Distance from the baseline that alarms
+#
+def limit(sensor,deviation):
+    spread = max(math.sqrt(sensor[3]), MIN_SPREAD * abs(sensor[2]), MIN_SPREAD)
+
+    return (deviation * spread)
+
+#
+# Update the state with one run's readings and check them
+#
+# readings is a list of (index, value, name, type). Returns the
+# new state, holding only the sensors read this time, and a list
+# of alarms as (index, kind, value, amount, limit) where kind is
+# 'rate' (amount per minute) or 'deviation' (amount off the
+# baseline).
+#
+def evaluate(state,now,readings,rules,baseline=DEFAULT_BASELINE,window=DEFAULT_WINDOW):
+    updated = {}
+    alarms  = []
+
+    for index,value,name,type in readings:
+        sensor = state.get(index)
+        field,regex,ignore,rate,deviation = rules.lookup(name,type)
+
+        # Compare against the baseline before this reading moves it
+        if not ignore and deviation and sensor is not None and sensor[5] >= WARMUP:
+            distance = value - sensor[2]
+            allowed  = limit(sensor,deviation)
+            if abs(distance) > allowed:
+                alarms.append((index, 'deviation', value, distance, allowed))
+
+        updated[index] = update(sensor,now,value,baseline,window)
+
+        # A reading inside MIN_INTERVAL left the slope as it was, it
+        # already had its say on the run that set it
+        fresh = sensor is not None and updated[index] is not sensor
+
+        if not ignore and rate and fresh and abs(updated[index][4]) > rate:
+            alarms.append((index, 'rate', value, updated[index][4], rate))
+
+    return (updated, alarms)
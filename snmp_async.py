@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+# Non-blocking SNMPv2c client on top of asyncio.
+#
+# netsnmp blocks the whole interpreter while it waits for
+# a response, so polling many routers from one process
+# needs its own transport. Requests are encoded with
+# snmp_ber and sent over one UDP socket per device, with
+# responses matched to requests by request-id.
+#
+# Each session has a semaphore that limits the PDUs in
+# flight towards its device, the poller bounds how many
+# devices are polled at once.
+#
+# Requests are recorded in a snmp_stats.Stats, the session's
+# own unless the caller passes one, so checks sharing a
+# session can each report what they cost. Timeouts, retries
+# and backoff follow a snmp_retry.Policy and every attempt
+# waits for the shared snmp_limit.Limiter, like the netsnmp
+# sessions do.
+
+import asyncio
+import random
+import time
+
+import snmp_ber
+import snmp_limit
+import snmp_retry
+import snmp_stats
+import snmp_table
+
+DEFAULT_PORT = 161
+
+class _Protocol(asyncio.DatagramProtocol):
+
+    def __init__(self):
+        self.transport = None
+        self.waiters   = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            message = snmp_ber.decode_message(data)
+        except snmp_ber.DecodeError:
+            return
+
+        waiter = self.waiters.pop(message[3], None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result((message, len(data)))
+
+    def error_received(self, exc):
+        # ICMP unreachable and friends, let the request time out
+        pass
+
+    def connection_lost(self, exc):
+        for waiter in self.waiters.values():
+            if not waiter.done():
+                waiter.cancel()
+        self.waiters = {}
+
+class AsyncSession(object):
+
+    def __init__(self,host,community,port=DEFAULT_PORT,policy=None,limit=2,limiter=None):
+        self.host       = host
+        self.community  = community
+        self.port       = port
+        self.policy     = policy or snmp_retry.policy
+        self.limiter    = limiter or snmp_limit.limiter
+        self.limit      = asyncio.Semaphore(limit)
+        self.protocol   = None
+        self.request_id = random.randint(1, 0x7fffffff)
+        self.pdus       = 0
+        self.timeouts   = 0
+        self.stats      = snmp_stats.Stats()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        transport,self.protocol = await loop.create_datagram_endpoint(
+            _Protocol, remote_addr=(self.host, self.port))
+
+    def close(self):
+        if self.protocol is not None and self.protocol.transport is not None:
+            self.protocol.transport.close()
+        self.protocol = None
+
+    #
+    # Send one PDU and wait for the matching response
+    #
+    # Returns the response varbinds as (oid, type, value), or
+    # None if the agent never answered or reported an error.
+    #
+    async def request(self,pdu_type,varbinds,a=0,b=0,stats=None):
+        loop  = asyncio.get_running_loop()
+        stats = stats or self.stats
+        oids  = [oid for oid,type,value in varbinds]
+
+        async with self.limit:
+            for attempt in range(self.policy.retries + 1):
+                if attempt:
+                    backoff = self.policy.backoff(attempt - 1)
+                    stats.add_time('wait',backoff)
+                    await asyncio.sleep(backoff)
+
+                slot = await self.throttle(stats)
+
+                self.request_id = (self.request_id % 0x7fffffff) + 1
+                request_id      = self.request_id
+                message         = snmp_ber.encode_message(self.community,pdu_type,request_id,varbinds,a,b)
+
+                waiter = loop.create_future()
+                self.protocol.waiters[request_id] = waiter
+                self.protocol.transport.sendto(message)
+                self.pdus += 1
+                start      = time.time()
+
+                try:
+                    response,received = await asyncio.wait_for(waiter, self.policy.timeout(self.host,attempt))
+                except asyncio.TimeoutError:
+                    self.protocol.waiters.pop(request_id, None)
+                    self.timeouts += 1
+                    stats.request(oids,time.time() - start,len(message),0,0,
+                                  timeouts=1,retries=int(attempt < self.policy.retries))
+                    continue
+                finally:
+                    self.limiter.release(slot)
+
+                self.policy.sample(self.host,time.time() - start)
+                stats.request(oids,time.time() - start,len(message),received,len(response[6]))
+
+                # error-status set, same as netsnmp returning nothing
+                if response[4] != 0:
+                    return (None)
+
+                return (response[6])
+
+        self.policy.give_up(self.host)
+
+        return (None)
+
+    #
+    # Wait for a token and an in-flight slot without blocking
+    # the loop, returns the slot to release after the request
+    #
+    async def throttle(self,stats):
+        if not self.limiter.enabled():
+            return (-1)
+
+        start = time.time()
+        await asyncio.sleep(self.limiter.reserve(self.host))
+        slot = self.limiter.try_slot(self.host)
+        while slot is None:
+            await asyncio.sleep(snmp_limit.SLOT_POLL)
+            slot = self.limiter.try_slot(self.host)
+        stats.add_time('throttle',time.time() - start)
+
+        return (slot)
+
+    async def get(self,oids,stats=None):
+        varbinds = await self.request(snmp_ber.GET_REQUEST,
+                                      [(oid, None, None) for oid in oids],
+                                      stats=stats)
+        if varbinds is None:
+            return (tuple(None for oid in oids))
+
+        return (tuple(value for oid, type, value in varbinds))
+
+    #
+    # Same as snmp_table.bulk_walk, without blocking the loop
+    #
+    async def bulk_walk(self,columns,maxrep=snmp_table.DEFAULT_MAX_REPETITIONS,stats=None):
+        table,pending = snmp_table.bulk_start(columns)
+        responses     = 0
+
+        while pending:
+            active   = [column for column in columns if column in pending]
+            varbinds = await self.request(snmp_ber.GETBULK_REQUEST,
+                                          [(pending[column], None, None) for column in active],
+                                          0, maxrep, stats)
+            if not varbinds:
+                if responses:
+                    raise snmp_table.IncompleteWalk(responses)
+                break
+            responses += 1
+
+            if not snmp_table.bulk_merge(table,pending,active,varbinds):
+                break
+
+        return (table)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+
+# Minimal BER encoder/decoder for SNMPv2c messages.
+#
+# Only what the checks need is covered: GET, GETNEXT,
+# GETBULK and RESPONSE PDUs with the usual SMIv2 value
+# types. Used by the non-blocking pollers that talk UDP
+# themselves instead of going through netsnmp.
+#
+# Values are decoded into the same string form netsnmp
+# hands back, so the check logic does not care which
+# transport fetched them.
+
+import re
+
+SNMP_VERSION_1  = 0
+SNMP_VERSION_2C = 1
+
+# PDU types
+GET_REQUEST      = 0xa0
+GETNEXT_REQUEST  = 0xa1
+RESPONSE         = 0xa2
+GETBULK_REQUEST  = 0xa5
+
+# Universal and application types
+INTEGER      = 0x02
+OCTET_STRING = 0x04
+NULL         = 0x05
+OBJECT_ID    = 0x06
+SEQUENCE     = 0x30
+IPADDRESS    = 0x40
+COUNTER32    = 0x41
+GAUGE32      = 0x42
+TIMETICKS    = 0x43
+OPAQUE       = 0x44
+COUNTER64    = 0x46
+
+# Exceptions in varbinds
+NO_SUCH_OBJECT   = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW  = 0x82
+
+# Type names as netsnmp reports them in Varbind.type
+TYPE_NAMES = {
+    INTEGER:          'INTEGER',
+    OCTET_STRING:     'OCTETSTR',
+    NULL:             'NULL',
+    OBJECT_ID:        'OBJECTID',
+    IPADDRESS:        'IPADDR',
+    COUNTER32:        'COUNTER',
+    GAUGE32:          'GAUGE',
+    TIMETICKS:        'TICKS',
+    OPAQUE:           'OPAQUE',
+    COUNTER64:        'COUNTER64',
+    NO_SUCH_OBJECT:   'NOSUCHOBJECT',
+    NO_SUCH_INSTANCE: 'NOSUCHINSTANCE',
+    END_OF_MIB_VIEW:  'ENDOFMIBVIEW',
+}
+
+TYPE_CODES = dict((name, code) for code, name in TYPE_NAMES.items())
+
+# Arcs of three digits or more, the only ones that can need more than one octet
+_LONG_ARC = re.compile(r'\d{3,}')
+
+class DecodeError(Exception):
+    pass
+
+#
+# Encoding
+#
+def encode_length(length):
+    if length < 0x80:
+        return (bytearray([length]))
+
+    octets = bytearray()
+    while length:
+        octets.insert(0, length & 0xff)
+        length >>= 8
+
+    return (bytearray([0x80 | len(octets)]) + octets)
+
+def encode_tlv(tag,payload):
+    return (bytearray([tag]) + encode_length(len(payload)) + payload)
+
+def encode_integer(value,tag=INTEGER):
+    octets = bytearray()
+    while True:
+        octets.insert(0, value & 0xff)
+        value >>= 8
+        # Stop once the remaining bits are pure sign extension
+        if (value == 0 and not octets[0] & 0x80) or (value == -1 and octets[0] & 0x80):
+            break
+
+    return (encode_tlv(tag, octets))
+
+def encode_unsigned(value,tag):
+    octets = bytearray()
+    while True:
+        octets.insert(0, value & 0xff)
+        value >>= 8
+        if value == 0:
+            break
+    # Keep it positive
+    if octets[0] & 0x80:
+        octets.insert(0, 0)
+
+    return (encode_tlv(tag, octets))
+
+def encode_oid(oid):
+    arcs = [int(arc) for arc in oid.strip('.').split('.')]
+    if len(arcs) < 2:
+        arcs = arcs + [0]
+
+    octets = bytearray()
+    for arc in [arcs[0] * 40 + arcs[1]] + arcs[2:]:
+        chunk = bytearray([arc & 0x7f])
+        arc >>= 7
+        while arc:
+            chunk.insert(0, 0x80 | (arc & 0x7f))
+            arc >>= 7
+        octets += chunk
+
+    return (encode_tlv(OBJECT_ID, octets))
+
+def encode_value(type,value):
+    if type == 'INTEGER':
+        return (encode_integer(int(value)))
+    if type in ('COUNTER', 'GAUGE', 'TICKS', 'COUNTER64'):
+        return (encode_unsigned(int(value), TYPE_CODES[type]))
+    if type in ('OCTETSTR', 'OPAQUE'):
+        if not isinstance(value, (bytes, bytearray)):
+            value = value.encode('latin-1')
+        return (encode_tlv(TYPE_CODES[type], bytearray(value)))
+    if type == 'IPADDR':
+        return (encode_tlv(IPADDRESS, bytearray(int(octet) for octet in value.split('.'))))
+    if type == 'OBJECTID':
+        return (encode_oid(value))
+    if type in ('NOSUCHOBJECT', 'NOSUCHINSTANCE', 'ENDOFMIBVIEW'):
+        return (encode_tlv(TYPE_CODES[type], bytearray()))
+
+    return (encode_tlv(NULL, bytearray()))
+
+#
+# Build a complete message
+#
+# varbinds is a list of (oid, type, value), requests use type None.
+# For GETBULK, a and b are non-repeaters and max-repetitions,
+# otherwise error-status and error-index.
+#
+def encode_message(community,pdu_type,request_id,varbinds,a=0,b=0,version=SNMP_VERSION_2C):
+    body = bytearray()
+    for oid, type, value in varbinds:
+        body += encode_tlv(SEQUENCE, encode_oid(oid) + encode_value(type, value))
+
+    pdu = (encode_integer(request_id) +
+           encode_integer(a) +
+           encode_integer(b) +
+           encode_tlv(SEQUENCE, body))
+
+    if not isinstance(community, (bytes, bytearray)):
+        community = community.encode('latin-1')
+
+    message = (encode_integer(version) +
+               encode_tlv(OCTET_STRING, bytearray(community)) +
+               encode_tlv(pdu_type, pdu))
+
+    return (bytes(encode_tlv(SEQUENCE, message)))
+
+#
+# Encoded sizes, without building the message
+#
+# Used to account bytes on the wire for requests sent through
+# netsnmp, which does not tell. Same rules as the encoders
+# above, request-ids are taken to be 4 octets like netsnmp's.
+#
+def length_size(length):
+    if length < 0x80:
+        return (1)
+
+    return (1 + (length.bit_length() + 7) // 8)
+
+def tlv_size(length):
+    return (1 + length_size(length) + length)
+
+def oid_size(oid):
+    size = max(1, oid.strip('.').count('.'))
+
+    # One octet per arc, more only for the odd arc above 127
+    for arc in _LONG_ARC.findall(oid):
+        arc = int(arc)
+        if arc > 127:
+            size += (arc.bit_length() - 1) // 7
+
+    return (tlv_size(size))
+
+def value_size(type,value):
+    if value is None:
+        return (tlv_size(0))
+    if type == 'INTEGER':
+        value = int(value)
+        if value < 0:
+            value = ~value
+        return (tlv_size(value.bit_length() // 8 + 1))
+    if type in ('COUNTER', 'GAUGE', 'TICKS', 'COUNTER64'):
+        return (tlv_size(int(value).bit_length() // 8 + 1))
+    if type in ('OCTETSTR', 'OPAQUE'):
+        return (tlv_size(len(value)))
+    if type == 'IPADDR':
+        return (tlv_size(4))
+    if type == 'OBJECTID':
+        return (oid_size(value))
+
+    return (tlv_size(0))
+
+def pdu_size(varbinds,a=0,b=0):
+    body = 0
+    for oid, type, value in varbinds:
+        body += tlv_size(oid_size(oid) + value_size(type, value))
+
+    return (tlv_size(tlv_size(4) + value_size('INTEGER', a) + value_size('INTEGER', b) + tlv_size(body)))
+
+def message_size(community,varbinds,a=0,b=0):
+    return (tlv_size(tlv_size(1) + tlv_size(len(community)) + pdu_size(varbinds,a,b)))
+
+#
+# Decoding
+#
+def decode_tlv(data,pos):
+    if pos + 2 > len(data):
+        raise DecodeError("truncated TLV at %d" % pos)
+
+    tag    = data[pos]
+    length = data[pos + 1]
+    pos   += 2
+
+    if length & 0x80:
+        count  = length & 0x7f
+        length = 0
+        for octet in data[pos:pos + count]:
+            length = (length << 8) | octet
+        pos += count
+
+    end = pos + length
+    if end > len(data):
+        raise DecodeError("TLV at %d runs past end of message" % pos)
+
+    return (tag, pos, end)
+
+def decode_integer(data,pos,end):
+    value = 0
+    for octet in data[pos:end]:
+        value = (value << 8) | octet
+    if end > pos and data[pos] & 0x80:
+        value -= 1 << (8 * (end - pos))
+
+    return (value)
+
+def decode_unsigned(data,pos,end):
+    value = 0
+    for octet in data[pos:end]:
+        value = (value << 8) | octet
+
+    return (value)
+
+def decode_oid(data,pos,end):
+    arcs = []
+    arc  = 0
+    for octet in data[pos:end]:
+        arc = (arc << 7) | (octet & 0x7f)
+        if not octet & 0x80:
+            arcs.append(arc)
+            arc = 0
+
+    if not arcs:
+        return ('')
+
+    first = arcs[0]
+    if first < 80:
+        head = [first // 40, first % 40]
+    else:
+        head = [2, first - 80]
+
+    return ('.' + '.'.join(str(arc) for arc in head + arcs[1:]))
+
+#
+# Decode a varbind value into (type name, value string)
+#
+def decode_value(data,tag,pos,end):
+    type = TYPE_NAMES.get(tag, 'OPAQUE')
+
+    if tag == INTEGER:
+        return (type, str(decode_integer(data, pos, end)))
+    if tag in (COUNTER32, GAUGE32, TIMETICKS, COUNTER64):
+        return (type, str(decode_unsigned(data, pos, end)))
+    if tag in (OCTET_STRING, OPAQUE):
+        return (type, bytes(data[pos:end]).decode('latin-1'))
+    if tag == IPADDRESS:
+        return (type, '.'.join(str(octet) for octet in data[pos:end]))
+    if tag == OBJECT_ID:
+        return (type, decode_oid(data, pos, end))
+
+    return (type, None)
+
+#
+# Parse a complete message
+#
+# Returns (version, community, pdu_type, request_id, a, b, varbinds)
+# with varbinds as a list of (oid, type, value).
+#
+def decode_message(data):
+    data = bytearray(data)
+
+    tag, pos, end = decode_tlv(data, 0)
+    if tag != SEQUENCE:
+        raise DecodeError("message is not a SEQUENCE")
+
+    tag, vpos, vend = decode_tlv(data, pos)
+    version = decode_integer(data, vpos, vend)
+
+    tag, cpos, cend = decode_tlv(data, vend)
+    community = bytes(data[cpos:cend]).decode('latin-1')
+
+    pdu_type, ppos, pend = decode_tlv(data, cend)
+
+    fields = []
+    pos    = ppos
+    for n in range(3):
+        tag, ipos, iend = decode_tlv(data, pos)
+        fields.append(decode_integer(data, ipos, iend))
+        pos = iend
+
+    tag, pos, lend = decode_tlv(data, pos)
+    if tag != SEQUENCE:
+        raise DecodeError("varbind list is not a SEQUENCE")
+
+    varbinds = []
+    while pos < lend:
+        tag, bpos, bend = decode_tlv(data, pos)
+        tag, opos, oend = decode_tlv(data, bpos)
+        oid             = decode_oid(data, opos, oend)
+        tag, vpos, vend = decode_tlv(data, oend)
+        type, value     = decode_value(data, tag, vpos, vend)
+        varbinds.append((oid, type, value))
+        pos = bend
+
+    return (version, community, pdu_type, fields[0], fields[1], fields[2], varbinds)
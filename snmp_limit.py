@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+# Per-router SNMP rate limit shared by every check process.
+#
+# When the BGP and environment checks for the same router
+# start together they fire hundreds of requests back to back
+# and IOS-XR snmpd falls behind. Every process talking to a
+# router draws from the same token bucket, kept in a small
+# file per router and updated under flock:
+#
+#   <dir>/<host>.bucket   tokens and time of last refill
+#   <dir>/<host>.slot<n>  one lock file per request in flight
+#
+# A request takes a token, going into debt if there is none
+# left, and sleeps until the debt is paid off at the
+# configured rate. It then holds one of the slot locks while
+# waiting for the response. flock locks go away with the
+# process, so a killed check never leaves a slot taken.
+#
+# Time spent waiting for either is reported as the
+# 'throttle' phase in the checks' perfdata.
+#
+# The default directory sits in the shared temp directory, so
+# it is created private to the user and only used if it still
+# is: owned by the user and not writable by anyone else. State
+# files are never opened through symlinks.
+
+import errno
+import fcntl
+import os
+import stat
+import struct
+import sys
+import time
+from contextlib import contextmanager
+
+import snmp_stats
+
+# Directory in the system's temp directory, found when first needed
+DEFAULT_DIR = 'iosxr-snmp-limit'
+
+# tokens, time of last refill
+BUCKET = struct.Struct('<dd')
+
+# Seconds between attempts to get a free slot
+SLOT_POLL = 0.005
+
+class LimitError(Exception):
+    pass
+
+class Limiter(object):
+
+    def __init__(self,rate=None,inflight=None,directory=None):
+        self.rate      = rate
+        self.burst     = max(1.0, rate or 0)
+        self.inflight  = inflight
+        self.directory = directory
+        self.files     = {}
+        self.ready     = False
+
+    def enabled(self):
+        return (bool(self.rate or self.inflight))
+
+    #
+    # Create the state directory, raises LimitError if the
+    # default one is not private to this user
+    #
+    def prepare(self):
+        if self.ready:
+            return
+
+        shared = not self.directory
+        if shared:
+            import tempfile
+            self.directory = os.path.join(tempfile.gettempdir(), DEFAULT_DIR)
+        try:
+            os.makedirs(self.directory, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise LimitError("can't create {0}: {1}".format(self.directory, e.strerror))
+
+        if shared:
+            st = os.lstat(self.directory)
+            if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or
+                st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+                raise LimitError("{0} is not a private directory of this user, give one with -L".format(self.directory))
+        self.ready = True
+
+    def _open(self,name):
+        self.prepare()
+
+        return (os.open(os.path.join(self.directory, name), os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600))
+
+    #
+    # Take count tokens from the router's bucket, returns the
+    # seconds to wait before sending
+    #
+    def reserve(self,host,count=1):
+        if not self.rate:
+            return (0.0)
+
+        name = host + '.bucket'
+        if name not in self.files:
+            self.files[name] = self._open(name)
+
+        fd = self.files[name]
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            now = time.time()
+            os.lseek(fd, 0, os.SEEK_SET)
+            data = os.read(fd, BUCKET.size)
+            if len(data) == BUCKET.size:
+                tokens,stamp = BUCKET.unpack(data)
+                tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+            else:
+                tokens = self.burst
+
+            tokens -= count
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, BUCKET.pack(tokens, now))
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+        return (max(0.0, -tokens / self.rate))
+
+    #
+    # Try to lock a free in-flight slot, returns it or None
+    #
+    # Each slot is opened again for every request, flock
+    # doesn't stop a second lock through the same descriptor.
+    #
+    def try_slot(self,host):
+        if not self.inflight:
+            return (-1)
+
+        for n in range(self.inflight):
+            fd = self._open('{0}.slot{1}'.format(host, n))
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return (fd)
+            except (IOError, OSError) as e:
+                os.close(fd)
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+
+        return (None)
+
+    # Closing the slot drops its lock
+    def release(self,slot):
+        if slot >= 0:
+            os.close(slot)
+
+    #
+    # Wait for a token and a slot, hold the slot while the
+    # request runs
+    #
+    @contextmanager
+    def request(self,host):
+        if not self.enabled():
+            yield
+            return
+
+        with snmp_stats.phase('throttle'):
+            time.sleep(self.reserve(host))
+            slot = self.try_slot(host)
+            while slot is None:
+                time.sleep(SLOT_POLL)
+                slot = self.try_slot(host)
+        try:
+            yield
+        finally:
+            self.release(slot)
+
+    def close(self):
+        for fd in self.files.values():
+            os.close(fd)
+        self.files = {}
+
+#
+# Command line options, the same in every script
+#
+def add_options(parser):
+    parser.add_option("-l",
+                      type="float",
+                      dest="rate",
+                      help="PDUs per second towards one router, shared by every check using the same -L (default no limit)")
+
+    parser.add_option("-n",
+                      type="int",
+                      dest="inflight",
+                      help="requests in flight towards one router across all checks (default no limit)")
+
+    parser.add_option("-L",
+                      type="string",
+                      dest="limit_dir",
+                      help="directory for the shared rate limit state (default {0} in the temp directory)".format(DEFAULT_DIR))
+
+#
+# Limiter from the options, its directory checked up front so a
+# bad one ends the check as UNKNOWN
+#
+def from_options(options):
+    limiter = Limiter(options.rate,options.inflight,options.limit_dir)
+    if limiter.enabled():
+        try:
+            limiter.prepare()
+        except LimitError as e:
+            print ("Bad rate limit directory: {0}".format(e))
+            sys.exit(3) # Unknown
+
+    return (limiter)
+
+# Limiter used by the SNMP sessions in this process
+limiter = Limiter()
+
+def use(new):
+    global limiter
+    limiter = new
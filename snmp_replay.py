@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+
+# Record SNMP sessions to a file and replay them later.
+#
+# With --record, every get, getbulk and walk the checks send
+# through netsnmp is written to a capture file: host, request
+# OIDs, non-repeaters and max-repetitions, the time it took,
+# netsnmp's error number and every varbind that came back.
+# Communities and passwords are not kept. The file is gzipped
+# JSON, one line per exchange, flushed after each one so a
+# check that is killed halfway still leaves a usable capture.
+#
+# With --replay the capture stands in for netsnmp, the same
+# way snmp_sim does: each request is answered with the
+# response recorded for the same host, operation and OIDs,
+# in recorded order when the same request was sent more than
+# once. Requests that were never recorded time out. Responses
+# take as long as they did on the wire, or no time at all
+# with --fast, so a capture of a route server can be used to
+# profile and benchmark the checks without the router:
+#
+#   ./check_bgp_neighbors.py -H rs1 -c public -b --record rs1.snmp.gz
+#   ./check_bgp_neighbors.py -H rs1 -c public -b --replay rs1.snmp.gz --fast -P
+#
+# Run as a script it summarizes a capture:
+#
+#   ./snmp_replay.py rs1.snmp.gz
+
+from __future__ import print_function
+
+import collections
+import gzip
+import json
+import sys
+import time
+
+import snmp_sim
+import snmp_table
+
+FORMAT  = 'iosxr-snmp-capture'
+VERSION = 1
+
+# netsnmp ErrorNum when the agent never answered
+SNMPERR_TIMEOUT = -24
+
+class CaptureError(Exception):
+    pass
+
+def text(value):
+    if isinstance(value, bytes) and not isinstance(value, str):
+        return (value.decode('latin-1'))
+
+    return (value)
+
+#
+# Capture file being written
+#
+class Recorder(object):
+
+    def __init__(self,path):
+        self.path = path
+        self.file = None
+
+    def install(self):
+        import atexit
+        import netsnmp
+
+        self.file = gzip.open(self.path, 'wb')
+        self.write({'format': FORMAT, 'version': VERSION, 'started': time.time()})
+        atexit.register(self.close)
+
+        sys.modules['netsnmp'] = RecordingNetsnmp(netsnmp,self)
+
+    def write(self,entry):
+        self.file.write((json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8'))
+        self.file.flush()
+
+    def add(self,host,op,oids,a,b,elapsed,error,varbinds):
+        self.write([host, op, oids, a, b, round(elapsed, 6), error,
+                    [[oid, type, text(value)] for oid,type,value in varbinds]])
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+#
+# netsnmp session that writes every exchange to the recorder
+#
+class RecordingSession(object):
+
+    def __init__(self,session,host,recorder):
+        self.session  = session
+        self.host     = host
+        self.recorder = recorder
+
+    def __getattr__(self,name):
+        return (getattr(self.session, name))
+
+    def _record(self,op,oids,a,b,start,var):
+        self.recorder.add(self.host,op,oids,a,b,time.time() - start,
+                          getattr(self.session, 'ErrorNum', 0),
+                          [(snmp_table.varbind_oid(v), v.type, v.val) for v in var])
+
+    def get(self,var):
+        oids  = [snmp_table.varbind_oid(v) for v in var]
+        start = time.time()
+        res   = self.session.get(var)
+        self._record('get',oids,0,0,start,var)
+
+        return (res)
+
+    def getbulk(self,nonrep,maxrep,var):
+        oids  = [snmp_table.varbind_oid(v) for v in var]
+        start = time.time()
+        res   = self.session.getbulk(nonrep,maxrep,var)
+        self._record('getbulk',oids,nonrep,maxrep,start,var)
+
+        return (res)
+
+    def walk(self,var):
+        oids  = [snmp_table.varbind_oid(v) for v in var]
+        start = time.time()
+        res   = self.session.walk(var)
+        self._record('walk',oids,0,0,start,var)
+
+        return (res)
+
+class RecordingNetsnmp(object):
+
+    def __init__(self,netsnmp,recorder):
+        self.Varbind = netsnmp.Varbind
+        self.VarList = netsnmp.VarList
+
+        def Session(**kwargs):
+            return (RecordingSession(netsnmp.Session(**kwargs),kwargs.get('DestHost'),recorder))
+
+        self.Session = Session
+
+#
+# Read a capture, yields the header and then one exchange per line
+#
+def read_capture(path):
+    with gzip.open(path, 'rb') as f:
+        try:
+            header = json.loads(f.readline().decode('utf-8'))
+        except (EOFError, IOError, OSError, ValueError):
+            raise CaptureError("not an SNMP capture")
+        if not isinstance(header, dict) or header.get('format') != FORMAT:
+            raise CaptureError("not an SNMP capture")
+        if header.get('version') != VERSION:
+            raise CaptureError("capture version {0} not supported".format(header.get('version')))
+        yield (header)
+
+        while True:
+            # A capture cut short by a killed check ends without the gzip trailer
+            try:
+                line = f.readline()
+            except (EOFError, IOError, OSError, ValueError):
+                break
+            if not line:
+                break
+
+            yield (json.loads(line.decode('utf-8')))
+
+#
+# Capture served in place of netsnmp
+#
+class Replay(object):
+
+    def __init__(self,path,fast=False):
+        self.path      = path
+        self.fast      = fast
+        self.responses = collections.defaultdict(collections.deque)
+        self.hosts     = set()
+        self.served    = 0
+        self.missed    = 0
+
+        entries = read_capture(path)
+        next(entries)
+        for host,op,oids,a,b,elapsed,error,varbinds in entries:
+            self.hosts.add(host)
+            self.responses[(host, op, tuple(oids), a, b)].append((elapsed, error, varbinds))
+
+    def install(self):
+        sys.modules['netsnmp'] = ReplayNetsnmp(self)
+
+    #
+    # Recorded (elapsed, error, varbinds) for a request, a timeout
+    # if it wasn't recorded
+    #
+    def answer(self,host,op,oids,a=0,b=0):
+        queue = self.responses.get((host, op, tuple(oids), a, b))
+        if not queue:
+            self.missed += 1
+            return ((0.0, SNMPERR_TIMEOUT, None))
+
+        # The last answer keeps being served once the recorded ones run out
+        if len(queue) > 1:
+            elapsed,error,varbinds = queue.popleft()
+        else:
+            elapsed,error,varbinds = queue[0]
+        self.served += 1
+
+        if not self.fast:
+            time.sleep(elapsed)
+
+        return ((elapsed, error, varbinds))
+
+class ReplayNetsnmp(object):
+
+    def __init__(self,replay):
+        self.Varbind = snmp_sim.Varbind
+        self.VarList = snmp_sim.VarList
+
+        class Session(object):
+
+            def __init__(self,**kwargs):
+                self.host     = kwargs.get('DestHost')
+                self.ErrorNum = 0
+
+            def answer(self,op,var,a=0,b=0):
+                oids = [snmp_table.varbind_oid(v) for v in var]
+                elapsed,self.ErrorNum,varbinds = replay.answer(self.host,op,oids,a,b)
+
+                return (varbinds)
+
+            def fill(self,var,varbinds):
+                del var[:]
+                for oid,type,value in varbinds or ():
+                    var.append(snmp_sim.Varbind(oid, '', value, type))
+
+                return (tuple(v.val for v in var))
+
+            def get(self,var):
+                varbinds = self.answer('get',var)
+                if varbinds is None:
+                    return ((None,) * len(var))
+                for v,(oid,type,value) in zip(var,varbinds):
+                    v.val  = value
+                    v.type = type
+
+                return (tuple(v.val for v in var))
+
+            def getbulk(self,nonrep,maxrep,var):
+                varbinds = self.answer('getbulk',var,nonrep,maxrep)
+                if varbinds is None:
+                    return (())
+
+                return (self.fill(var,varbinds))
+
+            def walk(self,var):
+                return (self.fill(var,self.answer('walk',var)))
+
+        self.Session = Session
+
+#
+# Command line options, the same in every check
+#
+def add_options(parser):
+    parser.add_option("-Y", "--record",
+                      type="string",
+                      dest="record",
+                      help="write every SNMP request and response to this capture file")
+
+    parser.add_option("-Z", "--replay",
+                      type="string",
+                      dest="replay",
+                      help="answer SNMP requests from this capture file instead of the router")
+
+    parser.add_option("-F", "--fast",
+                      action="store_true",
+                      dest="fast",
+                      help="replay as fast as possible instead of at the recorded speed")
+
+#
+# Recorder, replay or None from the options
+#
+def from_options(options):
+    if options.replay:
+        replay = Replay(options.replay,options.fast)
+        if options.host not in replay.hosts:
+            raise CaptureError("no requests to {0} recorded".format(options.host))
+        return (replay)
+    if options.record:
+        return (Recorder(options.record))
+
+    return (None)
+
+def use(backend):
+    if backend is not None:
+        backend.install()
+
+def main():
+    if len(sys.argv) != 2:
+        print ("usage: {0} capture".format(sys.argv[0]), file=sys.stderr)
+        sys.exit(3)
+
+    exchanges = collections.Counter()
+    hosts     = set()
+    varbinds  = 0
+    elapsed   = 0.0
+    errors    = 0
+
+    try:
+        entries = read_capture(sys.argv[1])
+        header  = next(entries)
+        for host,op,oids,a,b,took,error,response in entries:
+            hosts.add(host)
+            exchanges[op] += 1
+            varbinds      += len(response)
+            elapsed       += took
+            errors        += error != 0
+    except (CaptureError, IOError, OSError, ValueError) as e:
+        print ("Can't read capture: {0}".format(e), file=sys.stderr)
+        sys.exit(1)
+
+    print ("recorded  {0}".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(header['started']))))
+    print ("hosts     {0}".format(" ".join(sorted(str(host) for host in hosts))))
+    print ("requests  {0} ({1})".format(sum(exchanges.values()),
+                                       ", ".join("{0} {1}".format(count, op) for op,count in sorted(exchanges.items()))))
+    print ("varbinds  {0}".format(varbinds))
+    print ("errors    {0}".format(errors))
+    print ("time      {0:.3f}s on the wire".format(elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+# Timeout and retry policy shared by every SNMP backend.
+#
+# A fixed timeout is either too short for a busy IOS-XR snmpd
+# or wastes seconds on every lost packet towards a quick one.
+# Instead a smoothed round-trip time is kept per device, the
+# same way TCP does it (RFC 6298), and each request waits for
+#
+#   srtt + 4 * rttvar
+#
+# doubled on every retry. Between retries the caller backs
+# off exponentially with jitter, so checks that time out
+# together don't hammer the agent again in lockstep. Only the
+# request that failed is sent again, a table walk carries on
+# where it was.
+#
+# retry() is for the other kind of failure, an agent that
+# answers but hands back an empty table for a moment, which
+# the checks used to cover with a fixed 5 second sleep. It
+# gives up at once on a device whose last request already
+# ran out of retries.
+
+import math
+import sys
+import time
+
+import snmp_stats
+
+DEFAULT_TIMEOUT = 1.0 # seconds, before the first response
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.1 # seconds, doubled per retry
+
+MIN_TIMEOUT = 0.2
+MAX_TIMEOUT = 5.0
+MAX_BACKOFF = 8.0
+
+# snmpd lag after a community switch lasts seconds, not milliseconds
+EMPTY_BACKOFF = 1.0
+
+#
+# Smoothed round-trip time of one device
+#
+class RttEstimator(object):
+
+    def __init__(self,timeout=DEFAULT_TIMEOUT):
+        self.srtt    = None
+        self.rttvar  = None
+        self.initial = timeout
+
+    def update(self,rtt):
+        if self.srtt is None:
+            self.srtt   = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt   = 0.875 * self.srtt + 0.125 * rtt
+
+    def timeout(self):
+        if self.srtt is None:
+            return (self.initial)
+
+        return (min(MAX_TIMEOUT, max(MIN_TIMEOUT, self.srtt + 4 * self.rttvar)))
+
+class Policy(object):
+
+    def __init__(self,timeout=DEFAULT_TIMEOUT,retries=DEFAULT_RETRIES,backoff=DEFAULT_BACKOFF,seed=None):
+        self.initial    = timeout
+        self.retries    = retries
+        self.base       = backoff
+        self.seed       = seed
+        self.random     = None
+        self.estimators = {}
+        self.down       = set()
+
+    def estimator(self,host):
+        if host not in self.estimators:
+            self.estimators[host] = RttEstimator(self.initial)
+
+        return (self.estimators[host])
+
+    #
+    # Seconds to wait for a response on the given attempt
+    #
+    def timeout(self,host,attempt=0):
+        return (min(MAX_TIMEOUT, self.estimator(host).timeout() * 2 ** attempt))
+
+    #
+    # Round a timeout down to the initial timeout times a power
+    # of two
+    #
+    # netsnmp fixes the timeout when a session is opened, so
+    # the pool keeps one session per step instead of one per
+    # distinct timeout. Rounding down keeps -t as it was given
+    # and never waits longer than the timeout asked for, nor
+    # less than MIN_TIMEOUT unless asked for less.
+    #
+    def step(self,timeout):
+        steps = int(math.floor(math.log(timeout / self.initial, 2) + 1e-9))
+
+        return (max(self.initial * 2 ** steps, min(timeout, MIN_TIMEOUT)))
+
+    def sample(self,host,rtt):
+        self.down.discard(host)
+        self.estimator(host).update(rtt)
+
+    # A request towards host ran out of retries
+    def give_up(self,host):
+        self.down.add(host)
+
+    #
+    # Seconds to back off before retry number attempt (0 based)
+    #
+    # Half of the exponential delay is fixed and half is random,
+    # so there is always some pause but no two checks line up.
+    #
+    def backoff(self,attempt,base=None):
+        delay = min(MAX_BACKOFF, (base or self.base) * 2 ** attempt)
+
+        # Only checks that retry pay for importing random
+        if self.random is None:
+            import random
+            self.random = random.Random(self.seed)
+
+        return (delay / 2 + self.random.uniform(0, delay / 2))
+
+    #
+    # Call fetch until ok(result) holds or the retries run out,
+    # backing off in between, returns the last result. result is
+    # what an earlier fetch got, if there was one.
+    #
+    def retry(self,host,fetch,ok,result=None):
+        if result is None:
+            result = fetch()
+        for attempt in range(self.retries):
+            if ok(result) or host in self.down:
+                break
+            with snmp_stats.phase('wait'):
+                time.sleep(self.backoff(attempt,EMPTY_BACKOFF))
+            snmp_stats.retry()
+            result = fetch()
+
+        return (result)
+
+#
+# Command line options, the same in every script
+#
+def add_options(parser):
+    parser.add_option("-t",
+                      type="float",
+                      dest="timeout",
+                      default=DEFAULT_TIMEOUT,
+                      help="seconds to wait for the first response, later adapted to the measured round-trip time (default %default)")
+
+    parser.add_option("-r",
+                      type="int",
+                      dest="retries",
+                      default=DEFAULT_RETRIES,
+                      help="retries per request (default %default)")
+
+    parser.add_option("-w",
+                      type="float",
+                      dest="backoff",
+                      default=DEFAULT_BACKOFF,
+                      help="seconds to back off before the first retry, doubled for each one after (default %default)")
+
+def from_options(options):
+    if options.timeout <= 0:
+        print ("Bad timeout {0}: must be more than 0 seconds".format(options.timeout))
+        sys.exit(3) # Unknown
+
+    return (Policy(options.timeout,options.retries,options.backoff))
+
+# Policy used by the SNMP sessions in this process
+policy = Policy()
+
+def use(new):
+    global policy
+    policy = new
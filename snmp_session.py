@@ -0,0 +1,420 @@
+#!/usr/bin/env python
+
+# Shared SNMP session layer for the Nagios checks.
+#
+# netsnmp.Session() resolves the host, allocates a socket
+# and sets up the session every time it is created, and the
+# module-level netsnmp.snmpget/snmpwalk do the same thing
+# behind the scenes on every call. Sessions are kept here
+# keyed by (host, community, version, timeout, retries) and
+# handed out again on the next get or walk.
+#
+# All sessions use numeric OIDs, use snmp_table.varbind_oid
+# to get the full OID of a returned varbind.
+#
+# netsnmp is only imported once a session is actually
+# opened, so code that talks UDP itself (see snmp_async)
+# can share the check logic without the bindings installed.
+#
+# Sessions are handed out wrapped, so every request gets
+# recorded in snmp_stats. Timeouts and retries follow
+# snmp_retry.policy: netsnmp's own retries are turned off and
+# a failed request is sent again from here, on a session
+# whose timeout fits the device's measured round-trip time.
+# Every attempt also waits its turn in snmp_limit, which caps
+# the load all checks together put on a router.
+#
+# Bytes on the wire are worked out from the varbinds, netsnmp
+# doesn't tell. Responses are sized from their first row unless
+# profiling, when every varbind is.
+#
+# SNMPv3 sessions are opened for snmp_usm.Credentials passed in
+# place of the community. Their engine ID, boots and time are
+# taken from the credentials' cache when there is one, and read
+# from the agent after the first request when not.
+
+import time
+
+import snmp_ber
+import snmp_limit
+import snmp_retry
+import snmp_stats
+import snmp_table
+import snmp_usm
+
+DEFAULT_VERSION = 2
+DEFAULT_TIMEOUT = 1000000 # microseconds, same as net-snmp
+DEFAULT_RETRIES = 3
+
+# Varbinds per GET PDU in get_many
+GET_BATCH = 24
+
+# netsnmp ErrorNum when the agent never answered
+SNMPERR_TIMEOUT = -24
+
+#
+# netsnmp session that records what each request cost
+#
+class InstrumentedSession(object):
+
+    def __init__(self,session,host,community,retries,stats=None):
+        self.session   = session
+        self.host      = host
+        self.community = community
+        self.retries   = retries
+        self.stats     = stats or snmp_stats.stats
+
+    def __getattr__(self,name):
+        return (getattr(self.session, name))
+
+    # SNMPv3 credentials work out their own message size
+    def _size(self,varbinds,a=0,b=0):
+        if isinstance(self.community, snmp_usm.Credentials):
+            return (self.community.message_size(self.host,varbinds,a,b))
+
+        return (snmp_ber.message_size(self.community,varbinds,a,b))
+
+    #
+    # Size of a response that repeats the requested columns,
+    # worked out from its first row and scaled to all of them.
+    # Sizing every varbind costs a good share of a check's CPU,
+    # so that is only done when profiling.
+    #
+    def _response_size(self,varbinds,width,a=0,b=0):
+        if self.stats.profile or len(varbinds) <= width:
+            return (self._size(varbinds,a,b))
+
+        empty = self._size([],a,b)
+        row   = self._size(varbinds[:width],a,b) - empty
+
+        return (empty + row * len(varbinds) // width)
+
+    def _timeouts(self):
+        if getattr(self.session, 'ErrorNum', 0) == SNMPERR_TIMEOUT:
+            return (1)
+
+        return (0)
+
+    def _record(self,request,response,elapsed,a=0,b=0):
+        oids     = [oid for oid,type,value in request]
+        timeouts = self._timeouts()
+
+        # netsnmp retries by itself, a timeout means it tried them all
+        self.stats.request(oids,elapsed,
+                           self._size(request,a,b) * (1 + timeouts * self.retries),
+                           response and self._response_size(response,len(request)) or 0,
+                           len(response),
+                           pdus=1 + timeouts * self.retries,
+                           timeouts=timeouts,
+                           retries=timeouts * self.retries)
+
+    def get(self,var):
+        request = [(snmp_table.varbind_oid(v), None, None) for v in var]
+        start   = time.time()
+        res     = self.session.get(var)
+        elapsed = time.time() - start
+
+        response = []
+        if res and any(value is not None for value in res):
+            response = [(oid, v.type, v.val) for (oid,t,x),v in zip(request,var)]
+        self._record(request,response,elapsed)
+
+        return (res)
+
+    def getbulk(self,nonrep,maxrep,var):
+        request = [(snmp_table.varbind_oid(v), None, None) for v in var]
+        start   = time.time()
+        res     = self.session.getbulk(nonrep,maxrep,var)
+        elapsed = time.time() - start
+
+        response = []
+        if res:
+            response = [(snmp_table.varbind_oid(v), v.type, v.val) for v in var]
+        self._record(request,response,elapsed,nonrep,maxrep)
+
+        return (res)
+
+    #
+    # netsnmp walks with one GETNEXT per row and a last one that
+    # runs off the end, sizes are worked out per row
+    #
+    def walk(self,var):
+        base    = snmp_table.varbind_oid(var[0])
+        start   = time.time()
+        res     = self.session.walk(var)
+        elapsed = time.time() - start
+
+        # Rows of a column are all about the same size, without
+        # profiling only the first is sized
+        rows     = list(var) if self.stats.profile else list(var)[:1]
+        oid      = base
+        sent     = 0
+        received = 0
+        for v in rows:
+            sent     += self._size([(oid, None, None)])
+            oid       = snmp_table.varbind_oid(v)
+            received += self._size([(oid, v.type, v.val)])
+        if len(rows) < len(var):
+            sent     *= len(var)
+            received *= len(var)
+            oid       = snmp_table.varbind_oid(var[len(var) - 1])
+
+        # The last request either ran off the end or never got an answer
+        timeouts = self._timeouts()
+        sent    += self._size([(oid, None, None)]) * (1 + timeouts * self.retries)
+        if not timeouts:
+            received += self._size([(oid, 'ENDOFMIBVIEW', None)])
+
+        self.stats.request([base],elapsed,sent,received,len(var),
+                           pdus=len(var) + 1 + timeouts * self.retries,
+                           timeouts=timeouts,
+                           retries=timeouts * self.retries)
+
+        return (res)
+
+#
+# All requests towards one device, retried by the policy
+#
+# Holds no socket itself, each attempt borrows the pooled
+# netsnmp session for the timeout it needs. getbulk and walk
+# replace the varbinds of the VarList with what came back, so
+# they are put back before every attempt. netsnmp.VarList is no
+# list and only takes single Varbinds, the list is .varbinds.
+#
+class DeviceSession(object):
+
+    def __init__(self,pool,host,community,version=DEFAULT_VERSION,policy=None):
+        self.pool      = pool
+        self.host      = host
+        self.community = community
+        self.version   = version
+        self.policy    = policy
+
+    def _request(self,var,call):
+        policy   = self.policy or snmp_retry.policy
+        original = list(var.varbinds)
+
+        for attempt in range(policy.retries + 1):
+            if attempt:
+                with snmp_stats.phase('wait'):
+                    time.sleep(policy.backoff(attempt - 1))
+                snmp_stats.retry()
+                var.varbinds[:] = original
+
+            timeout = policy.step(policy.timeout(self.host,attempt))
+            session,res,elapsed = self._send(var,call,int(timeout * 1000000),0)
+            if getattr(session, 'ErrorNum', 0) != SNMPERR_TIMEOUT:
+                policy.sample(self.host,elapsed)
+                self._learn_engine(session)
+                return (res)
+
+        policy.give_up(self.host)
+
+        return (res)
+
+    #
+    # One attempt on the pooled session with this timeout, sent
+    # again after a fresh discovery if the agent rejects the
+    # cached SNMPv3 engine
+    #
+    def _send(self,var,call,timeout,retries):
+        original = list(var.varbinds)
+        for fresh in (False, True):
+            var.varbinds[:] = original
+            session = self.pool.session(self.host,self.community,self.version,timeout,retries)
+            with snmp_limit.limiter.request(self.host):
+                start = time.time()
+                res   = call(session)
+            if fresh or not self._forget_engine(session):
+                break
+
+        return (session, res, time.time() - start)
+
+    def _forget_engine(self,session):
+        if self.version != 3 or not self.community.forget(self.host,getattr(session, 'ErrorNum', 0)):
+            return (False)
+
+        # Open sessions still have the old engine
+        self.pool.close(self.host)
+
+        return (True)
+
+    #
+    # Keep the agent's engine for the next run, once it answered
+    #
+    def _learn_engine(self,session):
+        if self.version != 3 or not self.community.stale(self.host):
+            return
+
+        import netsnmp
+
+        var = netsnmp.VarList(*[netsnmp.Varbind(oid) for oid in snmp_usm.ENGINE_OIDS])
+        with snmp_limit.limiter.request(self.host):
+            res = session.get(var)
+        if res and None not in res:
+            self.community.learn(self.host,*res)
+
+    def get(self,var):
+        return (self._request(var,lambda session: session.get(var)))
+
+    def getbulk(self,nonrep,maxrep,var):
+        return (self._request(var,lambda session: session.getbulk(nonrep,maxrep,var)))
+
+    #
+    # netsnmp walks with a PDU per row and can't carry on from
+    # where a failed walk stopped, so walks keep netsnmp's own
+    # retries, per PDU, on a session with the current timeout.
+    # Only the first PDU waits for the rate limit, the rest of
+    # the walk is charged to the bucket afterwards.
+    #
+    def walk(self,var):
+        policy  = self.policy or snmp_retry.policy
+        timeout = policy.step(policy.timeout(self.host))
+        session,res,elapsed = self._send(var,lambda session: session.walk(var),
+                                         int(timeout * 1000000),policy.retries)
+        snmp_limit.limiter.reserve(self.host,len(var))
+
+        if getattr(session, 'ErrorNum', 0) == SNMPERR_TIMEOUT:
+            policy.give_up(self.host)
+        else:
+            policy.down.discard(self.host)
+            self._learn_engine(session)
+
+        return (res)
+
+class SessionPool(object):
+
+    def __init__(self):
+        self.devices  = {}
+        self.sessions = {}
+        self.hits     = 0
+        self.opened   = 0
+        self.closed   = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close_all()
+
+    #
+    # Return the retrying session for a device
+    #
+    def device(self,host,community,version=DEFAULT_VERSION):
+        key = (host, community, version)
+        if key not in self.devices:
+            self.devices[key] = DeviceSession(self,host,community,version)
+
+        return (self.devices[key])
+
+    #
+    # Return an open netsnmp session, creating it the first time
+    #
+    def session(self,host,community,version=DEFAULT_VERSION,
+                timeout=DEFAULT_TIMEOUT,retries=DEFAULT_RETRIES):
+        key     = (host, community, version, timeout, retries)
+        session = self.sessions.get(key)
+
+        if session is not None:
+            self.hits += 1
+            return (session)
+
+        import netsnmp
+
+        if version == 3:
+            session = netsnmp.Session(Version    = version,
+                                      DestHost   = host,
+                                      Timeout    = timeout,
+                                      Retries    = retries,
+                                      UseNumeric = 1,
+                                      **community.session_args(host))
+        else:
+            session = netsnmp.Session(Version    = version,
+                                      DestHost   = host,
+                                      Community  = community,
+                                      Timeout    = timeout,
+                                      Retries    = retries,
+                                      UseNumeric = 1)
+        session = InstrumentedSession(session,host,community,retries)
+        self.sessions[key] = session
+        self.opened       += 1
+
+        return (session)
+
+    #
+    # Close every session towards a host
+    #
+    def close(self,host):
+        for key in [key for key in self.sessions if key[0] == host]:
+            # netsnmp closes the socket when the session is freed
+            del self.sessions[key]
+            self.closed += 1
+
+        for key in [key for key in self.devices if key[0] == host]:
+            del self.devices[key]
+
+    def close_all(self):
+        self.closed  += len(self.sessions)
+        self.sessions = {}
+        self.devices  = {}
+
+    def stats(self):
+        return ({'open':   len(self.sessions),
+                 'opened': self.opened,
+                 'closed': self.closed,
+                 'hits':   self.hits})
+
+# Pool shared by everything in this process
+pool = SessionPool()
+
+#
+# Convenience wrappers around the shared pool
+#
+def session(host,community,version=None):
+    # SNMPv3 credentials bring their own version
+    if version is None:
+        version = getattr(community, 'version', DEFAULT_VERSION)
+
+    return (pool.device(host,community,version))
+
+def get(host,community,oid):
+    import netsnmp
+
+    var = netsnmp.VarList(netsnmp.Varbind(oid))
+    res = session(host,community).get(var)
+
+    return (res)
+
+#
+# Get many OIDs with as few PDUs as possible, values come
+# back in the same order as the OIDs
+#
+def get_many(host,community,oids,batch=GET_BATCH):
+    import netsnmp
+
+    values = []
+    for n in range(0, len(oids), batch):
+        var = netsnmp.VarList(*[netsnmp.Varbind(oid) for oid in oids[n:n + batch]])
+        res = session(host,community).get(var)
+        if not res:
+            res = (None,) * len(var)
+        values.extend(res)
+
+    return (values)
+
+def walk(host,community,oid):
+    import netsnmp
+
+    var = netsnmp.VarList(netsnmp.Varbind(oid))
+    session(host,community).walk(var)
+
+    return (var)
+
+def close(host):
+    pool.close(host)
+
+def close_all():
+    pool.close_all()
+
+def stats():
+    return (pool.stats())
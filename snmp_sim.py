@@ -0,0 +1,461 @@
+#!/usr/bin/env python
+
+# Offline stand-in for an IOS-XR SNMP agent.
+#
+# Serves synthetic CISCO-BGP4-MIB, CISCO-ENTITY-SENSOR-MIB and
+# ENTITY-MIB tables of any size, with optional per-PDU latency
+# and packet loss, so the checks can be measured without a
+# router. Two ways to talk to it:
+#
+#   FakeNetsnmp  in-process replacement for the netsnmp module,
+#                install() puts it in sys.modules before the
+#                checks open their first session
+#   UdpAgent     real SNMPv2c responder on a local UDP port,
+#                for snmp_async and the poller
+#
+# FakeNetsnmp also takes SNMPv3 sessions, without any security.
+# A session that doesn't bring the agent's engine ID spends one
+# PDU on discovery first, one with another engine ID fails with
+# netsnmp's unknown engine error.
+#
+# Both count PDUs and varbinds, so benchmarks can report what
+# a check costs on the wire.
+
+import binascii
+import bisect
+import random
+import socket
+import sys
+import threading
+import time
+
+import snmp_ber
+
+BGP_PEER   = '.1.3.6.1.4.1.9.9.187.1.2.5.1'
+BGP_PREFIX = '.1.3.6.1.4.1.9.9.187.1.2.8.1'
+SENSOR     = '.1.3.6.1.4.1.9.9.91.1.1.1.1'
+THRESH     = '.1.3.6.1.4.1.9.9.91.1.2.1.1'
+PHYSICAL   = '.1.3.6.1.2.1.47.1.1.1.1'
+ENT_LAST_CHANGE = '.1.3.6.1.2.1.47.1.4.1.0'
+ENGINE     = '.1.3.6.1.6.3.10.2.1'
+
+def oid_key(oid):
+    return (tuple(int(arc) for arc in oid.strip('.').split('.')))
+
+class Agent(object):
+
+    def __init__(self,latency=0.0,loss=0.0,seed=None):
+        self.latency  = latency
+        self.loss     = loss
+        self.random   = random.Random(seed)
+        self.keys     = []
+        self.data     = {}
+        self.pdus     = 0
+        self.varbinds = 0
+        self.lost     = 0
+        self.engine   = None
+
+    def set(self,oid,type,value):
+        key = oid_key(oid)
+        if key not in self.data:
+            bisect.insort(self.keys, key)
+        self.data[key] = ('.' + '.'.join(str(arc) for arc in key), type, str(value))
+
+    def reset_counters(self):
+        self.pdus     = 0
+        self.varbinds = 0
+        self.lost     = 0
+
+    #
+    # Account for one PDU, False if it got lost on the way
+    #
+    def deliver(self):
+        self.pdus += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.loss and self.random.random() < self.loss:
+            self.lost += 1
+            return (False)
+
+        return (True)
+
+    def get(self,oid):
+        entry = self.data.get(oid_key(oid))
+        if entry is None:
+            return ((oid, 'NOSUCHINSTANCE', None))
+
+        return (entry)
+
+    def next(self,oid):
+        n = bisect.bisect_right(self.keys, oid_key(oid))
+        if n == len(self.keys):
+            return ((oid, 'ENDOFMIBVIEW', None))
+
+        return (self.data[self.keys[n]])
+
+    def bulk(self,oids,nonrep,maxrep):
+        result = [self.next(oid) for oid in oids[:nonrep]]
+        cursor = list(oids[nonrep:])
+        for repetition in range(maxrep):
+            if not cursor:
+                break
+            row    = [self.next(oid) for oid in cursor]
+            result.extend(row)
+            cursor = [oid for oid,type,value in row]
+            if all(type == 'ENDOFMIBVIEW' for oid,type,value in row):
+                break
+
+        return (result)
+
+    #
+    # Answer one request PDU, returns the response varbinds
+    #
+    def handle(self,pdu_type,oids,a=0,b=0):
+        if pdu_type == snmp_ber.GET_REQUEST:
+            result = [self.get(oid) for oid in oids]
+        elif pdu_type == snmp_ber.GETNEXT_REQUEST:
+            result = [self.next(oid) for oid in oids]
+        else:
+            result = self.bulk(oids,a,b)
+
+        self.varbinds += len(result)
+
+        return (result)
+
+#
+# Synthetic tables
+#
+def bgp_peer_index(n,count,v6_share=0.25):
+    if n < count * v6_share:
+        octets = [0x20, 0x01, 0x07, 0xf8, 0x00, 0x0d, 0x00, 0xfc] + [0] * 6 + [n >> 8, n & 0xff]
+        return ('2.16.' + '.'.join(str(octet) for octet in octets))
+
+    return ('1.4.10.%d.%d.%d' % ((n >> 16) & 0xff, (n >> 8) & 0xff, n & 0xff))
+
+def add_bgp_peers(agent,count,v6_share=0.25,down_share=0.02):
+    for n in range(count):
+        index = bgp_peer_index(n,count,v6_share)
+        down = agent.random.random() < down_share
+        agent.set(BGP_PEER + '.3.' + index, 'INTEGER', 1 if down else 6)
+        agent.set(BGP_PEER + '.11.' + index, 'GAUGE', 64512 + n % 1000)
+        agent.set(BGP_PEER + '.18.' + index, 'COUNTER', 1)
+        agent.set(BGP_PEER + '.28.' + index, 'OCTETSTR', 'hold time expired' if down else '')
+
+# cbgpPeer2AddrFamilyPrefixTable rows for the peers of add_bgp_peers,
+# unicast in the peer's own family, accepted scaled by factor
+def add_bgp_prefixes(agent,count,v6_share=0.25,factor=1.0):
+    for n in range(count):
+        index  = bgp_peer_index(n,count,v6_share)
+        family = '2.1' if n < count * v6_share else '1.1'
+        row    = index + '.' + family
+
+        agent.set(BGP_PREFIX + '.1.' + row, 'COUNTER', int((1000 + n * 10) * factor))
+        agent.set(BGP_PREFIX + '.2.' + row, 'COUNTER', n % 7)
+        agent.set(BGP_PREFIX + '.6.' + row, 'GAUGE', 50)
+
+def add_sensors(agent,count,alarm_share=0.01):
+    for n in range(count):
+        index = str(1000 + n)
+        alarm = agent.random.random() < alarm_share
+        value = 85 if alarm else 30 + n % 20
+
+        agent.set(SENSOR + '.1.' + index, 'INTEGER', 8)   # celsius
+        agent.set(SENSOR + '.2.' + index, 'INTEGER', 9)   # units
+        agent.set(SENSOR + '.4.' + index, 'INTEGER', value)
+        agent.set(SENSOR + '.5.' + index, 'INTEGER', 1)   # ok
+
+        agent.set(PHYSICAL + '.2.' + index, 'OCTETSTR', 'Inlet temperature sensor %d' % n)
+        agent.set(PHYSICAL + '.5.' + index, 'INTEGER', 8) # sensor
+        agent.set(PHYSICAL + '.7.' + index, 'OCTETSTR', '0/%d/CPU0-Inlet' % (n // 20))
+
+        # Slots 1..3 are minor/major/critical high, 4..6 unused
+        for slot,threshold in ((1, 65), (2, 75), (3, 80), (4, -32768), (5, -32768), (6, -32768)):
+            row = '%s.%d' % (index, slot)
+            agent.set(THRESH + '.3.' + row, 'INTEGER', 3)  # greaterThan
+            agent.set(THRESH + '.4.' + row, 'INTEGER', threshold)
+            agent.set(THRESH + '.6.' + row, 'INTEGER', 1)
+
+    agent.set(ENT_LAST_CHANGE, 'TICKS', 12345)
+
+# Chassis, a slot and a card for every 20 sensors of add_sensors, with
+# the sensors contained in the cards
+def add_entity_tree(agent,count):
+    agent.set(PHYSICAL + '.2.1', 'OCTETSTR', 'ASR-9006 chassis')
+    agent.set(PHYSICAL + '.4.1', 'INTEGER', 0)
+    agent.set(PHYSICAL + '.5.1', 'INTEGER', 3) # chassis
+    agent.set(PHYSICAL + '.6.1', 'INTEGER', -1)
+    agent.set(PHYSICAL + '.7.1', 'OCTETSTR', 'Rack 0')
+
+    for slot in range((count + 19) // 20):
+        container = str(100 + slot)
+        card      = str(500 + slot)
+        agent.set(PHYSICAL + '.2.' + container, 'OCTETSTR', 'Slot')
+        agent.set(PHYSICAL + '.4.' + container, 'INTEGER', 1)
+        agent.set(PHYSICAL + '.5.' + container, 'INTEGER', 5) # container
+        agent.set(PHYSICAL + '.6.' + container, 'INTEGER', slot)
+        agent.set(PHYSICAL + '.7.' + container, 'OCTETSTR', '')
+
+        agent.set(PHYSICAL + '.2.' + card, 'OCTETSTR', 'Line card')
+        agent.set(PHYSICAL + '.4.' + card, 'INTEGER', container)
+        agent.set(PHYSICAL + '.5.' + card, 'INTEGER', 9) # module
+        agent.set(PHYSICAL + '.6.' + card, 'INTEGER', 0)
+        agent.set(PHYSICAL + '.7.' + card, 'OCTETSTR', '0/%d/CPU0' % slot)
+
+    for n in range(count):
+        index = str(1000 + n)
+        agent.set(PHYSICAL + '.4.' + index, 'INTEGER', 500 + n // 20)
+        agent.set(PHYSICAL + '.6.' + index, 'INTEGER', n % 20)
+
+# Optics on count ports spread over the cards of add_entity_tree, an Rx
+# and a Tx power sensor in dBm on every port
+def add_optics(agent,count,cards=1):
+    for n in range(count):
+        port = str(200000 + n)
+        name = 'HundredGigE0/%d/0/%d' % (n % cards, n // cards)
+        agent.set(PHYSICAL + '.2.' + port, 'OCTETSTR', '100GBASE-LR4 QSFP28')
+        agent.set(PHYSICAL + '.4.' + port, 'INTEGER', 500 + n % cards)
+        agent.set(PHYSICAL + '.5.' + port, 'INTEGER', 10) # port
+        agent.set(PHYSICAL + '.6.' + port, 'INTEGER', n // cards)
+        agent.set(PHYSICAL + '.7.' + port, 'OCTETSTR', name)
+
+        for lane,(kind,value) in enumerate((('Rx', -3), ('Tx', 1))):
+            index = str(300000 + 2 * n + lane)
+            agent.set(SENSOR + '.1.' + index, 'INTEGER', 14)  # dBm
+            agent.set(SENSOR + '.2.' + index, 'INTEGER', 9)   # units
+            agent.set(SENSOR + '.4.' + index, 'INTEGER', value)
+            agent.set(SENSOR + '.5.' + index, 'INTEGER', 1)   # ok
+
+            agent.set(PHYSICAL + '.2.' + index, 'OCTETSTR', '%s power sensor %s' % (kind, name))
+            agent.set(PHYSICAL + '.4.' + index, 'INTEGER', port)
+            agent.set(PHYSICAL + '.5.' + index, 'INTEGER', 8) # sensor
+            agent.set(PHYSICAL + '.6.' + index, 'INTEGER', lane)
+            agent.set(PHYSICAL + '.7.' + index, 'OCTETSTR', '%s-%s Power' % (name, kind))
+
+            # Low alarm, high alarm, the rest unused
+            for slot,relation,threshold in ((1, 1, -14), (2, 3, 5), (3, 3, -32768), (4, 3, -32768),
+                                            (5, 3, -32768), (6, 3, -32768)):
+                row = '%s.%d' % (index, slot)
+                agent.set(THRESH + '.3.' + row, 'INTEGER', relation)
+                agent.set(THRESH + '.4.' + row, 'INTEGER', threshold)
+                agent.set(THRESH + '.6.' + row, 'INTEGER', 1)
+
+# snmpEngine group, the engine ID in hex
+def add_engine(agent,engine_id='800000090300000c00000001',boots=1,engine_time=86400):
+    octets = binascii.unhexlify(engine_id)
+    if not isinstance(octets, str):
+        octets = octets.decode('latin-1')
+
+    agent.engine = engine_id
+    agent.set(ENGINE + '.1.0', 'OCTETSTR', octets)
+    agent.set(ENGINE + '.2.0', 'INTEGER', boots)
+    agent.set(ENGINE + '.3.0', 'INTEGER', engine_time)
+
+#
+# In-process replacement for the netsnmp module
+#
+class Varbind(object):
+
+    def __init__(self,tag=None,iid=None,val=None,type=None):
+        self.tag  = tag
+        self.iid  = iid
+        self.val  = val
+        self.type = type
+
+#
+# Same interface as netsnmp.VarList, which is no list: the
+# varbinds are in .varbinds and only single Varbinds can be
+# assigned or appended
+#
+class VarList(object):
+
+    def __init__(self,*varbinds):
+        self.varbinds = []
+        for var in varbinds:
+            if isinstance(var, Varbind):
+                self.varbinds.append(var)
+            else:
+                self.varbinds.append(Varbind(var))
+
+    def __len__(self):
+        return (len(self.varbinds))
+
+    def __getitem__(self,index):
+        return (self.varbinds[index])
+
+    def __setitem__(self,index,value):
+        if not isinstance(value, Varbind):
+            raise TypeError
+        self.varbinds[index] = value
+
+    def __delitem__(self,index):
+        del self.varbinds[index]
+
+    def __iter__(self):
+        return (iter(self.varbinds))
+
+    def __repr__(self):
+        return (repr(self.varbinds))
+
+    def append(self,*varbinds):
+        for var in varbinds:
+            if not isinstance(var, Varbind):
+                raise TypeError
+            self.varbinds.append(var)
+
+class FakeNetsnmp(object):
+
+    def __init__(self,agent,timeout=None):
+        self.agent    = agent
+        self.timeout  = timeout
+        self.Varbind  = Varbind
+        self.VarList  = VarList
+        self.sessions = 0
+
+        fake = self
+
+        class Session(object):
+
+            def __init__(self,**kwargs):
+                fake.sessions += 1
+                self.timeout = fake.timeout
+                if self.timeout is None:
+                    self.timeout = kwargs.get('Timeout', 1000000) / 1e6
+                self.retries = kwargs.get('Retries', 3)
+                self.ErrorNum = 0
+
+                # SNMPv3 engine discovery, done with the first request
+                self.engine = None
+                if kwargs.get('Version') == 3:
+                    self.engine = kwargs.get('SecEngineId') or ''
+
+            def request(self,pdu_type,var,a=0,b=0):
+                oids = [v.tag if not v.iid else v.tag + '.' + v.iid for v in var]
+                self.ErrorNum = 0
+                if self.engine == '':
+                    if not fake.agent.deliver():
+                        self.ErrorNum = -24
+                        return (None)
+                    self.engine = fake.agent.engine
+                elif self.engine is not None and self.engine != fake.agent.engine:
+                    # Same as netsnmp's SNMPERR_UNKNOWN_ENG_ID
+                    fake.agent.deliver()
+                    self.ErrorNum = -32
+                    return (None)
+
+                for attempt in range(self.retries + 1):
+                    if fake.agent.deliver():
+                        return (fake.agent.handle(pdu_type,oids,a,b))
+                    time.sleep(self.timeout)
+
+                # Same as netsnmp's SNMPERR_TIMEOUT
+                self.ErrorNum = -24
+
+                return (None)
+
+            def fill(self,var,result):
+                del var[:]
+                for oid,type,value in result:
+                    var.append(Varbind(oid, '', value, type))
+
+                return (tuple(v.val for v in var))
+
+            def get(self,var):
+                result = self.request(snmp_ber.GET_REQUEST,var)
+                if result is None:
+                    return ((None,) * len(var))
+                for v,(oid,type,value) in zip(var,result):
+                    v.val  = value
+                    v.type = type
+
+                return (tuple(v.val for v in var))
+
+            def getbulk(self,nonrep,maxrep,var):
+                result = self.request(snmp_ber.GETBULK_REQUEST,var,nonrep,maxrep)
+                if result is None:
+                    return (())
+
+                return (self.fill(var,result))
+
+            # netsnmp walks with GETNEXT, one PDU per row
+            def walk(self,var):
+                base    = var[0].tag
+                current = base
+                result  = []
+                while True:
+                    row = self.request(snmp_ber.GETNEXT_REQUEST,[Varbind(current)])
+                    if row is None:
+                        break
+                    oid,type,value = row[0]
+                    if type == 'ENDOFMIBVIEW' or not oid.startswith(base + '.'):
+                        break
+                    result.append(row[0])
+                    current = oid
+
+                return (self.fill(var,result))
+
+        self.Session = Session
+
+    def snmpget(self,*varbinds,**kwargs):
+        return (self.Session(**kwargs).get(VarList(*varbinds)))
+
+    def snmpwalk(self,var,**kwargs):
+        return (self.Session(**kwargs).walk(var))
+
+#
+# Make "import netsnmp" return the fake from now on
+#
+def install(agent,timeout=None):
+    fake = FakeNetsnmp(agent,timeout)
+    sys.modules['netsnmp'] = fake
+
+    return (fake)
+
+#
+# SNMPv2c responder on a local UDP port
+#
+# Requests are answered one at a time in a background thread,
+# like a single-threaded snmpd, with the agent's latency and
+# loss applied per PDU.
+#
+class UdpAgent(object):
+
+    def __init__(self,agent,host='127.0.0.1',port=0):
+        self.agent  = agent
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.address = self.socket.getsockname()
+        self.thread  = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+
+        return (self)
+
+    def stop(self):
+        self.running = False
+        self.socket.close()
+
+    def serve(self):
+        while self.running:
+            try:
+                data,peer = self.socket.recvfrom(65535)
+            except (OSError, socket.error):
+                break
+
+            try:
+                version,community,pdu_type,request_id,a,b,varbinds = snmp_ber.decode_message(data)
+            except snmp_ber.DecodeError:
+                continue
+
+            if not self.agent.deliver():
+                continue
+
+            result = self.agent.handle(pdu_type,[oid for oid,type,value in varbinds],a,b)
+            reply  = snmp_ber.encode_message(community,snmp_ber.RESPONSE,request_id,result)
+            try:
+                self.socket.sendto(reply, peer)
+            except (OSError, socket.error):
+                break
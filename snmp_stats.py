@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+
+# What a check cost on the wire, and where its time went.
+#
+# The SNMP layer records every request here: PDUs and
+# varbinds, bytes each way, timeouts and retries, and how
+# long it took. The checks wrap their steps in phase(), so
+# run time is split into walking tables, per-row gets,
+# waiting on a lagging snmpd, fetching alarm details and
+# evaluating. perfdata() formats it all for the part of the
+# status line after the '|', so Nagios can graph check cost
+# per router.
+#
+# With profiling on, request latencies are also kept per
+# OID column and histogram() draws them, to spot which
+# tables an agent is slow to serve.
+
+from __future__ import print_function
+
+import sys
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds, the last bucket is open
+BUCKETS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0]
+
+class Stats(object):
+
+    def __init__(self,profile=False):
+        self.reset(profile)
+
+    def reset(self,profile=False):
+        self.profile  = profile
+        self.started  = time.time()
+        self.pdus     = 0
+        self.varbinds = 0
+        self.retries  = 0
+        self.timeouts = 0
+        self.sent     = 0
+        self.received = 0
+        self.phases   = {}
+        self.order    = []
+        self.stack    = []
+        self.columns  = []
+        self.latency  = {}
+
+    #
+    # Known table columns, so profiled OIDs can be grouped by
+    # column instead of one histogram per row
+    #
+    def add_columns(self,columns):
+        self.columns = sorted(set(self.columns) | set(columns), key=len, reverse=True)
+
+    def column(self,oid):
+        for column in self.columns:
+            if oid.startswith(column + '.'):
+                return (column)
+
+        return (oid)
+
+    #
+    # Time spent in a step of the check
+    #
+    # Phases can nest, time is only charged to the innermost
+    # one so the phases add up to the time spent in them.
+    #
+    @contextmanager
+    def phase(self,name):
+        self._switch()
+        self.stack.append([name, time.time()])
+        try:
+            yield
+        finally:
+            self._switch()
+            self.stack.pop()
+            if self.stack:
+                self.stack[-1][1] = time.time()
+
+    #
+    # Add time to a phase directly, for waits in coroutines that
+    # run side by side and can't nest phases
+    #
+    def add_time(self,name,seconds):
+        if name not in self.phases:
+            self.phases[name] = 0.0
+            self.order.append(name)
+        self.phases[name] += seconds
+
+    def _switch(self):
+        if not self.stack:
+            return
+
+        now = time.time()
+        self.add_time(self.stack[-1][0],now - self.stack[-1][1])
+        self.stack[-1][1] = now
+
+    #
+    # Account for one request
+    #
+    # oids are the requested OIDs, sent and received the bytes
+    # each way. pdus is more than one for requests the backend
+    # splits up itself, like a netsnmp walk.
+    #
+    def request(self,oids,elapsed,sent,received,varbinds,pdus=1,timeouts=0,retries=0):
+        self.pdus     += pdus
+        self.varbinds += varbinds
+        self.sent     += sent
+        self.received += received
+        self.timeouts += timeouts
+        self.retries  += retries
+
+        if self.profile:
+            for column in set(self.column(oid) for oid in oids):
+                self.latency.setdefault(column, []).append(elapsed)
+
+    #
+    # A request or walk the check had to repeat
+    #
+    def retry(self):
+        self.retries += 1
+
+    #
+    # Add the counters, phase times and latencies of another
+    # run, for totals over many checks
+    #
+    def merge(self,other):
+        self.pdus     += other.pdus
+        self.varbinds += other.varbinds
+        self.retries  += other.retries
+        self.timeouts += other.timeouts
+        self.sent     += other.sent
+        self.received += other.received
+
+        for name in other.order:
+            self.add_time(name,other.phases[name])
+
+        if self.profile:
+            for column,latency in other.latency.items():
+                self.latency.setdefault(column, []).extend(latency)
+
+    #
+    # Nagios perfdata, label=value[UOM] separated by blanks
+    #
+    def perfdata(self):
+        data = ["time={0:.3f}s".format(time.time() - self.started)]
+        for name in self.order:
+            data.append("{0}={1:.3f}s".format(name, self.phases[name]))
+
+        data.append("pdus={0}".format(self.pdus))
+        data.append("varbinds={0}".format(self.varbinds))
+        data.append("retries={0}".format(self.retries))
+        data.append("timeouts={0}".format(self.timeouts))
+        data.append("sent={0}B".format(self.sent))
+        data.append("received={0}B".format(self.received))
+
+        return (" ".join(data))
+
+    #
+    # Per-OID latency histogram, one block per column
+    #
+    def histogram(self):
+        lines = []
+        for column in sorted(self.latency):
+            latency = sorted(self.latency[column])
+            lines.append("{0}  n={1} min={2:.1f}ms p50={3:.1f}ms p95={4:.1f}ms max={5:.1f}ms".format(
+                column,
+                len(latency),
+                latency[0] * 1000,
+                latency[len(latency) // 2] * 1000,
+                latency[int(len(latency) * 0.95)] * 1000,
+                latency[-1] * 1000)
+                        )
+
+            counts = [0] * (len(BUCKETS) + 1)
+            for elapsed in latency:
+                n = 0
+                while n < len(BUCKETS) and elapsed > BUCKETS[n]:
+                    n += 1
+                counts[n] += 1
+
+            for n,count in enumerate(counts):
+                if not count:
+                    continue
+                if n < len(BUCKETS):
+                    label = "<= {0:g}ms".format(BUCKETS[n] * 1000)
+                else:
+                    label = " > {0:g}ms".format(BUCKETS[-1] * 1000)
+                bar = '#' * max(1, 40 * count // len(latency))
+                lines.append("  {0:>10} {1:>7} {2}".format(label, count, bar))
+
+        return ("\n".join(lines))
+
+#
+# Append perfdata to the first line of a check's output
+#
+def with_perfdata(output,perfdata):
+    lines    = output.split("\n", 1)
+    lines[0] = lines[0] + " | " + perfdata
+
+    return ("\n".join(lines))
+
+# Stats of the check running in this process
+stats = Stats()
+
+#
+# Convenience wrappers around the shared stats
+#
+def reset(profile=False):
+    stats.reset(profile)
+
+def phase(name):
+    return (stats.phase(name))
+
+def retry():
+    stats.retry()
+
+def perfdata():
+    return (stats.perfdata())
+
+def print_histogram():
+    if stats.latency:
+        print (stats.histogram(), file=sys.stderr)
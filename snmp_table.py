@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+# Helpers for fetching whole SNMP tables with GETBULK
+# and joining the columns by row index locally.
+#
+# The Nagios checks used to walk one column and then do
+# an snmpget per row and column, which on big boxes means
+# thousands of round trips per check. Walking all wanted
+# columns side by side with GETBULK brings that down to
+# (rows / max-repetitions) PDUs.
+#
+# Sessions come from snmp_session, which opens them with
+# numeric OIDs so returned varbinds can be matched against
+# the requested columns.
+
+DEFAULT_MAX_REPETITIONS = 25
+
+#
+# The agent stopped answering partway through a walk. A walk
+# that gets no answer at all comes back empty instead, like an
+# empty table, for callers that try again on an empty table.
+#
+class IncompleteWalk(Exception):
+
+    def __init__(self,responses):
+        Exception.__init__(self, "agent stopped answering partway through the walk")
+        self.responses = responses
+
+#
+# Full numeric OID of a returned varbind
+#
+def varbind_oid(varbind):
+    # Depending on the session flags netsnmp either keeps the
+    # whole OID in tag or splits the last sub-identifier into iid
+    oid = varbind.tag
+    if varbind.iid:
+        oid = oid + '.' + varbind.iid
+    if not oid.startswith('.'):
+        oid = '.' + oid
+
+    return (oid)
+
+#
+# Sort key that orders OID indexes the way the agent walks them
+#
+def index_key(index):
+    return (tuple(int(i) for i in index.split('.')))
+
+#
+# Walk a number of columns side by side with GETBULK
+#
+# Returns {column: {index: value}} where index is the OID
+# suffix after the column, e.g. '1.4.10.0.0.1'. Raises
+# IncompleteWalk if the agent stops answering partway.
+#
+def bulk_walk(session,columns,maxrep=DEFAULT_MAX_REPETITIONS):
+    import netsnmp
+
+    table,pending = bulk_start(columns)
+    responses     = 0
+
+    while pending:
+        # Continue every unfinished column from the last OID we saw
+        active = [column for column in columns if column in pending]
+        var    = netsnmp.VarList(*[netsnmp.Varbind(pending[column]) for column in active])
+        res    = session.getbulk(0, maxrep, var)
+
+        if not res:
+            if responses:
+                raise IncompleteWalk(responses)
+            break
+        responses += 1
+
+        varbinds = [(varbind_oid(v), v.type, v.val) for v in var]
+
+        # Agent handed back nothing new, don't loop forever
+        if not bulk_merge(table,pending,active,varbinds):
+            break
+
+    return (table)
+
+#
+# Same walk as bulk_walk, but yields joined rows as soon as
+# every column has walked past them
+#
+# Rows come as (index, values) in walk order, with None for
+# columns the row is missing from, and only the rows of the
+# last few responses are held at any time. Raises IncompleteWalk
+# like bulk_walk, after the rows walked until then.
+#
+def bulk_rows(session,columns,maxrep=DEFAULT_MAX_REPETITIONS):
+    import netsnmp
+
+    table,pending = bulk_start(columns)
+    responses     = 0
+
+    while pending:
+        active = [column for column in columns if column in pending]
+        var    = netsnmp.VarList(*[netsnmp.Varbind(pending[column]) for column in active])
+        res    = session.getbulk(0, maxrep, var)
+
+        if not res:
+            if responses:
+                raise IncompleteWalk(responses)
+            break
+        responses += 1
+
+        varbinds = [(varbind_oid(v), v.type, v.val) for v in var]
+        progress = bulk_merge(table,pending,active,varbinds)
+
+        for row in complete_rows(table,pending,columns):
+            yield (row)
+
+        if not progress:
+            break
+
+    for row in complete_rows(table,{},columns):
+        yield (row)
+
+#
+# Take the rows out of a partly walked table that every pending
+# column has walked past, in walk order
+#
+def complete_rows(table,pending,columns):
+    frontier = None
+    for column,oid in pending.items():
+        # A column that hasn't returned anything yet holds everything back
+        key = index_key(oid[len(column) + 1:]) if oid != column else ()
+        if frontier is None or key < frontier:
+            frontier = key
+
+    done = sorted((index_key(index), index) for index in table[columns[0]])
+    if frontier is not None:
+        done = [(key, index) for key,index in done if key <= frontier]
+
+    rows = [(index, tuple(table[column].pop(index, None) for column in columns))
+            for key,index in done]
+
+    # Drop rows up to the frontier that the first column doesn't have
+    for column in columns[1:]:
+        for index in list(table[column]):
+            if frontier is None or index_key(index) <= frontier:
+                del table[column][index]
+
+    return (rows)
+
+#
+# Walk state shared by the blocking and non-blocking walkers
+#
+def bulk_start(columns):
+    table   = dict((column, {}) for column in columns)
+    pending = dict((column, column) for column in columns)
+
+    return (table, pending)
+
+#
+# Merge one GETBULK response into the table
+#
+# active is the column list the request was built from, varbinds
+# a list of (oid, type, value). Columns that ran out are removed
+# from pending. Returns False if the response added no rows.
+#
+def bulk_merge(table,pending,active,varbinds):
+    progress = False
+
+    # Response varbinds are interleaved, one per column and repetition
+    for n, (oid, type, value) in enumerate(varbinds):
+        column = active[n % len(active)]
+        if column not in pending:
+            continue
+
+        if type == 'ENDOFMIBVIEW' or not oid.startswith(column + '.'):
+            del pending[column]
+            continue
+
+        index = oid[len(column) + 1:]
+        if index in table[column]:
+            continue
+
+        table[column][index] = value
+        pending[column]      = oid
+        progress             = True
+
+    return (progress)
+
+#
+# Join columns fetched by bulk_walk into rows by index
+#
+# Rows missing from any column get None for that column.
+# The first column decides which rows exist.
+#
+def join_rows(table,columns):
+    rows = {}
+    for index in table[columns[0]]:
+        rows[index] = tuple(table[column].get(index) for column in columns)
+
+    return (rows)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+# SNMPv3 user-based security for the checks.
+#
+# With -u, -a and -x instead of -c the checks talk authPriv
+# SNMPv3 with SHA and AES-128, or authNoPriv without -x. The
+# credentials are passed around in place of the community,
+# snmp_session opens v3 sessions for them.
+#
+# Before the first request of a v3 session netsnmp has to
+# discover the agent's engine ID, boots and time, one round
+# trip more than a v2c check takes. With -e these are kept
+# per device in <dir>/<host>.engine.json and handed to the
+# next session, with the engine time moved on by the time
+# since it was read, so the first PDU is already the real
+# request. The files are written mode 0600 and the directory
+# should be private to the Nagios user.
+#
+# An agent that got a new engine ID, or rebooted so that the
+# cached boots are behind, rejects the request with an unknown
+# engine or time window error. The entry is then dropped and
+# the request sent again after a fresh discovery. Entries are
+# also read again from the agent's snmpEngine group once they
+# are ENGINE_TTL old.
+#
+# The keys are still derived and localized from the passwords
+# by netsnmp on every run, its Python bindings take no keys.
+# That costs some CPU but no round trips.
+
+import binascii
+import os
+import time
+
+import snmp_ber
+import state_file
+
+# snmpEngineID, snmpEngineBoots and snmpEngineTime
+ENGINE_ID    = '.1.3.6.1.6.3.10.2.1.1.0'
+ENGINE_BOOTS = '.1.3.6.1.6.3.10.2.1.2.0'
+ENGINE_TIME  = '.1.3.6.1.6.3.10.2.1.3.0'
+ENGINE_OIDS  = [ENGINE_ID, ENGINE_BOOTS, ENGINE_TIME]
+
+# Seconds before a cached engine is read from the agent again
+ENGINE_TTL = 86400
+
+# netsnmp ErrorNum for SNMPERR_UNKNOWN_ENG_ID and SNMPERR_NOT_IN_TIME_WINDOW
+ENGINE_ERRORS = (-32, -36)
+
+# Engine IDs are mostly enterprise number, format and MAC address
+DEFAULT_ENGINE_ID_SIZE = 11
+
+# Octets in the HMAC-SHA-96 digest and the AES salt
+AUTH_PARAMS_SIZE = 12
+PRIV_PARAMS_SIZE = 8
+
+#
+# Octet string as netsnmp hands it back, in hex
+#
+def hex_octets(value):
+    if not isinstance(value, bytes):
+        value = value.encode('latin-1')
+
+    return (binascii.hexlify(value).decode('ascii'))
+
+class Credentials(object):
+
+    version = 3
+
+    def __init__(self,user,auth_pass,priv_pass=None,engine_dir=None,ttl=ENGINE_TTL):
+        self.user       = user
+        self.auth_pass  = auth_pass
+        self.priv_pass  = priv_pass
+        self.engine_dir = engine_dir
+        self.ttl        = ttl
+        self.engines    = {}
+
+    def level(self):
+        if self.priv_pass:
+            return ('authPriv')
+
+        return ('authNoPriv')
+
+    def engine_path(self,host):
+        return (os.path.join(self.engine_dir, host + '.engine.json'))
+
+    #
+    # Cached engine of a device as {engine_id, boots, time, read},
+    # None if there is none
+    #
+    def engine(self,host):
+        if not self.engine_dir:
+            return (None)
+
+        if host not in self.engines:
+            self.engines[host] = state_file.read(self.engine_path(host))
+
+        return (self.engines[host])
+
+    #
+    # Keep what the agent's snmpEngine group returned
+    #
+    def learn(self,host,engine_id,boots,engine_time,now=None):
+        if now is None:
+            now = time.time()
+
+        entry = {'engine_id': hex_octets(engine_id),
+                 'boots':     int(boots),
+                 'time':      int(engine_time),
+                 'read':      now}
+        self.engines[host] = entry
+        if self.engine_dir:
+            state_file.write(self.engine_path(host),entry)
+
+    #
+    # Drop a cached engine the agent no longer accepts, True if
+    # there was one
+    #
+    def forget(self,host,error):
+        if error not in ENGINE_ERRORS or not self.engine(host):
+            return (False)
+
+        self.engines[host] = None
+        try:
+            os.unlink(self.engine_path(host))
+        except OSError:
+            pass
+
+        return (True)
+
+    # True when the engine should be read from the agent
+    def stale(self,host,now=None):
+        if not self.engine_dir:
+            return (False)
+
+        entry = self.engine(host)
+        if now is None:
+            now = time.time()
+
+        return (entry is None or now - entry['read'] > self.ttl)
+
+    #
+    # Arguments for netsnmp.Session
+    #
+    def session_args(self,host,now=None):
+        args = {'SecName':   self.user,
+                'SecLevel':  self.level(),
+                'AuthProto': 'SHA',
+                'AuthPass':  self.auth_pass}
+        if self.priv_pass:
+            args['PrivProto'] = 'AES'
+            args['PrivPass']  = self.priv_pass
+
+        entry = self.engine(host)
+        if entry:
+            if now is None:
+                now = time.time()
+            args['SecEngineId']     = entry['engine_id']
+            args['ContextEngineId'] = entry['engine_id']
+            args['Engineboots']     = entry['boots']
+            args['Enginetime']      = entry['time'] + int(now - entry['read'])
+
+        return (args)
+
+    #
+    # Size of a v3 message to host carrying these varbinds, for
+    # the stats, with the engine ID cached for the host
+    #
+    def message_size(self,host,varbinds,a=0,b=0):
+        engine_size = DEFAULT_ENGINE_ID_SIZE
+        entry       = self.engines.get(host)
+        if entry:
+            engine_size = len(entry['engine_id']) // 2
+
+        # msgID, msgMaxSize, msgFlags, msgSecurityModel
+        header = snmp_ber.tlv_size(snmp_ber.tlv_size(4) + snmp_ber.tlv_size(3) +
+                                   snmp_ber.tlv_size(1) + snmp_ber.tlv_size(1))
+
+        # Engine ID, boots, time, user, authentication and privacy parameters
+        security = snmp_ber.tlv_size(snmp_ber.tlv_size(snmp_ber.tlv_size(engine_size) +
+                                                       snmp_ber.tlv_size(2) + snmp_ber.tlv_size(4) +
+                                                       snmp_ber.tlv_size(len(self.user)) +
+                                                       snmp_ber.tlv_size(AUTH_PARAMS_SIZE) +
+                                                       snmp_ber.tlv_size(PRIV_PARAMS_SIZE if self.priv_pass else 0)))
+
+        # Context engine ID, empty context name and the PDU, encrypted with -x
+        scoped = snmp_ber.tlv_size(snmp_ber.tlv_size(engine_size) + snmp_ber.tlv_size(0) +
+                                   snmp_ber.pdu_size(varbinds,a,b))
+        if self.priv_pass:
+            scoped = snmp_ber.tlv_size(scoped)
+
+        return (snmp_ber.tlv_size(snmp_ber.tlv_size(1) + header + security + scoped))
+
+#
+# Command line options, the same in every check
+#
+def add_options(parser):
+    parser.add_option("-u",
+                      type="string",
+                      dest="user",
+                      help="SNMPv3 user, instead of -c")
+
+    parser.add_option("-a",
+                      type="string",
+                      dest="auth_pass",
+                      help="SNMPv3 SHA authentication password")
+
+    parser.add_option("-x",
+                      type="string",
+                      dest="priv_pass",
+                      help="SNMPv3 AES privacy password (default authNoPriv)")
+
+    parser.add_option("-e",
+                      type="string",
+                      dest="engine_dir",
+                      help="keep SNMPv3 engine IDs and times in this directory, saving the discovery round trip")
+
+#
+# Credentials from the options, None for SNMPv2c
+#
+def from_options(options):
+    if not options.user or not options.auth_pass:
+        return (None)
+
+    return (Credentials(options.user,options.auth_pass,options.priv_pass,options.engine_dir))
+
+#
+# Community or credentials given, one of them is needed
+#
+def has_auth(options):
+    return (bool(options.community or (options.user and options.auth_pass)))
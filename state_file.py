@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+# Small JSON state files kept between check runs.
+#
+# Files are written next to their final name and renamed
+# into place, so a check running at the same time never
+# reads half a file. A missing or broken file reads as None.
+# The directory is created on first write, mode 0700 as the
+# files may hold SNMPv3 engine details.
+
+import errno
+import json
+import os
+
+def read(path):
+    try:
+        with open(path) as f:
+            return (json.load(f))
+    except (IOError, OSError, ValueError):
+        return (None)
+
+#
+# Create the state directories given on the command line and
+# make sure files can be written there, raises OSError if not.
+# None for a directory not given is skipped.
+#
+def prepare(*directories):
+    for directory in directories:
+        if not directory:
+            continue
+
+        try:
+            os.makedirs(directory, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        if not os.path.isdir(directory):
+            raise OSError(errno.ENOTDIR, os.strerror(errno.ENOTDIR), directory)
+        if not os.access(directory, os.W_OK | os.X_OK):
+            raise OSError(errno.EACCES, os.strerror(errno.EACCES), directory)
+
+def write(path,data):
+    import tempfile
+
+    directory,name = os.path.split(path)
+    prepare(directory)
+
+    fd,tmp = tempfile.mkstemp(prefix='.' + name, dir=directory or '.')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.rename(tmp, path)
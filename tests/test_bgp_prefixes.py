@@ -0,0 +1,91 @@
+import unittest
+
+import bgp_prefixes
+
+PEER1 = '1.4.10.0.0.1'
+PEER2 = '1.4.10.0.0.2'
+
+class EvaluateTest(unittest.TestCase):
+
+    PREVIOUS = {PEER1: {'1.1': [1000, 5, 200]},
+                PEER2: {'1.1': [100, 0, 10], '2.1': [50, 0, 10]}}
+
+    def test_no_drop(self):
+        current = {PEER1: {'1.1': [990, 5, 200]},
+                   PEER2: {'1.1': [100, 0, 10], '2.1': [60, 0, 10]}}
+        self.assertEqual(bgp_prefixes.evaluate(self.PREVIOUS,current,[PEER1, PEER2]), [])
+
+    def test_warning_and_critical(self):
+        current = {PEER1: {'1.1': [400, 5, 200]},
+                   PEER2: {'1.1': [5, 0, 10], '2.1': [50, 0, 10]}}
+        alarms  = bgp_prefixes.evaluate(self.PREVIOUS,current,[PEER1, PEER2])
+
+        # Worst first
+        self.assertEqual(alarms, [(2, PEER2, '1.1', 'accepted', 100, 5, 95.0),
+                                  (1, PEER1, '1.1', 'accepted', 1000, 400, 60.0)])
+
+    def test_advertised(self):
+        current = {PEER1: {'1.1': [1000, 5, 0]}}
+        self.assertEqual(bgp_prefixes.evaluate(self.PREVIOUS,current,[PEER1]),
+                         [(2, PEER1, '1.1', 'advertised', 200, 0, 100.0)])
+
+    def test_family_gone(self):
+        current = {PEER2: {'1.1': [100, 0, 10]}}
+        alarms  = bgp_prefixes.evaluate(self.PREVIOUS,current,[PEER2])
+        self.assertEqual([alarm[2:4] for alarm in alarms], [('2.1', 'accepted'), ('2.1', 'advertised')])
+
+    def test_only_established(self):
+        current = {PEER1: {'1.1': [0, 0, 0]}}
+        self.assertEqual(bgp_prefixes.evaluate(self.PREVIOUS,current,[]), [])
+
+    def test_unknown_counts(self):
+        current = {PEER1: {'1.1': [None, 5, None]}}
+        self.assertEqual(bgp_prefixes.evaluate(self.PREVIOUS,current,[PEER1]), [])
+
+        # Nothing to compare with
+        self.assertEqual(bgp_prefixes.evaluate({},current,[PEER1]), [])
+
+    def test_drop_limits(self):
+        current = {PEER1: {'1.1': [700, 5, 200]}}
+        alarms  = bgp_prefixes.evaluate(self.PREVIOUS,current,[PEER1],bgp_prefixes.parse_drop("20,30"))
+        self.assertEqual([alarm[0] for alarm in alarms], [2])
+
+class BaselineTest(unittest.TestCase):
+
+    #
+    # One run, returns the alarms and the counts saved for the next
+    #
+    def run_once(self,previous,current):
+        alarms = bgp_prefixes.evaluate(previous,current,[PEER1])
+
+        return (alarms, bgp_prefixes.baseline(previous,current,alarms))
+
+    def test_drop_alarms_until_recovered(self):
+        saved = {PEER1: {'1.1': [1000, 5, 200]}}
+
+        # The drop alarms, and keeps alarming while the count stays down
+        for run in range(3):
+            alarms,saved = self.run_once(saved,{PEER1: {'1.1': [100, 7, 200]}})
+            self.assertEqual([alarm[:6] for alarm in alarms], [(2, PEER1, '1.1', 'accepted', 1000, 100)])
+            self.assertEqual(saved, {PEER1: {'1.1': [1000, 7, 200]}})
+
+        # Partly back, still a warning against the old count
+        alarms,saved = self.run_once(saved,{PEER1: {'1.1': [400, 7, 200]}})
+        self.assertEqual([alarm[0] for alarm in alarms], [1])
+
+        # Back within the warning share, the new count becomes the baseline
+        alarms,saved = self.run_once(saved,{PEER1: {'1.1': [900, 7, 200]}})
+        self.assertEqual(alarms, [])
+        self.assertEqual(saved, {PEER1: {'1.1': [900, 7, 200]}})
+
+    def test_family_gone_kept(self):
+        saved = {PEER1: {'1.1': [1000, 5, 200], '2.1': [50, 0, 10]}}
+
+        alarms,saved = self.run_once(saved,{PEER1: {'1.1': [1000, 5, 200]}})
+        self.assertEqual(saved[PEER1]['2.1'], [50, 0, 10])
+
+        alarms,saved = self.run_once(saved,{PEER1: {'1.1': [1000, 5, 200]}})
+        self.assertEqual(len(alarms), 2)
+
+if __name__ == "__main__":
+    unittest.main()
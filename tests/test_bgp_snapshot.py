@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import bgp_snapshot
+import state_file
+
+class SnapshotTest(unittest.TestCase):
+
+    SNAPSHOT = {'1.4.10.0.0.1': ['6', 3, '65001', '', 100.0],
+                '1.4.10.0.0.2': ['1', 7, '65002', 'hold time expired', 200.0]}
+
+    def test_changed_peers(self):
+        live = {'1.4.10.0.0.1': ('6', 3),
+                '1.4.10.0.0.2': ('6', 8),
+                '1.4.10.0.0.3': ('6', 1)}
+        self.assertEqual(sorted(bgp_snapshot.changed_peers(self.SNAPSHOT,live)),
+                         ['1.4.10.0.0.2', '1.4.10.0.0.3'])
+
+    def test_update(self):
+        live    = {'1.4.10.0.0.1': ('6', 3),
+                   '1.4.10.0.0.2': ('6', 8),
+                   '1.4.10.0.0.3': ('6', 1)}
+        details = {'1.4.10.0.0.2': ('65002', ''),
+                   '1.4.10.0.0.3': ('65003', '')}
+        updated = bgp_snapshot.update(self.SNAPSHOT,live,details,now=300.0)
+
+        self.assertEqual(updated, {'1.4.10.0.0.1': ['6', 3, '65001', '', 100.0],
+                                   '1.4.10.0.0.2': ['6', 8, '65002', '', 300.0],
+                                   '1.4.10.0.0.3': ['6', 1, '65003', '', 300.0]})
+
+    def test_gone_peers_are_dropped(self):
+        updated = bgp_snapshot.update(self.SNAPSHOT,{'1.4.10.0.0.1': ('6', 3)},{},now=300.0)
+        self.assertEqual(list(updated), ['1.4.10.0.0.1'])
+
+    def test_failed_details_are_fetched_again(self):
+        live    = {'1.4.10.0.0.2': ('6', 8), '1.4.10.0.0.3': ('6', 1)}
+        failed  = ['1.4.10.0.0.2', '1.4.10.0.0.3']
+        updated = bgp_snapshot.update(self.SNAPSHOT,live,{},failed,now=300.0)
+
+        # Old details kept, new peer left out until they come in
+        self.assertEqual(updated, {'1.4.10.0.0.2': ['6', None, '65002', 'hold time expired', 300.0]})
+        self.assertEqual(sorted(bgp_snapshot.changed_peers(updated,live)), failed)
+
+class SaveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        state_dir = os.path.join(self.dir, 'missing', 'bgp')
+        bgp_snapshot.save(state_dir,'router1',SnapshotTest.SNAPSHOT)
+
+        self.assertEqual(bgp_snapshot.load(state_dir,'router1'), SnapshotTest.SNAPSHOT)
+        self.assertEqual(bgp_snapshot.load(state_dir,'router2'), {})
+
+    def test_prepare_refuses_a_file(self):
+        path = os.path.join(self.dir, 'file')
+        open(path, 'w').close()
+        self.assertRaises(OSError, state_file.prepare, None, path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import sys
+import unittest
+
+import check_bgp_neighbors
+import check_device
+import check_env
+import snmp_retry
+import snmp_session
+import snmp_sim
+import snmp_stats
+
+class PollTablesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.netsnmp = sys.modules.get('netsnmp')
+        self.policy  = snmp_retry.policy
+        self.agent   = snmp_sim.Agent(seed=1)
+        snmp_sim.add_bgp_peers(self.agent,60,down_share=0.1)
+        snmp_sim.add_sensors(self.agent,40,alarm_share=0.1)
+        snmp_sim.install(self.agent,0.0)
+        snmp_retry.use(snmp_retry.Policy(timeout=0.2,retries=0))
+        snmp_stats.reset()
+
+    def tearDown(self):
+        snmp_session.close_all()
+        snmp_retry.use(self.policy)
+        if self.netsnmp is None:
+            sys.modules.pop('netsnmp', None)
+        else:
+            sys.modules['netsnmp'] = self.netsnmp
+
+    def test_same_results_as_the_single_checks(self):
+        table = check_device.poll_tables('router1','public',25)
+        both  = self.agent.pdus
+        bgp   = check_device.bgp_result(table,False)
+        env   = check_device.env_result('router1',table,None,None,None)
+
+        self.agent.reset_counters()
+        v4,v6 = check_bgp_neighbors.check_neighbor_status_table('router1','public',25)
+        sensors,thresholds,physical,tree,paths = check_env.get_sensor_tables('router1','public',25)
+        single = self.agent.pdus
+
+        exitcode,alarms,working,num = check_env.evaluate_sensor_tables(sensors,thresholds,physical,paths=paths)
+        self.assertEqual(bgp, check_bgp_neighbors.check_result(v4,v6,False))
+        self.assertEqual(env, (exitcode, "\n".join(alarms)))
+        self.assertEqual((bgp[0], env[0]), (2, 2))
+
+        # One schedule carries the columns of both checks
+        self.assertTrue(both < single)
+
+if __name__ == "__main__":
+    unittest.main()
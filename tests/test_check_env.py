@@ -0,0 +1,73 @@
+import sys
+import unittest
+
+import check_env
+import sensor_eval
+import snmp_session
+import snmp_sim
+import snmp_stats
+
+class EvaluateSensorTablesTest(unittest.TestCase):
+
+    PHYSICAL = {'1': ('8', 'Inlet temperature sensor', '0/1 Inlet'),
+                '2': ('8', 'Outlet temperature sensor', '0/1 Outlet')}
+
+    def test_alarm(self):
+        sensors    = {'1': ('1', '85', '8', '9')}
+        thresholds = {'1.1': ('80', '3', '1'), '1.2': ('-32768', '3', '1')}
+
+        exitcode,alarms,count,num = check_env.evaluate_sensor_tables(sensors,thresholds,self.PHYSICAL)
+        self.assertEqual((exitcode, count, num), (2, 1, 1))
+        self.assertTrue("greater than" in alarms[0])
+
+    def test_missing_columns_are_skipped(self):
+        sensors    = {'1': ('1', '50', '8', '9'),
+                      '2': ('1', None, '8', '9')}
+        thresholds = {'1.1': ('40', '3', '1'),
+                      '1.2': (None, '3', '1'),
+                      '1.3': ('60', None, '1'),
+                      '2.1': ('10', '3', '1')}
+
+        exitcode,alarms,count,num = check_env.evaluate_sensor_tables(sensors,thresholds,self.PHYSICAL)
+        self.assertEqual((exitcode, len(alarms), count, num), (2, 1, 2, 1))
+        self.assertEqual(check_env.scaled_readings(sensors), [('1', 50.0)])
+
+    def test_rules(self):
+        sensors    = {'1': ('1', '85', '8', '9')}
+        thresholds = {'1.1': ('80', '3', '1')}
+        rules      = sensor_eval.Rules.parse(["name:*Inlet* threshold=90"])
+
+        exitcode,alarms,count,num = check_env.evaluate_sensor_tables(sensors,thresholds,self.PHYSICAL,rules)
+        self.assertEqual((exitcode, alarms), (0, []))
+
+class LiveRowsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.netsnmp = sys.modules.get('netsnmp')
+        self.agent   = snmp_sim.Agent()
+        snmp_sim.add_sensors(self.agent,100)
+        snmp_sim.install(self.agent,0.0)
+        snmp_stats.reset()
+
+        self.indexes = [str(index) for index in range(1000, 1100)]
+
+    def tearDown(self):
+        snmp_session.close_all()
+        if self.netsnmp is None:
+            sys.modules.pop('netsnmp', None)
+        else:
+            sys.modules['netsnmp'] = self.netsnmp
+
+    def test_few_sensors_with_gets(self):
+        live = check_env.get_live_rows('router1','public',25,self.indexes[:5],100)
+        self.assertEqual(sorted(live), self.indexes[:5])
+        self.assertEqual(self.agent.pdus, 1)
+
+    def test_most_sensors_walked(self):
+        # Half the sensors is more than GET_SHARE, all of them are walked
+        live = check_env.get_live_rows('router1','public',25,self.indexes[:50],100)
+        self.assertEqual(sorted(live), self.indexes)
+        self.assertEqual(self.agent.pdus, 5)
+
+if __name__ == "__main__":
+    unittest.main()
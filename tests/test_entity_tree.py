@@ -0,0 +1,60 @@
+import unittest
+
+import check_env
+import entity_tree
+
+class BuildTest(unittest.TestCase):
+
+    # Rack 0 > slot 3 (unnamed container) > 0/RSP0 > CPU0 > inlet sensor
+    TREE     = {'1':  ('0', '-1'),
+                '2':  ('1', '3'),
+                '3':  ('2', '1'),
+                '4':  ('3', '1'),
+                '5':  ('4', '1')}
+    PHYSICAL = {'1': ('3', 'ASR-9006 chassis', 'Rack 0'),
+                '2': ('5', 'Slot', ''),
+                '3': ('9', 'Route switch processor', '0/RSP0'),
+                '4': ('12', 'CPU', '0/RSP0/CPU0'),
+                '5': ('8', 'Inlet temperature', '0/RSP0/CPU0-Inlet')}
+
+    def test_paths(self):
+        paths = entity_tree.build(self.TREE,self.PHYSICAL,check_env.map_PhysicalClass)
+
+        self.assertEqual(paths['1'], '')
+        self.assertEqual(paths['2'], 'Rack 0')
+        self.assertEqual(paths['3'], 'Rack 0 / slot 3')
+        self.assertEqual(paths['5'], 'Rack 0 / slot 3 / 0/RSP0 / 0/RSP0/CPU0')
+
+    def test_unnamed_entities(self):
+        physical = dict(self.PHYSICAL)
+        physical['3'] = ('9', 'Route switch processor', '')
+        del physical['4']
+        paths = entity_tree.build(self.TREE,physical,check_env.map_PhysicalClass)
+
+        # By class and position, a missing row counts as unknown
+        self.assertEqual(paths['5'], 'Rack 0 / slot 3 / module 1 / unknown 1')
+
+    def test_parent_not_walked(self):
+        tree  = {'5': ('4', '1')}
+        paths = entity_tree.build(tree,self.PHYSICAL,check_env.map_PhysicalClass)
+        self.assertEqual(paths, {'5': ''})
+
+    def test_loop(self):
+        tree     = {'1': ('2', '1'), '2': ('1', '1'), '3': ('2', '1')}
+        physical = {'1': ('9', '', 'A'), '2': ('9', '', 'B'), '3': ('8', '', 'C')}
+        paths    = entity_tree.build(tree,physical,check_env.map_PhysicalClass)
+
+        # A broken table still gives every entity some path, and returns
+        self.assertEqual(sorted(paths), ['1', '2', '3'])
+        self.assertTrue(paths['3'].endswith('B'))
+
+    def test_deep_chain(self):
+        tree     = dict((str(n), (str(n - 1), '1')) for n in range(1, 100))
+        physical = dict((str(n), ('9', '', 'm' + str(n))) for n in range(1, 100))
+        paths    = entity_tree.build(tree,physical,check_env.map_PhysicalClass)
+
+        self.assertEqual(paths['3'], 'm1 / m2')
+        self.assertEqual(len(paths), 99)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import unittest
+
+# The exporter runs on asyncio, Python 3 only
+try:
+    import asyncio
+    import exporter
+except (ImportError, SyntaxError):
+    exporter = None
+
+#
+# Poll function that counts its calls and takes a moment, so
+# scrapes can overlap with it
+#
+class FakePoll(object):
+
+    def __init__(self,fail=()):
+        self.calls = []
+        self.fail  = set(fail)
+
+    def __call__(self,host):
+        self.calls.append(host)
+        if host in self.fail:
+            raise ValueError(host)
+
+        return (asyncio.sleep(0.01, result=['iosxr_up{{device="{0}"}} 1'.format(host)]))
+
+#
+# Stream ends of one HTTP request
+#
+class FakeReader(object):
+
+    def __init__(self,request):
+        self.lines = [line.encode('latin-1') + b'\r\n' for line in request] + [b'\r\n']
+
+    def readline(self):
+        return (asyncio.sleep(0, result=self.lines.pop(0) if self.lines else b''))
+
+class FakeWriter(object):
+
+    def __init__(self):
+        self.data   = b''
+        self.closed = False
+
+    def write(self,data):
+        self.data += data
+
+    def drain(self):
+        return (asyncio.sleep(0))
+
+    def close(self):
+        self.closed = True
+
+@unittest.skipIf(exporter is None, "exporter needs Python 3")
+class ResultCacheTest(unittest.TestCase):
+
+    # Results of coroutines run side by side, this file stays
+    # readable by Python 2 so it can skip
+    def run_all(self,*coroutines):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return (loop.run_until_complete(asyncio.gather(*coroutines)))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def test_concurrent_scrapes_share_a_poll(self):
+        poll  = FakePoll()
+        cache = exporter.ResultCache(poll,60)
+
+        first,second = self.run_all(cache.get('router1'), cache.get('router1'))
+        self.assertEqual(poll.calls, ['router1'])
+        self.assertTrue(first is second)
+        self.assertEqual((cache.polls, cache.shared, cache.hits), (1, 1, 0))
+
+    def test_cached_per_host(self):
+        poll  = FakePoll()
+        cache = exporter.ResultCache(poll,60)
+
+        self.run_all(cache.get('router1'), cache.get('router2'))
+        result, = self.run_all(cache.get('router1'))
+
+        self.assertEqual(sorted(poll.calls), ['router1', 'router2'])
+        self.assertEqual(result[1], ['iosxr_up{device="router1"} 1'])
+        self.assertEqual((cache.polls, cache.hits), (2, 1))
+
+    def test_expired(self):
+        poll  = FakePoll()
+        cache = exporter.ResultCache(poll,-1)
+
+        self.run_all(cache.get('router1'))
+        self.run_all(cache.get('router1'))
+        self.assertEqual(poll.calls, ['router1', 'router1'])
+
+    def test_failed_poll_not_kept(self):
+        poll  = FakePoll(fail=['router1'])
+        cache = exporter.ResultCache(poll,60)
+
+        self.assertRaises(ValueError, self.run_all, cache.get('router1'))
+        self.assertEqual(cache.polling, {})
+
+        poll.fail.clear()
+        self.run_all(cache.get('router1'))
+        self.assertEqual(len(poll.calls), 2)
+
+    def test_scrape_duplicate_targets(self):
+        poll  = FakePoll()
+        cache = exporter.ResultCache(poll,60)
+
+        text, = self.run_all(exporter.scrape(cache,['router1', 'router1']))
+        self.assertEqual(text.count('iosxr_up{device="router1"}'), 1)
+        self.assertEqual(text.count('iosxr_result_age_seconds{device="router1"}'), 1)
+
+@unittest.skipIf(exporter is None, "exporter needs Python 3")
+class HandleTest(unittest.TestCase):
+
+    def request(self,line,hosts=('router1',)):
+        cache  = exporter.ResultCache(FakePoll(),60)
+        writer = FakeWriter()
+        asyncio.run(exporter.handle(cache,list(hosts),FakeReader([line, 'Host: localhost']),writer))
+        self.assertTrue(writer.closed)
+
+        head,body = writer.data.split(b'\r\n\r\n', 1)
+        return (head.decode('ascii'), body.decode('utf-8'))
+
+    def test_get(self):
+        head,body = self.request('GET /metrics?target=router1 HTTP/1.1')
+        self.assertTrue(head.startswith('HTTP/1.0 200 OK'))
+        self.assertTrue('iosxr_up{device="router1"} 1' in body)
+        self.assertTrue('Content-Length: {0}'.format(len(body.encode('utf-8'))) in head)
+
+    def test_head(self):
+        head,body = self.request('HEAD /metrics HTTP/1.1')
+        self.assertTrue(head.startswith('HTTP/1.0 200 OK'))
+        self.assertEqual(body, '')
+
+        # Same length as the GET would have
+        self.assertFalse('Content-Length: 0' in head)
+
+    def test_unknown_target(self):
+        head,body = self.request('GET /metrics?target=router9 HTTP/1.1')
+        self.assertTrue(head.startswith('HTTP/1.0 404'))
+
+    def test_method(self):
+        head,body = self.request('POST /metrics HTTP/1.1')
+        self.assertTrue(head.startswith('HTTP/1.0 405'))
+
+if __name__ == "__main__":
+    unittest.main()
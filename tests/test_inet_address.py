@@ -0,0 +1,64 @@
+import unittest
+
+import inet_address
+
+def suffix(type,octets,rest=''):
+    return ('.'.join(str(part) for part in [type, len(octets)] + list(octets)) + rest)
+
+class DecodeTest(unittest.TestCase):
+
+    V6 = [0x20, 0x01, 0x07, 0xf8, 0, 0x0d, 0, 0xfc, 0, 0, 0, 0, 0, 0, 0, 0x73]
+
+    def test_ipv4(self):
+        self.assertEqual(inet_address.decode('1.4.10.0.0.1'), (inet_address.IPV4, '10.0.0.1', ''))
+
+    def test_rest(self):
+        self.assertEqual(inet_address.decode('1.4.10.0.0.1.1.128'), (inet_address.IPV4, '10.0.0.1', '1.128'))
+
+    def test_ipv6(self):
+        self.assertEqual(inet_address.decode(suffix(2, self.V6)),
+                         (inet_address.IPV6, '2001:7f8:d:fc::73', ''))
+
+    def test_zones(self):
+        self.assertEqual(inet_address.decode(suffix(3, [10, 0, 0, 1, 0, 0, 1, 2])),
+                         (inet_address.IPV4Z, '10.0.0.1%258', ''))
+        self.assertEqual(inet_address.decode(suffix(4, [0xfe, 0x80] + [0] * 13 + [1, 0, 0, 0, 3])),
+                         (inet_address.IPV6Z, 'fe80::1%3', ''))
+
+    def test_dns(self):
+        self.assertEqual(inet_address.decode(suffix(16, [ord(c) for c in 'rs1'])),
+                         (inet_address.DNS, 'rs1', ''))
+
+    def test_bad(self):
+        for bad in ['',
+                    '1',
+                    '1.x.10.0.0.1',
+                    '1.4.10.0.0',
+                    '1.3.10.0.0',
+                    '2.4.10.0.0.1',
+                    '1.4.300.1.1.1',
+                    '1.4.10.0.0.-1',
+                    suffix(2, self.V6[:15] + [256]),
+                    suffix(3, [10, 0, 0, 1, 0, 0, 0, 999]),
+                    suffix(4, [1000] * 20)]:
+            self.assertRaises(inet_address.DecodeError, inet_address.decode, bad)
+
+class DecoderTest(unittest.TestCase):
+
+    def test_lru(self):
+        decoder = inet_address.Decoder(size=2)
+        decoder.decode('1.4.10.0.0.1')
+        decoder.decode('1.4.10.0.0.2')
+        decoder.decode('1.4.10.0.0.1')
+        decoder.decode('1.4.10.0.0.3')
+
+        self.assertEqual((decoder.hits, decoder.misses), (1, 3))
+        self.assertEqual(list(decoder.cache), ['1.4.10.0.0.1', '1.4.10.0.0.3'])
+
+    def test_errors_are_not_cached(self):
+        decoder = inet_address.Decoder()
+        self.assertRaises(inet_address.DecodeError, decoder.decode, '1.4.300.1.1.1')
+        self.assertEqual(len(decoder.cache), 0)
+
+if __name__ == "__main__":
+    unittest.main()
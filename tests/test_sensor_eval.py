@@ -0,0 +1,90 @@
+import unittest
+
+import sensor_eval
+
+def columns(*rows):
+    columns = sensor_eval.new_columns()
+    for row in rows:
+        sensor_eval.add_row(columns,*row)
+
+    return (columns)
+
+class EvaluateTest(unittest.TestCase):
+
+    def test_relations(self):
+        rows = columns(('1', 1, 10, 20, 1, 1),  # 10 < 20
+                       ('2', 1, 20, 20, 2, 1),  # 20 <= 20
+                       ('3', 1, 20, 20, 3, 1),
+                       ('4', 1, 20, 20, 4, 1),  # 20 >= 20
+                       ('5', 1, 21, 20, 5, 1),
+                       ('6', 1, 21, 20, 6, 1))  # 21 != 20
+        self.assertEqual(sensor_eval.evaluate(rows), [0, 1, 3, 5])
+
+    def test_notification_disabled(self):
+        self.assertEqual(sensor_eval.evaluate(columns(('1', 1, 90, 80, 3, 2))), [])
+
+    def test_unknown_relation(self):
+        self.assertEqual(sensor_eval.evaluate(columns(('1', 1, 90, 80, 7, 1))), [])
+
+    def test_check(self):
+        self.assertEqual(sensor_eval.check(90,3,80), "is greater than")
+        self.assertEqual(sensor_eval.check(70,3,80), None)
+
+class RulesTest(unittest.TestCase):
+
+    def test_parse(self):
+        rules = sensor_eval.Rules.parse(["# overrides",
+                                         "",
+                                         "name:*Inlet* slot=2 relation=greaterThan threshold=50  # hot aisle",
+                                         "type:dBm ignore",
+                                         "name:fan? relation=4"])
+        self.assertEqual([rule[:1] + rule[2:] for rule in rules.rules],
+                         [('name', 2, False, 3, 50),
+                          ('type', None, True, None, None),
+                          ('name', None, False, 4, None)])
+
+    def test_bad_lines(self):
+        for line in ["inlet ignore",
+                     "slot:1 ignore",
+                     "name: ignore",
+                     "name:x bogus",
+                     "name:x ignore=yes",
+                     "name:x slot=two",
+                     "name:x threshold=",
+                     "name:x relation=0",
+                     "name:x relation=7",
+                     "name:x relation=greater"]:
+            self.assertRaises(sensor_eval.RuleError, sensor_eval.Rules.parse, [line])
+
+    def test_error_line_number(self):
+        try:
+            sensor_eval.Rules.parse(["type:dBm ignore", "", "name:x relation=9"])
+        except sensor_eval.RuleError as e:
+            self.assertTrue(str(e).startswith("line 3:"))
+        else:
+            self.fail("no RuleError")
+
+    def test_apply(self):
+        rules = sensor_eval.Rules.parse(["name:*Inlet* slot=2 relation=greaterThan threshold=50",
+                                         "type:dBm ignore",
+                                         "name:*Inlet* threshold=99"])
+        rows  = columns(('1', 1, 60, 80, 3, 1, '0/1 Inlet', 'celsius'),
+                        ('1', 2, 60, 80, 1, 1, '0/1 Inlet', 'celsius'),
+                        ('2', 1, -3, -10, 1, 1, 'Rx power', 'dBm'))
+
+        applied = rules.apply(rows)
+        self.assertEqual(applied['threshold'], [99, 50, -10])
+        self.assertEqual(applied['relation'], [3, 3, 1])
+        self.assertEqual(applied['notification'], [1, 1, 2])
+        self.assertEqual(sensor_eval.evaluate(applied), [1])
+
+        # The walked columns are left alone
+        self.assertEqual(rows['threshold'], [80, 80, -10])
+
+    def test_first_match_wins(self):
+        rules = sensor_eval.Rules.parse(["type:celsius threshold=10", "name:*Inlet* threshold=20"])
+        rows  = rules.apply(columns(('1', 1, 0, 0, 3, 1, 'Inlet', 'celsius')))
+        self.assertEqual(rows['threshold'], [10])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+import sensor_filter
+
+# Chassis 1 holds line card 10 with port 100, which has two optics
+# sensors, and an inlet temperature sensor on the card itself
+PHYSICAL = {'1':   ('3', 'Chassis', 'Rack 0'),
+            '10':  ('9', 'Line card', '0/1/CPU0'),
+            '100': ('10', 'Port', 'HundredGigE0/1/0/0'),
+            '101': ('8', 'Rx power', 'HundredGigE0/1/0/0 Rx Lane 0'),
+            '102': ('8', 'Tx power', 'HundredGigE0/1/0/0 Tx Lane 0'),
+            '11':  ('8', 'Inlet', '0/1/CPU0 Inlet')}
+
+TREE = {'10':  ('1', '1'),
+        '100': ('10', '1'),
+        '101': ('100', '1'),
+        '102': ('100', '2'),
+        '11':  ('10', '2')}
+
+TYPES = {'101': '14', '102': '14', '11': '8'}
+
+class ParseTest(unittest.TestCase):
+
+    def test_types(self):
+        self.assertEqual(sensor_filter.parse('type:dBm,celsius'), ('type', set(['14', '8'])))
+        self.assertEqual(sensor_filter.parse('type:10'), ('type', set(['10'])))
+
+    def test_classes(self):
+        self.assertEqual(sensor_filter.parse('class:Port,module'), ('class', set(['10', '9'])))
+
+    def test_names(self):
+        self.assertEqual(sensor_filter.parse('name:*Rx*,*Inlet'), ('name', ['*Rx*', '*Inlet']))
+
+    def test_bad(self):
+        for spec in ['dBm', 'type:', 'colour:red', 'type:furlongs', 'class:rack']:
+            self.assertRaises(sensor_filter.FilterError, sensor_filter.parse, spec)
+
+class SelectTest(unittest.TestCase):
+
+    def select(self,include=None,exclude=None):
+        return (sensor_filter.SensorFilter.parse(include,exclude).select(TYPES,PHYSICAL,TREE))
+
+    def test_inactive(self):
+        self.assertFalse(sensor_filter.SensorFilter.parse().active())
+        self.assertEqual(self.select(), ['11', '101', '102'])
+
+    def test_exclude_type(self):
+        self.assertEqual(self.select(exclude=['type:dBm']), ['11'])
+
+    def test_parent_class(self):
+        self.assertEqual(self.select(exclude=['class:port']), ['11'])
+        self.assertEqual(self.select(include=['class:module']), ['11'])
+
+    def test_include_and_exclude(self):
+        self.assertEqual(self.select(include=['type:dBm'], exclude=['name:*Tx*']), ['101'])
+        self.assertEqual(self.select(include=['type:dBm', 'name:*Inlet']), [])
+
+    def test_unknown_entity(self):
+        selection = sensor_filter.SensorFilter.parse(include=['class:unknown'])
+        self.assertEqual(selection.select({'999': '8'},PHYSICAL,TREE), ['999'])
+
+if __name__ == "__main__":
+    unittest.main()
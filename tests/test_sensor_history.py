@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import sensor_history
+
+class HistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir  = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'router1.history')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def history(self,capacity=4,readonly=False):
+        return (sensor_history.History(self.path,capacity,readonly))
+
+    def test_append_and_read(self):
+        history = self.history()
+        history.append(100.0,[('1', 40.0), ('2', 12.0)])
+        history.append(200.0,[('1', 41.0)])
+
+        self.assertEqual(history.read(), [(100.0, 1, 40.0), (100.0, 2, 12.0), (200.0, 1, 41.0)])
+        self.assertEqual(history.read('1'), [(100.0, 1, 40.0), (200.0, 1, 41.0)])
+        self.assertEqual(history.read(start=150.0), [(200.0, 1, 41.0)])
+        self.assertEqual(history.read(end=150.0), [(100.0, 1, 40.0), (100.0, 2, 12.0)])
+        history.close()
+
+    def test_wraparound(self):
+        history = self.history()
+        for n in range(3):
+            history.append(100.0 * n,[('1', float(n)), ('2', float(n))])
+
+        # Six readings in four slots, the oldest two are gone
+        self.assertEqual(history.read(), [(100.0, 1, 1.0), (100.0, 2, 1.0),
+                                          (200.0, 1, 2.0), (200.0, 2, 2.0)])
+
+        # The binary search for start works across the end of the file
+        history.append(300.0,[('1', 3.0)])
+        self.assertEqual(history.read('1',start=150.0), [(200.0, 1, 2.0), (300.0, 1, 3.0)])
+        history.close()
+
+    def test_more_than_capacity(self):
+        history = self.history()
+        history.append(100.0,[(str(n), float(n)) for n in range(6)])
+
+        self.assertEqual([record[1] for record in history.read()], [2, 3, 4, 5])
+        history.close()
+
+    def test_capacity_of_existing_file(self):
+        self.history(capacity=4).close()
+
+        history = self.history(capacity=100)
+        self.assertEqual(history.capacity, 4)
+        history.close()
+
+    def test_not_a_history_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'x' * 64)
+
+        self.assertRaises(sensor_history.HistoryError, self.history)
+
+    def test_query_reads_only(self):
+        sensor_history.record(self.dir,'router1',[('1', 40.0)],now=100.0,capacity=4)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        self.assertEqual(sensor_history.query(self.dir,'router1'), [(100.0, 1, 40.0)])
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+        history = self.history(readonly=True)
+        self.assertRaises(TypeError, history.append, 200.0, [('1', 41.0)])
+        history.close()
+
+    def test_query_missing_or_empty(self):
+        self.assertEqual(sensor_history.query(self.dir,'router1'), [])
+        self.assertFalse(os.path.exists(self.path))
+
+        # Created by a writer that hasn't laid it out yet
+        open(self.path, 'w').close()
+        self.assertEqual(sensor_history.query(self.dir,'router1'), [])
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+import sensor_eval
+import sensor_trend
+
+#
+# Feed the same readings once a minute, returns the state and the
+# alarms of the last run
+#
+def feed(rules,runs,readings,state=None):
+    state = state or {}
+    for n in range(runs):
+        state,alarms = sensor_trend.evaluate(state,n * 60.0,readings,rules)
+
+    return (state, alarms)
+
+class TrendRulesTest(unittest.TestCase):
+
+    def test_parse(self):
+        rules = sensor_trend.TrendRules.parse(["type:degrees?celsius rate=0.5 deviation",
+                                               "type:rpm rate=500 deviation=4   # fans",
+                                               "name:*Transceiver* ignore"])
+
+        self.assertEqual(rules.lookup('Inlet', 'degrees celsius')[2:], (False, 0.5, sensor_trend.DEFAULT_DEVIATION))
+        self.assertEqual(rules.lookup('Fan 0', 'rpm')[2:], (False, 500.0, 4.0))
+        self.assertEqual(rules.lookup('Transceiver 0/0/0/1', 'dBm')[2:], (True, None, None))
+        self.assertEqual(rules.lookup('PEM 0', 'volts')[2:], (False, None, None))
+
+    def test_bad_lines(self):
+        for line in ["type:rpm rate=fast",
+                     "type:rpm deviation=x",
+                     "type:rpm relation=3",
+                     "rpm rate=1"]:
+            self.assertRaises(sensor_eval.RuleError, sensor_trend.TrendRules.parse, [line])
+
+class EvaluateTest(unittest.TestCase):
+
+    RULES = sensor_trend.TrendRules.parse(["type:celsius deviation rate=0.5"])
+
+    def test_steady(self):
+        state,alarms = feed(self.RULES,sensor_trend.WARMUP + 5,[('1', 40.0, 'Inlet', 'celsius')])
+        self.assertEqual(alarms, [])
+        self.assertAlmostEqual(state['1'][2], 40.0)
+
+    def test_deviation(self):
+        state,alarms = feed(self.RULES,sensor_trend.WARMUP,[('1', 40.0, 'Inlet', 'celsius'),
+                                                            ('2', 40.0, 'PEM', 'volts')])
+        state,alarms = sensor_trend.evaluate(state,sensor_trend.WARMUP * 60.0,
+                                             [('1', 45.0, 'Inlet', 'celsius'),
+                                              ('2', 45.0, 'PEM', 'volts')],
+                                             self.RULES)
+
+        # Only with a rule asking for it
+        self.assertEqual([alarm[:3] for alarm in alarms], [('1', 'deviation', 45.0)])
+
+    def test_no_deviation_before_warmup(self):
+        state,alarms = feed(self.RULES,sensor_trend.WARMUP - 2,[('1', 40.0, 'Inlet', 'celsius')])
+        state,alarms = sensor_trend.evaluate(state,sensor_trend.WARMUP * 60.0,
+                                             [('1', 45.0, 'Inlet', 'celsius')],self.RULES)
+        self.assertEqual(alarms, [])
+
+    def test_rate(self):
+        # 2 degrees a minute, the smoothed slope passes 0.5 after a few runs
+        state = {}
+        kinds = []
+        for n in range(10):
+            state,alarms = sensor_trend.evaluate(state,n * 60.0,[('1', 40.0 + 2 * n, 'Inlet', 'celsius')],self.RULES)
+            kinds.append([alarm[1] for alarm in alarms if alarm[1] == 'rate'])
+
+        self.assertEqual(kinds[:2], [[], []])
+        self.assertEqual(kinds[-1], ['rate'])
+
+    def test_no_rate_alarm_too_soon(self):
+        state = {}
+        for n in range(10):
+            state,alarms = sensor_trend.evaluate(state,n * 60.0,[('1', 40.0 + 2 * n, 'Inlet', 'celsius')],self.RULES)
+        self.assertEqual([alarm[1] for alarm in alarms], ['rate'])
+
+        # Run again by hand right after, the slope is the one that alarmed already
+        state,alarms = sensor_trend.evaluate(state,9 * 60.0 + 1,[('1', 58.0, 'Inlet', 'celsius')],self.RULES)
+        self.assertEqual(alarms, [])
+
+    def test_gone_sensors_are_dropped(self):
+        state,alarms = feed(self.RULES,2,[('1', 40.0, 'Inlet', 'celsius'), ('2', 1.0, 'PEM', 'volts')])
+        state,alarms = sensor_trend.evaluate(state,180.0,[('1', 40.0, 'Inlet', 'celsius')],self.RULES)
+        self.assertEqual(list(state), ['1'])
+
+    def test_reading_too_soon(self):
+        sensor = sensor_trend.update(None,0.0,40.0)
+        self.assertEqual(sensor_trend.update(sensor,sensor_trend.MIN_INTERVAL / 2,90.0), sensor)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+import snmp_ber
+
+class EncodeTest(unittest.TestCase):
+
+    def test_length(self):
+        self.assertEqual(snmp_ber.encode_length(5), bytearray([5]))
+        self.assertEqual(snmp_ber.encode_length(200), bytearray([0x81, 200]))
+        self.assertEqual(snmp_ber.encode_length(300), bytearray([0x82, 1, 44]))
+
+    def test_integer(self):
+        self.assertEqual(snmp_ber.encode_integer(0), bytearray([2, 1, 0]))
+        self.assertEqual(snmp_ber.encode_integer(127), bytearray([2, 1, 127]))
+        self.assertEqual(snmp_ber.encode_integer(128), bytearray([2, 2, 0, 128]))
+        self.assertEqual(snmp_ber.encode_integer(-1), bytearray([2, 1, 0xff]))
+        self.assertEqual(snmp_ber.encode_integer(-129), bytearray([2, 2, 0xff, 0x7f]))
+
+    def test_unsigned_stays_positive(self):
+        self.assertEqual(snmp_ber.encode_unsigned(0xffffffff, snmp_ber.COUNTER32),
+                         bytearray([snmp_ber.COUNTER32, 5, 0, 0xff, 0xff, 0xff, 0xff]))
+
+    def test_oid(self):
+        self.assertEqual(snmp_ber.encode_oid('.1.3.6.1.4.1.9'),
+                         bytearray([6, 6, 43, 6, 1, 4, 1, 9]))
+        self.assertEqual(snmp_ber.encode_oid('1.3.6.1.4.1.200'),
+                         bytearray([6, 7, 43, 6, 1, 4, 1, 0x81, 0x48]))
+
+class SizeTest(unittest.TestCase):
+
+    VARBINDS = [('.1.3.6.1.4.1.9.9.187.1.2.5.1.3.1.4.10.0.0.1', 'INTEGER', '6'),
+                ('.1.3.6.1.4.1.9.9.187.1.2.5.1.11.1.4.10.0.0.1', 'GAUGE', '4294967295'),
+                ('.1.3.6.1.4.1.9.9.187.1.2.5.1.28.1.4.10.0.0.1', 'OCTETSTR', 'peer closed'),
+                ('.1.3.6.1.2.1.1.2.0', 'OBJECTID', '.1.3.6.1.4.1.9.1.1234'),
+                ('.1.3.6.1.2.1.1.3.0', 'TICKS', '123456'),
+                ('.1.3.6.1.4.1.9.9.91.1.1.1.1.4.1012', 'INTEGER', '-32768'),
+                ('.1.3.6.1.2.1.4.20.1.1.10.0.0.1', 'IPADDR', '10.0.0.1'),
+                ('.1.3.6.1.2.1.2.2.1.1.5', 'ENDOFMIBVIEW', None)]
+
+    def test_sizes_match_encoding(self):
+        for varbind in self.VARBINDS:
+            message = snmp_ber.encode_message('public', snmp_ber.RESPONSE, 0x7fffffff, [varbind])
+            self.assertEqual(snmp_ber.message_size('public', [varbind]), len(message), varbind)
+
+    def test_request_size(self):
+        varbinds = [(oid, None, None) for oid,type,value in self.VARBINDS]
+        message  = snmp_ber.encode_message('public', snmp_ber.GETBULK_REQUEST, 0x7fffffff, varbinds, 0, 25)
+        self.assertEqual(snmp_ber.message_size('public', varbinds, 0, 25), len(message))
+
+class DecodeTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        varbinds = SizeTest.VARBINDS
+        message  = snmp_ber.encode_message('public', snmp_ber.RESPONSE, 4711, varbinds)
+
+        version,community,pdu_type,request_id,a,b,decoded = snmp_ber.decode_message(message)
+        self.assertEqual((version, community, pdu_type, request_id, a, b),
+                         (snmp_ber.SNMP_VERSION_2C, 'public', snmp_ber.RESPONSE, 4711, 0, 0))
+        self.assertEqual(decoded, [(oid, type, value) for oid,type,value in varbinds])
+
+    def test_getbulk_fields(self):
+        message = snmp_ber.encode_message('public', snmp_ber.GETBULK_REQUEST, 1,
+                                          [('.1.3.6.1.2.1.1', None, None)], 0, 50)
+        decoded = snmp_ber.decode_message(message)
+        self.assertEqual(decoded[4:6], (0, 50))
+        self.assertEqual(decoded[6], [('.1.3.6.1.2.1.1', 'NULL', None)])
+
+    def test_truncated(self):
+        message = snmp_ber.encode_message('public', snmp_ber.RESPONSE, 1, SizeTest.VARBINDS)
+        for size in (0, 1, 10, len(message) - 1):
+            self.assertRaises(snmp_ber.DecodeError, snmp_ber.decode_message, message[:size])
+
+    def test_not_a_sequence(self):
+        self.assertRaises(snmp_ber.DecodeError, snmp_ber.decode_message, b'\x02\x01\x00')
+
+if __name__ == "__main__":
+    unittest.main()
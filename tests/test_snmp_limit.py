@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import snmp_limit
+
+class LimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_disabled(self):
+        limiter = snmp_limit.Limiter(directory=self.dir)
+        self.assertFalse(limiter.enabled())
+        self.assertEqual(limiter.reserve('router1',100), 0.0)
+        self.assertEqual(limiter.try_slot('router1'), -1)
+
+    def test_bucket_is_shared(self):
+        first  = snmp_limit.Limiter(rate=10,directory=self.dir)
+        second = snmp_limit.Limiter(rate=10,directory=self.dir)
+        try:
+            # A full bucket has a second's worth of tokens
+            self.assertEqual(first.reserve('router1',10), 0.0)
+            self.assertAlmostEqual(second.reserve('router1',10), 1.0, delta=0.1)
+            self.assertEqual(second.reserve('router2'), 0.0)
+        finally:
+            first.close()
+            second.close()
+
+    def test_slots(self):
+        first  = snmp_limit.Limiter(inflight=1,directory=self.dir)
+        second = snmp_limit.Limiter(inflight=1,directory=self.dir)
+
+        slot = first.try_slot('router1')
+        self.assertNotEqual(slot, None)
+        self.assertEqual(second.try_slot('router1'), None)
+
+        first.release(slot)
+        slot = second.try_slot('router1')
+        self.assertNotEqual(slot, None)
+        second.release(slot)
+
+    def test_state_files_are_private(self):
+        limiter = snmp_limit.Limiter(rate=10,directory=os.path.join(self.dir, 'limit'))
+        try:
+            limiter.reserve('router1')
+            self.assertEqual(os.stat(limiter.directory).st_mode & 0o777, 0o700)
+            self.assertEqual(os.stat(os.path.join(limiter.directory, 'router1.bucket')).st_mode & 0o777, 0o600)
+        finally:
+            limiter.close()
+
+    def test_no_symlinks(self):
+        victim = os.path.join(self.dir, 'victim')
+        os.symlink(victim, os.path.join(self.dir, 'router1.bucket'))
+
+        limiter = snmp_limit.Limiter(rate=10,directory=self.dir)
+        self.assertRaises(OSError, limiter.reserve, 'router1')
+        self.assertFalse(os.path.exists(victim))
+
+    def test_shared_default_directory(self):
+        shared = os.path.join(self.dir, snmp_limit.DEFAULT_DIR)
+        os.mkdir(shared)
+        os.chmod(shared, 0o777)
+
+        tempdir = tempfile.tempdir
+        tempfile.tempdir = self.dir
+        try:
+            self.assertRaises(snmp_limit.LimitError, snmp_limit.Limiter(rate=10).prepare)
+
+            os.chmod(shared, 0o700)
+            limiter = snmp_limit.Limiter(rate=10)
+            limiter.prepare()
+            self.assertEqual(limiter.directory, shared)
+        finally:
+            tempfile.tempdir = tempdir
+
+if __name__ == "__main__":
+    unittest.main()
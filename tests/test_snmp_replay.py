@@ -0,0 +1,88 @@
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import check_bgp_neighbors
+import snmp_replay
+import snmp_sim
+import snmp_table
+
+COLUMNS = [check_bgp_neighbors.BGP_PEER_STATE,
+           check_bgp_neighbors.BGP_PEER_REMOTE_AS]
+
+def walk(host,maxrep=10):
+    import netsnmp
+    session = netsnmp.Session(DestHost=host, Community='public', Version=2)
+
+    return (snmp_table.bulk_walk(session,COLUMNS,maxrep))
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir     = tempfile.mkdtemp()
+        self.capture = os.path.join(self.dir, 'r1.snmp.gz')
+        self.netsnmp = sys.modules.get('netsnmp')
+
+        agent = snmp_sim.Agent(seed=1)
+        snmp_sim.add_bgp_peers(agent,25)
+        snmp_sim.install(agent)
+
+    def tearDown(self):
+        if self.netsnmp is None:
+            sys.modules.pop('netsnmp', None)
+        else:
+            sys.modules['netsnmp'] = self.netsnmp
+        shutil.rmtree(self.dir)
+
+    def record(self):
+        recorder = snmp_replay.Recorder(self.capture)
+        recorder.install()
+        try:
+            return (walk('r1'))
+        finally:
+            recorder.close()
+
+    def test_round_trip(self):
+        live = self.record()
+
+        replay = snmp_replay.Replay(self.capture,fast=True)
+        replay.install()
+        self.assertEqual(replay.hosts, set(['r1']))
+        self.assertEqual(walk('r1'), live)
+        self.assertEqual(replay.missed, 0)
+
+    def test_unrecorded_requests_time_out(self):
+        self.record()
+
+        replay = snmp_replay.Replay(self.capture,fast=True)
+        replay.install()
+        self.assertEqual(walk('r1',maxrep=5), dict((column, {}) for column in COLUMNS))
+        self.assertEqual(replay.missed, 1)
+
+    def test_truncated_capture(self):
+        self.record()
+        with open(self.capture, 'rb') as f:
+            data = f.read()
+
+        # A killed check leaves the capture without its gzip trailer
+        with open(self.capture, 'wb') as f:
+            f.write(data[:-8])
+
+        entries = list(snmp_replay.read_capture(self.capture))
+        self.assertEqual(entries[0]['format'], snmp_replay.FORMAT)
+        self.assertTrue(len(entries) > 1)
+
+    def test_not_a_capture(self):
+        with open(self.capture, 'wb') as f:
+            f.write(b'not gzip at all')
+        self.assertRaises(snmp_replay.CaptureError, snmp_replay.Replay, self.capture)
+
+        with gzip.open(self.capture, 'wb') as f:
+            f.write(b'{"format": "something else"}\n')
+        self.assertRaises(snmp_replay.CaptureError, snmp_replay.Replay, self.capture)
+
+if __name__ == "__main__":
+    unittest.main()
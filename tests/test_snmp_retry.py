@@ -0,0 +1,39 @@
+import unittest
+from optparse import OptionParser
+
+import snmp_retry
+
+class StepTest(unittest.TestCase):
+
+    def test_initial_timeout_kept(self):
+        for timeout in (0.05, 0.3, 1.0, 3.0):
+            policy = snmp_retry.Policy(timeout=timeout)
+            self.assertEqual(policy.step(policy.timeout('router1')), timeout)
+
+    def test_rounds_down(self):
+        policy = snmp_retry.Policy(timeout=1.0)
+        self.assertEqual([policy.step(policy.timeout('router1',attempt)) for attempt in range(4)],
+                         [1.0, 2.0, 4.0, 4.0])
+        self.assertEqual(policy.step(0.45), 0.25)
+
+    def test_min_timeout(self):
+        policy = snmp_retry.Policy(timeout=1.0)
+        self.assertEqual(policy.step(snmp_retry.MIN_TIMEOUT), snmp_retry.MIN_TIMEOUT)
+
+class FromOptionsTest(unittest.TestCase):
+
+    def parse(self,args):
+        parser = OptionParser()
+        snmp_retry.add_options(parser)
+
+        return (parser.parse_args(args)[0])
+
+    def test_timeout(self):
+        self.assertEqual(snmp_retry.from_options(self.parse(['-t', '0.5'])).initial, 0.5)
+
+    def test_bad_timeout(self):
+        for timeout in ('0', '-1'):
+            self.assertRaises(SystemExit, snmp_retry.from_options, self.parse(['-t', timeout]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import sys
+import unittest
+
+import snmp_retry
+import snmp_session
+import snmp_sim
+import snmp_stats
+import snmp_table
+
+SYS_DESCR = '.1.3.6.1.2.1.1.1.0'
+SYS_NAME  = '.1.3.6.1.2.1.1.5.0'
+
+SENSOR_STATUS = '.1.3.6.1.4.1.9.9.91.1.1.1.1.5'
+SENSOR_VALUE  = '.1.3.6.1.4.1.9.9.91.1.1.1.1.4'
+
+#
+# Agent that loses the first few PDUs sent to it
+#
+class LossyAgent(snmp_sim.Agent):
+
+    def __init__(self,lose):
+        snmp_sim.Agent.__init__(self)
+        self.lose = lose
+
+    def deliver(self):
+        self.pdus += 1
+        if self.lose:
+            self.lose -= 1
+            self.lost += 1
+            return (False)
+
+        return (True)
+
+class VarListTest(unittest.TestCase):
+
+    def test_not_a_list(self):
+        var = snmp_sim.VarList(snmp_sim.Varbind(SYS_DESCR), snmp_sim.Varbind(SYS_NAME))
+        self.assertFalse(isinstance(var, list))
+        self.assertEqual(len(var), 2)
+
+        # Same as netsnmp.VarList: only single Varbinds go in
+        self.assertRaises(TypeError, var.__setitem__, slice(None), list(var))
+        self.assertRaises(TypeError, var.append, SYS_DESCR)
+
+class DeviceSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.netsnmp = sys.modules.get('netsnmp')
+        self.agent   = LossyAgent(0)
+        self.agent.set(SYS_DESCR, 'OCTETSTR', 'Cisco IOS XR Software')
+        self.agent.set(SYS_NAME, 'OCTETSTR', 'router1')
+        snmp_sim.install(self.agent,0.0)
+
+        self.pool   = snmp_session.SessionPool()
+        self.device = self.pool.device('router1','public')
+        self.device.policy = snmp_retry.Policy(timeout=0.2,retries=2,backoff=0.001)
+        snmp_stats.reset()
+
+    def tearDown(self):
+        self.pool.close_all()
+        if self.netsnmp is None:
+            sys.modules.pop('netsnmp', None)
+        else:
+            sys.modules['netsnmp'] = self.netsnmp
+
+    def varlist(self):
+        return (snmp_sim.VarList(snmp_sim.Varbind(SYS_DESCR), snmp_sim.Varbind(SYS_NAME)))
+
+    def test_get_retried(self):
+        self.agent.lose = 1
+        self.assertEqual(self.device.get(self.varlist()), ('Cisco IOS XR Software', 'router1'))
+        self.assertEqual(snmp_stats.stats.retries, 1)
+
+    def test_getbulk_retried_with_the_request(self):
+        self.agent.lose = 2
+        var = self.varlist()
+        res = self.device.getbulk(0,1,var)
+
+        # The retry sent the original OIDs, not what a failed attempt left
+        self.assertEqual(res, ('router1', None))
+        self.assertEqual([v.type for v in var], ['OCTETSTR', 'ENDOFMIBVIEW'])
+        self.assertEqual(self.agent.pdus, 3)
+
+    def test_gives_up(self):
+        self.agent.lose = 10
+        self.assertEqual(self.device.get(self.varlist()), (None, None))
+        self.assertTrue('router1' in self.device.policy.down)
+
+class ResponseSizeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.netsnmp = sys.modules.get('netsnmp')
+        self.agent   = snmp_sim.Agent()
+        snmp_sim.add_sensors(self.agent,100)
+        snmp_sim.install(self.agent,0.0)
+
+    def tearDown(self):
+        snmp_session.close_all()
+        if self.netsnmp is None:
+            sys.modules.pop('netsnmp', None)
+        else:
+            sys.modules['netsnmp'] = self.netsnmp
+
+    def received(self,profile):
+        snmp_stats.reset(profile)
+        session = snmp_session.session('router1','public')
+        snmp_table.bulk_walk(session,[SENSOR_STATUS, SENSOR_VALUE],25)
+
+        return (snmp_stats.stats.received)
+
+    def test_estimate_close_to_exact(self):
+        exact    = self.received(True)
+        estimate = self.received(False)
+        self.assertTrue(abs(estimate - exact) < exact * 0.02)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import sys
+import unittest
+
+import snmp_sim
+import snmp_table
+
+COLUMN_A = '.1.3.6.1.4.1.9.9.91.1.1.1.1.1'
+COLUMN_B = '.1.3.6.1.4.1.9.9.91.1.1.1.1.4'
+
+#
+# Agent that stops answering after the first few PDUs
+#
+class DyingAgent(snmp_sim.Agent):
+
+    def __init__(self,answers):
+        snmp_sim.Agent.__init__(self)
+        self.answers = answers
+
+    def deliver(self):
+        self.pdus += 1
+        if self.pdus > self.answers:
+            self.lost += 1
+            return (False)
+
+        return (True)
+
+class BulkWalkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.netsnmp = sys.modules.get('netsnmp')
+
+    def tearDown(self):
+        if self.netsnmp is None:
+            sys.modules.pop('netsnmp', None)
+        else:
+            sys.modules['netsnmp'] = self.netsnmp
+
+    def session(self,answers,rows=10):
+        agent = DyingAgent(answers)
+        for index in range(1, rows + 1):
+            agent.set(COLUMN_A + '.' + str(index), 'INTEGER', index)
+            agent.set(COLUMN_B + '.' + str(index), 'INTEGER', index * 10)
+
+        return (snmp_sim.install(agent,0.0).Session(DestHost='router1', Version=2, Community='public'))
+
+    def test_whole_table(self):
+        table = snmp_table.bulk_walk(self.session(100),[COLUMN_A, COLUMN_B],4)
+        self.assertEqual(len(table[COLUMN_A]), 10)
+        self.assertEqual(table[COLUMN_B]['10'], '100')
+
+    def test_no_answer_is_empty(self):
+        table = snmp_table.bulk_walk(self.session(0),[COLUMN_A, COLUMN_B],4)
+        self.assertEqual(table, {COLUMN_A: {}, COLUMN_B: {}})
+
+    def test_timeout_mid_walk(self):
+        # The first response holds 4 of the 10 rows
+        with self.assertRaises(snmp_table.IncompleteWalk) as raised:
+            snmp_table.bulk_walk(self.session(1),[COLUMN_A, COLUMN_B],4)
+        self.assertEqual(raised.exception.responses, 1)
+
+    def test_rows_timeout_mid_walk(self):
+        rows = snmp_table.bulk_rows(self.session(1),[COLUMN_A, COLUMN_B],4)
+
+        # Rows walked before the timeout come out, then the walk fails
+        self.assertEqual(next(rows), ('1', ('1', '10')))
+        self.assertRaises(snmp_table.IncompleteWalk, list, rows)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+import snmp_usm
+
+ENGINE_ID = b'\x80\x00\x00\x09\x03\x00\x11\x22\x33\x44\x55'
+
+class EngineCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def credentials(self):
+        return (snmp_usm.Credentials('nagios','authpass','privpass',self.dir))
+
+    def test_persistence(self):
+        self.credentials().learn('router1',ENGINE_ID,7,1000,now=50.0)
+
+        # A later run reads it back and moves the engine time on
+        credentials = self.credentials()
+        self.assertEqual(credentials.engine('router1'),
+                         {'engine_id': '8000000903001122334455', 'boots': 7, 'time': 1000, 'read': 50.0})
+        self.assertEqual(credentials.session_args('router1',now=80.0)['Enginetime'], 1030)
+        self.assertFalse(credentials.stale('router1',now=80.0))
+        self.assertTrue(credentials.stale('router1',now=50.0 + snmp_usm.ENGINE_TTL + 1))
+        self.assertTrue(credentials.engine('router2') is None)
+
+    def test_private_file(self):
+        credentials = self.credentials()
+        credentials.learn('router1',ENGINE_ID,7,1000)
+
+        mode = os.stat(credentials.engine_path('router1')).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0o600)
+
+    def test_forget_engine_mismatch(self):
+        credentials = self.credentials()
+        credentials.learn('router1',ENGINE_ID,7,1000)
+
+        # Errors that aren't about the engine keep it
+        self.assertFalse(credentials.forget('router1',-24))
+        self.assertTrue(os.path.exists(credentials.engine_path('router1')))
+
+        for error in snmp_usm.ENGINE_ERRORS:
+            credentials.learn('router1',ENGINE_ID,7,1000)
+            self.assertTrue(credentials.forget('router1',error))
+            self.assertTrue(credentials.engine('router1') is None)
+            self.assertFalse(os.path.exists(credentials.engine_path('router1')))
+            self.assertTrue(self.credentials().engine('router1') is None)
+
+        # Nothing left to forget
+        self.assertFalse(credentials.forget('router1',snmp_usm.ENGINE_ERRORS[0]))
+
+    def test_message_size_per_host(self):
+        credentials = self.credentials()
+        varbinds    = [('.1.3.6.1.2.1.1.5.0', None, None)]
+        default     = credentials.message_size('router1',varbinds)
+
+        # A longer engine ID of another router doesn't change this one's size
+        credentials.learn('router2',ENGINE_ID + b'\x00' * 10,7,1000)
+        self.assertEqual(credentials.message_size('router1',varbinds), default)
+
+        # Engine ID goes in the security parameters and the scoped PDU
+        self.assertEqual(credentials.message_size('router2',varbinds), default + 20)
+
+if __name__ == "__main__":
+    unittest.main()